@@ -49,8 +49,13 @@ logInfoExec(git.resetHard(GIT_BRANCH))
 cmd.execute('killall', 'uwsgi')
 os.chdir('src/')
 cmd.execute('pip3', 'install', '-r','requirements.txt')
-cmd.execute('python3', 'manage.py', 'makemigrations','--no-input')
-cmd.execute('python3', 'manage.py', 'migrate','--no-input')
+# las migraciones vienen en el repo, no se generan en el server. Las que genero el server antes
+# de que estuvieran versionadas se borran, y si la base ya tiene las tablas 0001_initial se marca como aplicada
+cmd.execute('git', 'clean', '-f', 'unAventonApp/migrations/')
+logInfoExec(cmd.execute('python3', 'manage.py', 'migrate', '--fake-initial', '--no-input'))
+cmd.execute('python3', 'manage.py', 'generar_ocurrencias')
+cmd.execute('python3', 'manage.py', 'reconstruir_reputaciones')
 cmd.execute('python3', 'manage.py', 'collectstatic','--no-input')
+cmd.execute('python3', 'manage.py', 'build_info')
 #cmd.execute('./../server.sh', 'start')
 exit(0)
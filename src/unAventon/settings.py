@@ -14,6 +14,9 @@ import os
 
 APP_COMISION = 0.05  # es el 5% de comision
 APP_MAX_DIAS_CALIFICACION_PENDIENTES = 30
+APP_HORIZONTE_OCURRENCIAS_DIAS = 90  # hasta cuantos dias a futuro se materializan las salidas de los viajes
+APP_PAGINA_PASAJEROS = 50  # filas por pagina de las listas de copilotos confirmados y en espera
+APP_PAGINA_VIAJES_FINALIZADOS = 20  # salidas por pagina en mis viajes finalizados
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -56,20 +59,57 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Instrumentacion por request (unAventonApp/middleware.py), va primera para medir toda la cadena.
+# Desactivada no agrega nada al request. Los requests lentos van a requests_lentos.log
+APP_INSTRUMENTACION = os.environ.get('UNAVENTON_INSTRUMENTACION') == '1'
+APP_INSTRUMENTACION_UMBRAL_MS = 500
+APP_INSTRUMENTACION_UMBRAL_QUERIES = 30
+MIDDLEWARE.insert(0, 'unAventonApp.middleware.InstrumentacionMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'requests_lentos': {
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'requests_lentos.log'),
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'unAventonApp.instrumentacion': {
+            'handlers': ['requests_lentos'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'unAventon.urls'
 
+# Con el loader cacheado cada template se compila una vez por proceso, los cambios en los
+# .html necesitan reiniciar. Por defecto solo sin DEBUG, uwsgi.ini lo activa con UNAVENTON_TEMPLATES_CACHEADOS=1
+APP_TEMPLATES_CACHEADOS = os.environ.get('UNAVENTON_TEMPLATES_CACHEADOS', '0' if DEBUG else '1') == '1'
+loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': ['unAventon/templates', ],
-        'APP_DIRS': True,
+        'APP_DIRS': False,  # los loaders van explicitos
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'unAventonApp.context_processors.cache',
             ],
+            'loaders': [('django.template.loaders.cached.Loader', loaders)]
+            if APP_TEMPLATES_CACHEADOS else loaders,
         },
     },
 ]
@@ -79,12 +119,79 @@ WSGI_APPLICATION = 'unAventon.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# El perfil se elige con la variable de entorno UNAVENTON_DB:
+#   sqlite            (por defecto) el archivo db.sqlite3 tal cual, para desarrollo
+#   sqlite_optimizado WAL, busy_timeout, synchronous=NORMAL y mmap (ver unAventonApp/db.py)
+#   postgres          conexiones persistentes (CONN_MAX_AGE) y chequeo de conexion en cada request,
+#                     se configura con UNAVENTON_DB_NAME, _USER, _PASSWORD, _HOST y _PORT
+APP_DB_PERFIL = os.environ.get('UNAVENTON_DB', 'sqlite')
+
+if APP_DB_PERFIL == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('UNAVENTON_DB_NAME', 'unaventon'),
+            'USER': os.environ.get('UNAVENTON_DB_USER', 'unaventon'),
+            'PASSWORD': os.environ.get('UNAVENTON_DB_PASSWORD', ''),
+            'HOST': os.environ.get('UNAVENTON_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('UNAVENTON_DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('UNAVENTON_DB_CONN_MAX_AGE', 600)),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
     }
+
+# PRAGMAs que se ejecutan en cada conexion nueva del perfil sqlite_optimizado
+APP_SQLITE_PRAGMAS = [
+    'journal_mode=WAL',  # los lectores no bloquean al que escribe
+    'busy_timeout=5000',  # espera el lock de escritura en vez de fallar con "database is locked"
+    'synchronous=NORMAL',  # con WAL no se corrompe, solo puede perder la ultima transaccion si se corta la luz
+    'mmap_size=268435456',  # 256MB
+] if APP_DB_PERFIL == 'sqlite_optimizado' else []
+
+# Cache compartido entre los procesos de uwsgi
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,  # sellos de version y fragmentos de las paginas de los viajes
+        },
+    },
+    # aparte, para que los fragmentos no desalojen sesiones ni al reves
+    'sesiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache', 'sesiones'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
 }
+APP_CACHE_PREGUNTAS_SEGUNDOS = 300  # contador de preguntas sin responder de la navbar
+APP_CACHE_ELEGIBILIDAD_SEGUNDOS = 60  # tarjeta y calificaciones adeudadas, para pedir o confirmar lugares
+APP_CACHE_VIAJE_SEGUNDOS = 3600  # fragmentos de la pagina del viaje, se invalidan por version (versiones.py)
+APP_CACHE_NAVBAR_SEGUNDOS = 3600  # navbar de cada usuario, se invalida por version del usuario y sus preguntas
+APP_CACHE_MODELOS_SEGUNDOS = 3600  # datos derivados de instancias, se invalidan por version (cache_de_modelos.py)
+APP_CACHE_LOCAL_ENTRADAS = 1000  # LRU en la memoria de cada proceso, delante del cache compartido
+
+# Las sesiones se leen del cache y se escriben en el cache y en la base. No se usa un cache en memoria
+# del proceso: despues de un logout los otros procesos seguirian viendo la sesion.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sesiones'
+
+# UsuarioBackend trae el Usuario en la misma query que el User de la sesion (request.user.usuario).
+# ModelBackend queda para las sesiones iniciadas antes, se puede sacar cuando expiren (SESSION_COOKIE_AGE)
+AUTHENTICATION_BACKENDS = [
+    'unAventonApp.autenticacion.UsuarioBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -147,4 +254,10 @@ except:
 EMAIL_HOST_USER = a
 EMAIL_HOST_PASSWORD = b
 EMAIL_USE_TLS = True
+# cola de mails (mailer.py)
+APP_MAIL_ASINCRONICO = True  # en False solo se encola, lo envia el comando enviar_mails
+APP_MAIL_WORKERS = 2  # threads por proceso
+APP_MAIL_LOTE = 20  # mails por conexion SMTP
+APP_MAIL_MAX_INTENTOS = 5
+APP_MAIL_REINTENTO_SEGUNDOS = 30  # se duplica en cada reintento
 ADMINS = [('Cristian', 'cristiansteib@gmail.com'), ('Sebastian', 'sebastiangabrielm@gmail.com')]
@@ -0,0 +1,95 @@
+""" Agenda de un usuario: sus compromisos como piloto y como copiloto confirmado
+pasados a intervalos [salida, llegada).
+Los intervalos se traen con un predicado de rango en SQL sobre las ocurrencias materializadas
+(salida < fin y llegada > inicio), los de copiloto sobre sus solicitudes confirmadas, y se guardan ordenados por salida junto con el maximo
+de las llegadas, asi cada consulta de superposicion es una busqueda binaria O(log n).
+Esto permite chequear todas las salidas de un viaje que se repite con una sola query. """
+from bisect import bisect_left
+import datetime
+
+# las solicitudes que salen antes del rango pueden llegar dentro, se buscan desde esto antes
+DURACION_MAXIMA = datetime.timedelta(days=7)
+
+
+def get_intervalo(fecha_hora_salida, duracion):
+    return fecha_hora_salida, fecha_hora_salida + datetime.timedelta(hours=float(duracion))
+
+
+class Agenda:
+    """ compromisos del usuario que se cruzan con [desde, hasta) """
+
+    def __init__(self, usuario, desde, hasta, como_piloto=True, como_copiloto=True):
+        intervalos = []
+        if como_piloto:
+            intervalos.extend(self.__intervalos_como_piloto(usuario, desde, hasta))
+        if como_copiloto:
+            intervalos.extend(self.__intervalos_como_copiloto(usuario, desde, hasta))
+        intervalos.sort()
+        self.salidas = [salida for salida, llegada in intervalos]
+        # maxima_llegada[i] es la llegada mas tardia entre los intervalos 0..i
+        self.maxima_llegada = []
+        for salida, llegada in intervalos:
+            anterior = self.maxima_llegada[-1] if self.maxima_llegada else llegada
+            self.maxima_llegada.append(max(anterior, llegada))
+
+    @staticmethod
+    def __intervalos_como_piloto(usuario, desde, hasta):
+        from .models import Viaje, ViajeOcurrencia
+        ocurrencias = set(ViajeOcurrencia.objects.filter(
+            viaje__auto__usuario=usuario,
+            viaje__activo=True,
+            fecha_hora_salida__lt=hasta,
+            fecha_hora_llegada__gt=desde
+        ).values_list('viaje_id', 'fecha_hora_salida', 'fecha_hora_llegada'))
+
+        # mas alla del horizonte no hay ocurrencias, se expande la regla de repeticion
+        # solo en la ventana pedida, sin recorrer las salidas anteriores del viaje
+        horizonte = ViajeOcurrencia.get_horizonte_materializado() - datetime.timedelta(days=1)
+        if hasta > horizonte:
+            for viaje in Viaje.objects.activos().filter(auto__usuario=usuario, fecha_hora_salida__lt=hasta):
+                inicio = max(horizonte, desde - datetime.timedelta(hours=float(viaje.duracion)))
+                for salida in viaje.get_fechas_de_salida_entre(inicio, hasta):
+                    salida, llegada = get_intervalo(salida, viaje.duracion)
+                    if llegada > desde:
+                        ocurrencias.add((viaje.pk, salida, llegada))
+
+        return [(salida, llegada) for viaje_id, salida, llegada in ocurrencias]
+
+    @staticmethod
+    def __intervalos_como_copiloto(usuario, desde, hasta):
+        """ directo de las solicitudes confirmadas, no depende de que la ocurrencia este materializada """
+        from .models import ViajeCopiloto
+        confirmadas = ViajeCopiloto.objects.filter(
+            usuario=usuario, estaConfirmado=True,
+            fecha_del_viaje__gte=desde - DURACION_MAXIMA, fecha_del_viaje__lt=hasta
+        ).values_list('fecha_del_viaje', 'viaje__duracion')
+        intervalos = set()
+        for fecha_del_viaje, duracion in confirmadas:
+            salida, llegada = get_intervalo(fecha_del_viaje, duracion)
+            if llegada > desde:
+                intervalos.add((salida, llegada))
+        return list(intervalos)
+
+    def se_superpone(self, inicio, fin):
+        """ True si algun compromiso se cruza con [inicio, fin) """
+        # intervalos que salen antes de fin, alcanza con que el que llega mas tarde llegue despues de inicio
+        i = bisect_left(self.salidas, fin)
+        return i > 0 and self.maxima_llegada[i - 1] > inicio
+
+
+def se_superpone(usuario, fecha_hora_salida, duracion, como_piloto=True, como_copiloto=True):
+    """ una sola salida contra la agenda del usuario """
+    inicio, fin = get_intervalo(fecha_hora_salida, duracion)
+    return Agenda(usuario, inicio, fin, como_piloto, como_copiloto).se_superpone(inicio, fin)
+
+
+def get_salidas_en_conflicto(usuario, salidas, duracion, como_piloto=True, como_copiloto=True):
+    """ las salidas (ej. todas las de un viaje que se repite) que se superponen con la agenda,
+    la agenda se trae una sola vez para todo el rango """
+    salidas = sorted(salidas)
+    if not salidas:
+        return []
+    desde, _ = get_intervalo(salidas[0], duracion)
+    _, hasta = get_intervalo(salidas[-1], duracion)
+    agenda = Agenda(usuario, desde, hasta, como_piloto, como_copiloto)
+    return [salida for salida in salidas if agenda.se_superpone(*get_intervalo(salida, duracion))]
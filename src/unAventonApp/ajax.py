@@ -7,10 +7,16 @@ from django.core import serializers
 import json
 from django.utils import timezone
 import datetime
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.contrib.auth import logout
 from django.forms.models import model_to_dict
+from django.conf import settings
+from django.db.models import F, Q
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
 from . import mailer
+from . import buscador
+from . import elegibilidad
 
 
 def neededParams(method_list, *args):
@@ -35,7 +41,7 @@ def viajes_activos(request):
     para el usuario logueado """
     data = {}
     try:
-        usuario = Usuario.objects.get(user=request.user)
+        usuario = request.user.usuario
         data['viajes'] = [viaje.asJson() for viaje in usuario.get_viajes_creados_activos()]
     except Usuario.DoesNotExist:
         data.setdefault('error', []).append('No exisite un Usuario para el user {0}'.format(request.user))
@@ -52,7 +58,7 @@ def lista_de_espera_de_copilotos_para_un_viaje(request):
         viaje_id = request.GET.get('viajeId', None)
         if not viaje_id:
             raise KeyError("viajeId")
-        usuario = Usuario.objects.get(user=request.user)
+        usuario = request.user.usuario
         viaje = Viaje.objects.get(auto__usuario=usuario, id=viaje_id)
         data['lista'] = [obj.asJson() for obj in viaje.get_copilotos_en_lista_de_espera()]
     except KeyError as e:
@@ -68,7 +74,7 @@ def lista_de_espera_de_copilotos_para_un_viaje(request):
 def lista_de_calificaciones_pendientes_a_copilotos(request):
     data = {}
     try:
-        usuario = Usuario.objects.get(user=request.user)
+        usuario = request.user.usuario
         data['lista'] = [obj.asJson() for obj in usuario.get_calificaciones_pendientes_para_copilotos()]
     except Usuario.DoesNotExist:
         data.setdefault('error', []).append('No exisite un perfil para el user {0}'.format(request.user))
@@ -79,7 +85,7 @@ def lista_de_calificaciones_pendientes_a_copilotos(request):
 def lista_de_calificaciones_pendientes_a_pilotos(request):
     data = {}
     try:
-        usuario = Usuario.objects.get(user=request.user)
+        usuario = request.user.usuario
         data['lista'] = [obj.asJson() for obj in usuario.get_calificaciones_pendientes_para_piloto()]
     except Usuario.DoesNotExist:
         data.setdefault('error', []).append('No exisite un perfil para el user {0}'.format(request.user))
@@ -97,7 +103,7 @@ def datos_relacionados_al_usuario(request):
     """
     data = {}
     try:
-        usuario = Usuario.objects.get(user=request.user)
+        usuario = request.user.usuario
         data['usuario'] = usuario.asJson()
         # data['calificacion_como_piloto'] = usuario.get_calificacion_como_piloto()
         # data['calificacion_como_copiloto'] = usuario.get_calificacion_como_copiloto()
@@ -134,34 +140,36 @@ def crear_viaje_ajax(request):
         datos_viaje = {
             'comentario': request_data['comentario'],
             'fecha_hora_salida': fecha_hora,
-            'duracion': request_data['duracion'],
+            'duracion': float(request_data['duracion']),
             'origen': request_data['origen'],
-            'gasto_total': request_data['costo'],
+            'gasto_total': float(request_data['costo']),
             'destino': request_data['destino'],
             'auto_id': request_data['auto_id'],
             'auto_lugares_ocupados_de_antemano': Auto.objects.get(pk=request_data['auto_id']).capacidad - int(
                 request_data['capacidad_restante']),
             'cuenta_bancaria_id': request_data['cuenta_bancaria'],
-            'se_repite': (
-                request_data['repeticion'], -1 if request_data['repeticion'] == 'diario' else fecha_hora.weekday())
+            'frecuencia': request_data['repeticion'],
+            'dia_semana': None if request_data['repeticion'] == Viaje.DIARIO else fecha_hora.weekday()
         }
         # si es un update hay que borrar el existente
         viaje_id = request_data.get('viaje_id', None)
         viaje_anterior = None
-        if viaje_id:
-            print("es un update para el viaje, se desactiva")
-            viaje_anterior = Viaje.objects.get(pk=viaje_id)
-            viaje_anterior.desactivar()
-
-        # crea el nuevo viaje
-        mensaje_json = request.user.usuario.set_nuevo_viaje(datos_viaje)
-
-        if viaje_anterior:
-            if mensaje_json['creado']:
-                viaje_anterior.delete()
-            else:
-                # restatura el viaje anterior, ya que el nuevo no se pudo crear
-                viaje_anterior.activar()
+        # si algo falla a mitad de camino el viaje anterior no queda desactivado
+        with transaction.atomic():
+            if viaje_id:
+                print("es un update para el viaje, se desactiva")
+                viaje_anterior = Viaje.objects.get(pk=viaje_id)
+                viaje_anterior.desactivar()
+
+            # crea el nuevo viaje
+            mensaje_json = request.user.usuario.set_nuevo_viaje(datos_viaje)
+
+            if viaje_anterior:
+                if mensaje_json['creado']:
+                    viaje_anterior.delete()
+                else:
+                    # restatura el viaje anterior, ya que el nuevo no se pudo crear
+                    viaje_anterior.activar()
 
         print(mensaje_json)
     except ValueError:
@@ -336,7 +344,7 @@ def actualizar_datos_perfil(request):
     response = {}
     try:
         r = request.POST
-        usuario = Usuario.objects.get(user=request.user)
+        usuario = request.user.usuario
         usuario.nombre = r['firstName']
         usuario.apellido = r['lastName']
         usuario.dni = r['dni']
@@ -510,19 +518,11 @@ def solicitar_ir_en_viaje(request):
         '''
         viaje = Viaje.objects.get(pk=id)
 
-        if not (request.user.usuario.get_tarjetas_de_credito()):
+        impedimentos = elegibilidad.get_impedimentos_para_solicitar(request.user.usuario, viaje, fecha_solicitada)
+        if impedimentos:
             data['error'] = True
-            data['msg'] = 'No tienes tarjeta de credito, registre una para poder inscribirse'
-            return JsonResponse(data)
-
-        if request.user.usuario.tiene_calificicaciones_pendientes_desde_mas_del_maximo_de_dias_permitidos():
-            data['error'] = True
-            data['msg'] = 'Debe calificaciones de mas de 30 dias'
-            return JsonResponse(data)
-
-        if request.user.usuario.se_superpone_algun_viaje(fecha_solicitada, viaje.duracion):
-            data['error'] = True
-            data['msg'] = 'Hay un viaje que se superpone en la fecha y hora solicitada'
+            data['msg'] = list(impedimentos[0].values())[0]
+            data['impedimentos'] = impedimentos
             return JsonResponse(data)
 
         tarjeta = Tarjeta.objects.get(pk=id_tarjeta)
@@ -554,8 +554,29 @@ def solicitar_ir_en_viaje(request):
         return JsonResponse({'error': 'algo salio mal'})
 
 
+def get_pagina_de_pasajeros(queryset, cursor, proxima_fecha):
+    """ una pagina de solicitudes ordenada por (fecha_del_viaje, id), en una sola query.
+    cursor es el 'siguiente' de la pagina anterior: '<fecha iso>,<id>' de su ultima fila """
+    if cursor:
+        fecha, pk = cursor.rsplit(',', 1)
+        fecha = parse_datetime(fecha)
+        queryset = queryset.filter(Q(fecha_del_viaje__gt=fecha) | Q(fecha_del_viaje=fecha, pk__gt=int(pk)))
+    tamanio = settings.APP_PAGINA_PASAJEROS
+    filas = list(queryset.order_by('fecha_del_viaje', 'pk').values(
+        'id', 'usuario', 'viaje', 'fecha_del_viaje', 'estaConfirmado', 'calificacion_a_copiloto',
+        nombre=F('usuario__nombre'), apellido=F('usuario__apellido'), username=F('usuario__user__username')
+    )[:tamanio + 1])
+    pagina = {'data': filas[:tamanio], 'siguiente': None}
+    if len(filas) > tamanio:
+        ultima = filas[tamanio - 1]
+        pagina['siguiente'] = '{0},{1}'.format(ultima['fecha_del_viaje'].isoformat(), ultima['id'])
+    for fila in pagina['data']:
+        fila['viajeCopiloto_id'] = fila['id']
+        fila['es_para_proxima_fecha'] = fila['fecha_del_viaje'] == proxima_fecha
+    return pagina
+
+
 def lista_de_copilotos_confirmados(request):
-    data = {'data': []}
     r = request.POST
     id = r['viaje_id']
     fecha_viaje_unix = r.get('fecha_hora_unix', None)
@@ -569,36 +590,24 @@ def lista_de_copilotos_confirmados(request):
         # sino todas la fechas mayores a hoy. Las fechas anteriores a hoy estan finalizados.
         viajeCopilotos = ViajeCopiloto.objects.filter(viaje=viaje, fecha_del_viaje__gte=timezone.now(),
                                                       estaConfirmado=True)
-    for obj in viajeCopilotos:
-        current_data = model_to_dict(obj.usuario, exclude=('foto_de_perfil'))
-        current_data.update(model_to_dict(obj))
-        current_data.update(model_to_dict(obj.usuario.user, fields='username'))
-        current_data.update({'viajeCopiloto_id': obj.pk})
-        current_data.update({'estado': obj.get_estado()})
-        current_data.update({'esta_calificado': obj.esta_el_copiloto_calificado()})
-        current_data.update({'es_para_proxima_fecha': obj.fecha_del_viaje == obj.viaje.proxima_fecha_de_salida()})
-        current_data.update({'url_calificacion': obj.usuario.get_url_calificion_detalle()})
-        data['data'].append(current_data)
+    data = get_pagina_de_pasajeros(viajeCopilotos, r.get('cursor'), viaje.proxima_fecha_de_salida())
+    ahora = timezone.now()
+    for fila in data['data']:
+        # mismo criterio que ViajeCopiloto.get_estado para las solicitudes confirmadas
+        fila['estado'] = 'finalizado' if fila['fecha_del_viaje'] < ahora else 'confirmado'
+        fila['esta_calificado'] = fila['calificacion_a_copiloto'] is not None
+        fila['url_calificacion'] = reverse('ver_calificaciones_de_usuario', kwargs={'id': fila['usuario']})
     return JsonResponse(data)
 
 
 def lista_de_copitolos_en_espera(request):
     ## esta el vista que llama el ajax cuando carga el modal
-    data = {'data': []}
     r = request.POST
     id = r['viaje_id']
     viaje = Viaje.objects.get(pk=id)
     viajes_copilotos = ViajeCopiloto.objects.filter(viaje=viaje, estaConfirmado=None,
-                                                    fecha_del_viaje__gte=timezone.now()).order_by('fecha_del_viaje')
-
-    for obj in viajes_copilotos:
-        current_data = model_to_dict(obj.usuario, exclude=('foto_de_perfil'))
-        current_data.update(model_to_dict(obj))
-        current_data.update(model_to_dict(obj.usuario.user, fields='username'))
-        current_data.update({'viajeCopiloto_id': obj.pk})
-        current_data.update({'es_para_proxima_fecha': obj.fecha_del_viaje == obj.viaje.proxima_fecha_de_salida()})
-        data['data'].append(current_data)
-
+                                                    fecha_del_viaje__gte=timezone.now())
+    data = get_pagina_de_pasajeros(viajes_copilotos, r.get('cursor'), viaje.proxima_fecha_de_salida())
     return JsonResponse(data)
 
 
@@ -606,32 +615,24 @@ def confirmar_copiloto(request):
     data = {'error': True}
     r = request.POST
     id_viajeCopiloto = r['viaje_copiloto_id']
-    viajeCopiloto = ViajeCopiloto.objects.get(pk=id_viajeCopiloto)
-
-    if viajeCopiloto.usuario != viajeCopiloto.viaje.auto.usuario:
-        if not viajeCopiloto.usuario.tiene_calificicaciones_pendientes_desde_mas_del_maximo_de_dias_permitidos():
-
-            if not viajeCopiloto.usuario.se_superpone_algun_viaje(viajeCopiloto.fecha_del_viaje,
-                                                                  viajeCopiloto.viaje.duracion):
-
-                if viajeCopiloto.confirmarCopiloto():
-                    print('se confirmo')
-                    data['error'] = False
-                    data['msg'] = 'confirmado'
-                    url = get_url_viaje_copiloto(request, viajeCopiloto)
-                    mailer.send_email(viajeCopiloto.usuario.user.email,
-                                      subject="El piloto a confirmado su viaje",
-                                      message="Usted a sido confirmado en el viaje.\n Para ver los detalles ingrese a: "
-                                              "{0}".format(url)
-                                      )
-                else:
-                    data['msg'] = 'no se confirmo, no hay lugar'
-            else:
-                data['msg'] = 'El copiloto esta confirmado en otro viaje, dentro del mismo horario'
-        else:
-            data['msg'] = 'El copiloto tiene calificaciones pendientes, no se puede confirmar.'
+    viajeCopiloto = ViajeCopiloto.objects.select_related('usuario__user', 'viaje__auto').get(pk=id_viajeCopiloto)
+
+    impedimentos = elegibilidad.get_impedimentos_para_confirmar(viajeCopiloto)
+    if impedimentos:
+        data['msg'] = list(impedimentos[0].values())[0]
+        data['impedimentos'] = impedimentos
+    elif viajeCopiloto.confirmarCopiloto():
+        print('se confirmo')
+        data['error'] = False
+        data['msg'] = 'confirmado'
+        url = get_url_viaje_copiloto(request, viajeCopiloto)
+        mailer.send_email(viajeCopiloto.usuario.user.email,
+                          subject="El piloto a confirmado su viaje",
+                          message="Usted a sido confirmado en el viaje.\n Para ver los detalles ingrese a: "
+                                  "{0}".format(url)
+                          )
     else:
-        data['msg'] = 'Es piloto en ese viaje, no puede ser piloto y copiloto al mismo tiempo'
+        data['msg'] = 'no se confirmo, no hay lugar'
     return JsonResponse(data)
 
 
@@ -717,13 +718,14 @@ def elimiar_viaje(request):
     r = request.POST
     id_viaje = r['viaje_id']
     viaje = Viaje.objects.get(pk=id_viaje)
-    viaje.eliminar()
+    data.update(viaje.eliminar())
     return JsonResponse(data)
 
 
 def datos_del_viaje(request):
     viaje = Viaje.objects.get(pk=request.POST['viaje_id'])
     data = model_to_dict(viaje)
+    data['se_repite'] = viaje.se_repite  # el form de modificar viaje todavia lo usa
     return JsonResponse(data)
 
 
@@ -735,37 +737,20 @@ def buscar_viajes_ajax(request):
     origen = request.POST.get('origen', None)
     destino = request.POST.get('destino', None)
     fecha = request.POST.get('fecha', None)
+    dia_semana = request.POST.get('dia_semana', None)
     hora = request.POST.get('hora', None)
 
     precio_minimo = int(request.POST['precio_min']) if request.POST.get('precio_min', None) else None
     precio_maximo = int(request.POST['precio_max']) if request.POST.get('precio_max', None) else None
 
-    viajes = Viaje.objects.filter(
-        origen__icontains=origen,
-        destino__icontains=destino,
-        activo=True
-    )
-
-    # filtra por fecha y hora
-    if fecha:
-        viajes = list(filter(lambda x: x.caeEnLaFecha(fecha), viajes))
-        f = datetime.datetime.strptime(fecha, '%Y-%m-%d')
-
-        for viaje in viajes:
-            fecha = timezone.datetime(f.year, f.month, f.day, viaje.fecha_hora_salida.hour,
-                                      viaje.fecha_hora_salida.minute, tzinfo=viaje.fecha_hora_salida.tzinfo)
-            viaje.fecha_hora_salida = fecha
-
-    if hora:
-        viajes = list(filter(lambda x: x.caeEnLaHora(hora), viajes))
+    fecha = datetime.datetime.strptime(fecha, '%Y-%m-%d').date() if fecha else None
+    dia_semana = int(dia_semana) if dia_semana else None
+    hora = datetime.datetime.strptime(hora, '%H:%M').time() if hora else None
 
-    # chequea si hay que filtrar por costo
-    if precio_minimo:
-        viajes = list(filter(lambda x: x.get_costo_por_pasajero() >= precio_minimo, viajes))
-    if precio_maximo:
-        viajes = list(filter(lambda x: x.get_costo_por_pasajero() <= precio_maximo, viajes))
+    viajes = buscador.buscar_viajes(origen, destino, fecha=fecha, dia_semana=dia_semana, hora=hora,
+                                    precio_minimo=precio_minimo, precio_maximo=precio_maximo)
 
-    data['viajes'] = list(map(lambda x: x.asJsonPublicacion(request.user.usuario), viajes))
+    data['viajes'] = buscador.publicaciones(viajes, request.user.usuario, fecha=fecha)
     return JsonResponse(data)
 
 
@@ -777,9 +762,10 @@ def preguntas_sin_responder_conversacion_publica(request):
 
 
 def responder_pregunta_conversacion_publica(request):
-    conversacion = ConversacionPublica.objects.get(pk=request.POST['id'])
+    conversacion = ConversacionPublica.objects.select_related('viaje__auto').get(pk=request.POST['id'])
     conversacion.respuesta = request.POST['respuesta']
     conversacion.fechaHoraRespuesta = timezone.now()
     conversacion.save()
+    Usuario.invalidar_preguntas_sin_responder(conversacion.viaje.auto.usuario_id)
     print(conversacion)
     return JsonResponse(model_to_dict(conversacion))
@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class UnaventonappConfig(AppConfig):
     name = 'unAventonApp'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+        from . import db
+        from . import signals  # noqa: conecta los receivers de los modelos
+        if settings.APP_SQLITE_PRAGMAS:
+            connection_created.connect(db.configurar_sqlite)
+        if any(conexion.get('CONN_MAX_AGE') for conexion in settings.DATABASES.values()):
+            request_started.connect(db.descartar_conexiones_caidas)
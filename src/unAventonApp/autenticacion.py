@@ -0,0 +1,15 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class UsuarioBackend(ModelBackend):
+    """ como ModelBackend, pero AuthenticationMiddleware carga el User de la sesion con su Usuario en una
+    sola query. Vistas, ajax, templates y templatetags usan request.user.usuario sin volver a la base """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('usuario').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,94 @@
+""" Motor de busqueda de viajes.
+Traduce los filtros del buscador (origen, destino, fecha o dia de la semana,
+hora y rango de precio) a una sola consulta SQL, asi una busqueda cuesta
+la misma cantidad de queries sin importar cuantos viajes esten publicados.
+"""
+import datetime
+from django.db.models import Q, F, FloatField, ExpressionWrapper
+from django.utils import timezone
+from .models import Viaje, ViajeCopiloto, ViajeOcurrencia
+
+MARGEN_HORARIO = datetime.timedelta(minutes=30)  # margen para matchear mas viajes
+
+
+def filtro_cae_en_la_fecha(fecha):
+    """ equivalente en SQL de Viaje.caeEnLaFecha.
+    Dentro del horizonte materializado es un rango indexado sobre las ocurrencias,
+    mas alla se resuelve con la regla de repeticion """
+    desde = datetime.datetime.combine(fecha, datetime.time.min)
+    if desde < ViajeOcurrencia.get_horizonte_materializado() - datetime.timedelta(days=1):
+        return Q(pk__in=ViajeOcurrencia.objects.filter(
+            fecha_hora_salida__gte=desde,
+            fecha_hora_salida__lt=desde + datetime.timedelta(days=1)
+        ).values('viaje'))
+    return (
+        Q(frecuencia=Viaje.NUNCA, fecha_hora_salida__date=fecha) |
+        Q(frecuencia=Viaje.DIARIO, fecha_hora_salida__date__lte=fecha) |
+        Q(frecuencia=Viaje.SEMANAL, dia_semana=fecha.weekday(), fecha_hora_salida__date__lte=fecha)
+    )
+
+
+def filtro_cae_en_el_dia_de_la_semana(weekday):
+    """ viajes que salen un weekday (0=lunes) cualquiera, los diarios salen todos los dias """
+    return (
+        Q(frecuencia=Viaje.DIARIO) |
+        Q(dia_semana=weekday)
+    )
+
+
+def filtro_cae_en_la_hora(hora):
+    """ equivalente en SQL de Viaje.caeEnLaHora, la ventana no cruza la medianoche """
+    base = datetime.datetime.combine(datetime.date.today(), hora)
+    desde = max(base - MARGEN_HORARIO, datetime.datetime.combine(base.date(), datetime.time.min))
+    hasta = min(base + MARGEN_HORARIO, datetime.datetime.combine(base.date(), datetime.time.max))
+    return Q(fecha_hora_salida__time__range=(desde.time(), hasta.time()))
+
+
+def buscar_viajes(origen='', destino='', fecha=None, dia_semana=None, hora=None, precio_minimo=None,
+                  precio_maximo=None):
+    """ retorna un queryset con los viajes activos que cumplen los filtros.
+    fecha es un date, dia_semana un int (0=lunes) y hora un time """
+    viajes = Viaje.objects.activos().filter(
+        origen__icontains=origen or '',
+        destino__icontains=destino or '',
+    ).select_related('auto__usuario').annotate(
+        costo_por_pasajero=ExpressionWrapper(F('gasto_total') / F('auto__capacidad'), output_field=FloatField())
+    )
+
+    if fecha:
+        viajes = viajes.filter(filtro_cae_en_la_fecha(fecha))
+    elif dia_semana is not None:
+        viajes = viajes.filter(filtro_cae_en_el_dia_de_la_semana(dia_semana))
+
+    if hora:
+        viajes = viajes.filter(filtro_cae_en_la_hora(hora))
+
+    if precio_minimo:
+        viajes = viajes.filter(costo_por_pasajero__gte=precio_minimo)
+    if precio_maximo:
+        viajes = viajes.filter(costo_por_pasajero__lte=precio_maximo)
+
+    return viajes
+
+
+def publicaciones(viajes, usuario=None, fecha=None):
+    """ arma el json de publicacion de cada viaje encontrado.
+    Si se busco por fecha, la salida de cada viaje se mueve a esa fecha (conservando la hora).
+    Las inscripciones del usuario se cargan con una sola query para todos los viajes. """
+    viajes = list(viajes)
+
+    if fecha:
+        for viaje in viajes:
+            viaje.fecha_hora_salida = timezone.datetime(fecha.year, fecha.month, fecha.day,
+                                                        viaje.fecha_hora_salida.hour,
+                                                        viaje.fecha_hora_salida.minute,
+                                                        tzinfo=viaje.fecha_hora_salida.tzinfo)
+
+    inscripciones = None
+    if usuario and viajes:
+        inscripciones = set(ViajeCopiloto.objects.filter(
+            usuario=usuario,
+            viaje__in=[viaje.pk for viaje in viajes]
+        ).values_list('viaje_id', 'fecha_del_viaje'))
+
+    return [viaje.asJsonPublicacion(usuario, inscripciones=inscripciones) for viaje in viajes]
@@ -0,0 +1,104 @@
+""" Cache de dos niveles para datos derivados de instancias de modelos (Viaje, Usuario, Auto, ...).
+  1. un LRU en la memoria de cada proceso, sin ir a ningun lado
+  2. el cache compartido entre los procesos de uwsgi (CACHES['default'])
+Las claves llevan el sello de version de cada instancia de la que depende el valor (versiones.py),
+los receivers de signals.py tocan el sello en cada save()/delete() (desactivar() tambien pasa por save).
+Un valor viejo nunca se vuelve a leer porque su clave deja de pedirse, en ninguno de los dos niveles.
+Cada proceso cuenta sus aciertos y fallos en metricas. """
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from . import versiones
+import hashlib
+import threading
+import time
+
+FALTA = object()  # los valores cacheados pueden ser None
+
+
+class LRU:
+    """ cache en memoria del proceso, con una cantidad maxima de entradas y vencimiento """
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self.lock = threading.Lock()
+        self.entradas = OrderedDict()
+
+    def get(self, clave, default=None):
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                return default
+            valor, vence = entrada
+            if vence < time.monotonic():
+                del self.entradas[clave]
+                return default
+            self.entradas.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, segundos):
+        with self.lock:
+            self.entradas[clave] = (valor, time.monotonic() + segundos)
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.maximo:
+                self.entradas.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entradas.clear()
+
+    def __len__(self):
+        return len(self.entradas)
+
+
+class Metricas:
+    """ contadores del proceso, por nombre de valor cacheado """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.contadores = {}
+
+    def registrar(self, nombre, resultado):
+        with self.lock:
+            contadores = self.contadores.setdefault(nombre, {'local': 0, 'compartido': 0, 'fallos': 0})
+            contadores[resultado] += 1
+
+    def asJson(self):
+        with self.lock:
+            data = {nombre: dict(contadores) for nombre, contadores in self.contadores.items()}
+        for contadores in data.values():
+            total = sum(contadores.values())
+            contadores['aciertos'] = round((total - contadores['fallos']) / total, 3) if total else None
+        return data
+
+
+local = LRU(settings.APP_CACHE_LOCAL_ENTRADAS)
+metricas = Metricas()
+
+
+def get_clave(nombre, instancias, sellos):
+    datos = ['{0}.{1}.{2!r}'.format(modelo._meta.model_name, pk, sellos[versiones.get_clave_instancia(modelo, pk)])
+             for modelo, pk in instancias]
+    return 'modelos:{0}:{1}'.format(nombre, hashlib.md5(':'.join(datos).encode()).hexdigest())
+
+
+def get(nombre, instancias, calcular, segundos=None):
+    """ el valor nombre, que depende de instancias [(Modelo, pk), ...], de alguno de los dos niveles
+    o calcular() si no esta o alguna de las instancias cambio. Un solo get_many para los sellos """
+    segundos = settings.APP_CACHE_MODELOS_SEGUNDOS if segundos is None else segundos
+    sellos = versiones.get_versiones(*[versiones.get_clave_instancia(modelo, pk) for modelo, pk in instancias])
+    clave = get_clave(nombre, instancias, sellos)
+
+    valor = local.get(clave, FALTA)
+    if valor is not FALTA:
+        metricas.registrar(nombre, 'local')
+        return valor
+    valor = cache.get(clave, FALTA)
+    if valor is not FALTA:
+        metricas.registrar(nombre, 'compartido')
+    else:
+        metricas.registrar(nombre, 'fallos')
+        valor = calcular()
+        cache.set(clave, valor, segundos)
+    local.set(clave, valor, segundos)
+    return valor
@@ -0,0 +1,8 @@
+from django.conf import settings
+
+
+def cache(request):
+    """ tiempos de los fragmentos cacheados ({% cache %}) de base.html """
+    return {
+        'cache_navbar_segundos': settings.APP_CACHE_NAVBAR_SEGUNDOS,
+    }
@@ -0,0 +1,22 @@
+""" Ajustes de las conexiones a la base, segun el perfil elegido en settings (APP_DB_PERFIL).
+Se conectan a las signals en UnaventonappConfig.ready. """
+from django.conf import settings
+from django.db import connections
+
+
+def configurar_sqlite(sender, connection, **kwargs):
+    """ connection_created: ejecuta los PRAGMAs del perfil sqlite_optimizado en cada conexion nueva """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma in settings.APP_SQLITE_PRAGMAS:
+            cursor.execute('PRAGMA ' + pragma)
+
+
+def descartar_conexiones_caidas(**kwargs):
+    """ request_started: con conexiones persistentes (CONN_MAX_AGE) una conexion puede haber
+    muerto entre requests (reinicio de postgres, timeout del servidor), se cierra para que
+    Django abra otra en vez de fallar en la primer query """
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
@@ -0,0 +1,91 @@
+""" Reglas de negocio para pedir un lugar, confirmar un copiloto o crear un viaje.
+Lo que depende solo del usuario (tarjeta activa, calificaciones adeudadas) se resuelve en una
+sola query con subconsultas EXISTS y se guarda en el cache por unos segundos. La superposicion
+depende del viaje y la fecha, se consulta en la agenda del usuario.
+Cada funcion retorna la lista de impedimentos, como {codigo: mensaje}, vacia si puede. """
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+import datetime
+from . import agenda
+
+
+def get_clave(usuario_id):
+    return 'usuario:{0}:elegibilidad'.format(usuario_id)
+
+
+def invalidar(*usuarios_ids):
+    """ se llama cuando cambian las tarjetas o las calificaciones del usuario. Se borra despues del commit,
+    como los sellos de versiones.py, si no otro request podria volver a cachear el estado viejo """
+    claves = [get_clave(pk) for pk in usuarios_ids]
+    transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def get_estado(usuario):
+    """ {'tiene_tarjeta': bool, 'calificaciones_pendientes': bool} del usuario """
+    from .models import Usuario, Tarjeta, ViajeCopiloto
+    clave = get_clave(usuario.pk)
+    estado = cache.get(clave)
+    if estado is None:
+        limite = timezone.now() - datetime.timedelta(days=settings.APP_MAX_DIAS_CALIFICACION_PENDIENTES)
+        vencidos = ViajeCopiloto.objects.filter(estaConfirmado=True, fecha_del_viaje__lte=limite)
+        estado = Usuario.objects.filter(pk=usuario.pk).annotate(
+            tiene_tarjeta=Exists(Tarjeta.objects.filter(usuario=OuterRef('pk'), esta_activo=True)),
+            debe_como_copiloto=Exists(vencidos.filter(usuario=OuterRef('pk'), calificacion_a_piloto=None)),
+            debe_como_piloto=Exists(vencidos.filter(viaje__auto__usuario=OuterRef('pk'), calificacion_a_copiloto=None)),
+        ).values('tiene_tarjeta', 'debe_como_copiloto', 'debe_como_piloto').get()
+        estado = {
+            'tiene_tarjeta': estado['tiene_tarjeta'],
+            'calificaciones_pendientes': estado['debe_como_copiloto'] or estado['debe_como_piloto'],
+        }
+        cache.set(clave, estado, settings.APP_CACHE_ELEGIBILIDAD_SEGUNDOS)
+    return estado
+
+
+def get_impedimentos_para_solicitar(usuario, viaje, fecha):
+    """ el usuario pide un lugar en el viaje para la fecha """
+    estado = get_estado(usuario)
+    impedimentos = []
+    if not estado['tiene_tarjeta']:
+        impedimentos.append({104: 'No tienes tarjeta de credito, registre una para poder inscribirse'})
+    if estado['calificaciones_pendientes']:
+        impedimentos.append({101: 'Debe calificaciones de mas de {0} dias'.format(
+            settings.APP_MAX_DIAS_CALIFICACION_PENDIENTES)})
+    if agenda.se_superpone(usuario, fecha, viaje.duracion):
+        impedimentos.append({105: 'Hay un viaje que se superpone en la fecha y hora solicitada'})
+    return impedimentos
+
+
+def get_impedimentos_para_confirmar(viaje_copiloto):
+    """ el piloto confirma al copiloto de la solicitud """
+    copiloto = viaje_copiloto.usuario
+    if copiloto.pk == viaje_copiloto.viaje.auto.usuario_id:
+        return [{106: 'Es piloto en ese viaje, no puede ser piloto y copiloto al mismo tiempo'}]
+    impedimentos = []
+    if get_estado(copiloto)['calificaciones_pendientes']:
+        impedimentos.append({101: 'El copiloto tiene calificaciones pendientes, no se puede confirmar.'})
+    if agenda.se_superpone(copiloto, viaje_copiloto.fecha_del_viaje, viaje_copiloto.viaje.duracion):
+        impedimentos.append({105: 'El copiloto esta confirmado en otro viaje, dentro del mismo horario'})
+    return impedimentos
+
+
+def get_impedimentos_para_crear(usuario, fecha_hora_salida, duracion, frecuencia):
+    """ el usuario publica un viaje, si se repite se chequean todas sus salidas hasta el horizonte """
+    from .models import Viaje, ViajeOcurrencia
+    impedimentos = []
+    if fecha_hora_salida < timezone.now():
+        impedimentos.append({110: 'El viaje debe ser posterior a la fecha actual.'})
+
+    if get_estado(usuario)['calificaciones_pendientes']:
+        impedimentos.append({101: 'Tenes calificaciones pendientes de mas de {0} dias por hacer'.format(
+            settings.APP_MAX_DIAS_CALIFICACION_PENDIENTES)})
+
+    salidas = list(Viaje(fecha_hora_salida=fecha_hora_salida, frecuencia=frecuencia).get_fechas_de_salida_hasta(
+        max(ViajeOcurrencia.get_horizonte(), fecha_hora_salida)))
+    if agenda.get_salidas_en_conflicto(usuario, salidas, duracion, como_copiloto=False):
+        impedimentos.append({102: 'Tenes algun viaje como piloto en el mismo rango horario.'})
+    if agenda.get_salidas_en_conflicto(usuario, salidas, duracion, como_piloto=False):
+        impedimentos.append({103: 'Tenes algun viaje aceptado como copiloto en el mismo rango horario ingresado.'})
+    return impedimentos
@@ -0,0 +1,73 @@
+""" Libro de comisiones y reintegros por salida, para administracion.
+Lo usan el comando exportar_liquidaciones y la vista exportar_liquidaciones (solo staff).
+La agrupacion y los montos se calculan en la base (ViajeCopilotoManager.liquidaciones) y las
+filas se recorren con iterator(), nunca se cargan todas en memoria. """
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+from .models import ViajeCopiloto
+import csv
+import datetime
+import json
+
+COLUMNAS = ['viaje', 'fecha_del_viaje', 'piloto', 'mail_piloto', 'cbu', 'origen', 'destino', 'gasto_total',
+            'capacidad', 'confirmados', 'total_cobrado', 'comision_cobrada', 'total_a_reintegrar']
+MONTOS = ('gasto_total', 'total_cobrado', 'comision_cobrada', 'total_a_reintegrar')
+TAMANIO_DEL_LOTE = 2000  # filas por viaje a la base
+
+
+def get_rango(desde, hasta=None):
+    """ fechas 'AAAA-MM-DD' a datetimes, hasta es inclusive y por defecto hoy. ValueError si no son fechas """
+    desde = datetime.datetime.strptime(desde, '%Y-%m-%d')
+    hasta = datetime.datetime.strptime(hasta, '%Y-%m-%d') if hasta else datetime.datetime.combine(
+        timezone.now().date(), datetime.time())
+    return desde, hasta + datetime.timedelta(days=1)
+
+
+def get_liquidaciones(desde, hasta):
+    """ las salidas con copilotos confirmados entre desde (inclusive) y hasta (exclusive) """
+    return ViajeCopiloto.objects.liquidaciones(
+        piloto=F('viaje__auto__usuario'),
+        mail_piloto=F('viaje__auto__usuario__user__email'),
+        cbu=F('viaje__cuenta_bancaria__cbu'),
+        origen=F('viaje__origen'),
+        destino=F('viaje__destino'),
+        gasto_total=F('viaje__gasto_total'),
+        capacidad=F('viaje__auto__capacidad'),
+    ).filter(fecha_del_viaje__gte=desde, fecha_del_viaje__lt=hasta).order_by('fecha_del_viaje', 'viaje')
+
+
+def get_filas(desde, hasta):
+    for fila in get_liquidaciones(desde, hasta).iterator(chunk_size=TAMANIO_DEL_LOTE):
+        for monto in MONTOS:
+            fila[monto] = round(fila[monto], 2)
+        yield [fila[columna] for columna in COLUMNAS]
+
+
+class Eco:
+    """ csv.writer escribe en un archivo, este le devuelve la linea para poder generarla """
+
+    def write(self, linea):
+        return linea
+
+
+def generar_csv(desde, hasta):
+    escritor = csv.writer(Eco())
+    yield escritor.writerow(COLUMNAS)
+    for fila in get_filas(desde, hasta):
+        yield escritor.writerow(fila)
+
+
+def generar_json(desde, hasta):
+    """ una lista json, un objeto por salida """
+    separador = '['
+    for fila in get_filas(desde, hasta):
+        yield separador + json.dumps(dict(zip(COLUMNAS, fila)), cls=DjangoJSONEncoder)
+        separador = ',\n'
+    yield '[]' if separador == '[' else ']\n'
+
+
+FORMATOS = {
+    'csv': (generar_csv, 'text/csv'),
+    'json': (generar_json, 'application/json'),
+}
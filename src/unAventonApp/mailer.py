@@ -1,37 +1,162 @@
-from django.core.mail import send_mail
+""" Envio de mails a traves de una cola persistente (MailPendiente).
+send_email solo encola, un pool fijo de threads por proceso toma los mails en lotes
+y los manda reutilizando una sola conexion SMTP por lote. Los que fallan se reintentan
+con backoff exponencial. El comando enviar_mails drena la cola sin threads (cron). """
+from django.core.mail import get_connection
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from collections import deque
+import datetime
+import json
 import threading
+import time
+import uuid
 
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+LEASE = datetime.timedelta(minutes=5)  # tiempo que un lote queda tomado por un worker
 
-class senderThread(threading.Thread):
-    def __init__(self, from_mail, list_of_mails, subject, message):
-        threading.Thread.__init__(self)
-        self.from_mail = from_mail
-        self.list_of_mails = list_of_mails
-        self.subject = subject
-        self.message = message
 
-    def run(self):
-        self.send_email()
+class Metricas:
+    """ contadores del proceso: enviados, fallidos y latencia desde que se encolo """
 
-    def send_email(self):
-        print('enviando mails a: {0}'.format(str(self.list_of_mails)))
-        send_mail(
-            self.subject,
-            self.message,
-            self.from_mail,
-            self.list_of_mails,
-            fail_silently=False,
-        )
+    def __init__(self, maximo_de_muestras=500):
+        self.lock = threading.Lock()
+        self.enviados = 0
+        self.errores = 0
+        self.latencias = deque(maxlen=maximo_de_muestras)
+
+    def registrar_envio(self, encolado):
+        with self.lock:
+            self.enviados += 1
+            self.latencias.append((timezone.now() - encolado).total_seconds())
+
+    def registrar_error(self):
+        with self.lock:
+            self.errores += 1
+
+    def asJson(self):
+        from .models import MailPendiente
+        with self.lock:
+            latencias = sorted(self.latencias)
+            data = {'enviados': self.enviados, 'errores': self.errores}
+        data['en_cola'] = MailPendiente.objects.pendientes().count()
+        data['fallidos'] = MailPendiente.objects.fallidos().count()
+        data['latencia_p50_segundos'] = latencias[len(latencias) // 2] if latencias else None
+        data['latencia_p95_segundos'] = latencias[int(len(latencias) * 0.95)] if latencias else None
+        return data
+
+
+metricas = Metricas()
+
+
+def get_backoff(intentos):
+    return datetime.timedelta(seconds=settings.APP_MAIL_REINTENTO_SEGUNDOS * (2 ** (intentos - 1)))
+
+
+def tomar_lote(cantidad=None):
+    """ reserva hasta cantidad mails pendientes para este worker, con un solo UPDATE """
+    from .models import MailPendiente
+    cantidad = cantidad or settings.APP_MAIL_LOTE
+    ahora = timezone.now()
+    lote = uuid.uuid4().hex
+    candidatos = MailPendiente.objects.pendientes(ahora).order_by('proximo_intento').values_list(
+        'pk', flat=True)[:cantidad]
+    MailPendiente.objects.filter(pk__in=list(candidatos), proximo_intento__lte=ahora, enviado=False).update(
+        lote=lote, proximo_intento=ahora + LEASE)
+    return list(MailPendiente.objects.filter(lote=lote))
+
+
+def enviar_lote(mails):
+    """ manda los mails usando una sola conexion, retorna la cantidad enviada """
+    from .models import MailPendiente
+    if not mails:
+        return 0
+    enviados = []
+    connection = None
+    try:
+        connection = get_connection()
+        connection.open()
+        for mail in mails:
+            try:
+                connection.send_messages([mail.asEmailMessage(connection)])
+                enviados.append(mail)
+                metricas.registrar_envio(mail.fecha_de_creacion)
+            except Exception as e:
+                metricas.registrar_error()
+                mail.registrar_error(e)
+    except Exception as e:
+        # no se pudo abrir la conexion, se reintenta el resto del lote
+        for mail in mails:
+            if mail not in enviados:
+                metricas.registrar_error()
+                mail.registrar_error(e)
+    finally:
+        if connection:
+            connection.close()
+
+    MailPendiente.objects.filter(pk__in=[mail.pk for mail in enviados]).update(
+        enviado=True, fecha_de_envio=timezone.now(), lote=None)
+    return len(enviados)
+
+
+def procesar_cola():
+    """ envia lotes hasta vaciar la cola de pendientes, retorna la cantidad enviada """
+    total = 0
+    lote = tomar_lote()
+    while lote:
+        total += enviar_lote(lote)
+        lote = tomar_lote()
+    return total
+
+
+class Pool:
+    """ pool fijo de workers por proceso, se despiertan cuando se encola un mail
+    y cada tanto para los reintentos """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.evento = threading.Event()
+        self.workers = []
+
+    def despertar(self):
+        with self.lock:
+            if not self.workers:
+                for i in range(settings.APP_MAIL_WORKERS):
+                    worker = threading.Thread(target=self.__loop, name='mailer-{0}'.format(i), daemon=True)
+                    worker.start()
+                    self.workers.append(worker)
+        self.evento.set()
+
+    def __loop(self):
+        from django.db import connection
+        while True:
+            self.evento.wait(timeout=settings.APP_MAIL_REINTENTO_SEGUNDOS)
+            self.evento.clear()
+            try:
+                procesar_cola()
+            except Exception as e:
+                print('ERROR en la cola de mails: {0}'.format(e))
+                time.sleep(1)
+            finally:
+                connection.close()
+
+
+pool = Pool()
 
 
 def send_email(mail, subject='', message='', list_of_mails=None):
+    from .models import MailPendiente
     if not list_of_mails:
         list_of_mails = [mail]
-    if not settings.EMAIL_HOST_USER:
+    if not settings.EMAIL_HOST_USER and settings.EMAIL_BACKEND == SMTP_BACKEND:
         print("NO SE  ENVIA MAIL, HOST USER SIN CONFIGURAR")
         return
-    subject = 'unAventon: ' + subject
-    from_mail = settings.EMAIL_HOST_USER
-    thread = senderThread(from_mail, list_of_mails, subject, message)
-    thread.start()
+    MailPendiente.objects.create(
+        remitente=settings.EMAIL_HOST_USER,
+        destinatarios=json.dumps(list_of_mails),
+        asunto='unAventon: ' + subject,
+        mensaje=message
+    )
+    if settings.APP_MAIL_ASINCRONICO:
+        transaction.on_commit(pool.despertar)
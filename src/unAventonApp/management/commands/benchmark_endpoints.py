@@ -0,0 +1,92 @@
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unAventonApp import cache_de_modelos
+from unAventonApp.models import Usuario, Viaje, ViajeCopiloto
+
+
+class Rollback(Exception):
+    """ para deshacer lo que escriben los endpoints que modifican datos """
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia (p50/p95) y cantidad de queries de los endpoints principales con el test client, ' \
+           'sobre los datos de la base (ver generar_datos_sinteticos). Imprime un json para comparar corridas. ' \
+           'Los endpoints que escriben se corren dentro de una transaccion que se deshace.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--salida', help='archivo donde guardar el json')
+
+    def handle(self, *args, **options):
+        piloto = Usuario.objects.annotate(viajes=Count('auto__viaje')).order_by('-viajes').first()
+        copiloto = Usuario.objects.annotate(solicitudes=Count('viajecopiloto')).order_by('-solicitudes').first()
+        viaje = Viaje.objects.activos().filter(auto__usuario=piloto).first()
+        solicitud = ViajeCopiloto.objects.filter(viaje__auto__usuario=piloto, estaConfirmado=None,
+                                                 fecha_del_viaje__gte=timezone.now()).first()
+        if not (piloto and copiloto and viaje):
+            raise CommandError('No hay datos, correr antes generar_datos_sinteticos')
+
+        fecha = viaje.proxima_fecha_de_salida()
+        pedidos = [
+            ('buscar_viajes_ajax', copiloto, 'post', '/ajax/buscarViaje',
+             {'origen': viaje.origen, 'destino': viaje.destino, 'fecha': fecha.strftime('%Y-%m-%d')}),
+            ('viaje', copiloto, 'get', '/viaje/{0}/{1}/'.format(viaje.pk, int(fecha.timestamp())), None),
+            ('mis_viajes', piloto, 'get', '/misViajes', None),
+            ('mis_viajes_finalizados', piloto, 'get', '/misViajesFinalizados', None),
+            ('viajes_inscriptos', copiloto, 'get', '/viajesInscriptos', None),
+            ('datos_relacionados_al_usuario', piloto, 'post', '/ajax/datosRelacionandosAlUsuario', {}),
+        ]
+        if solicitud:
+            pedidos.append(('confirmar_copiloto', piloto, 'post', '/ajax/confirmarCopiloto',
+                            {'viaje_copiloto_id': solicitud.pk}))
+
+        resultados = {
+            'fecha': timezone.now().isoformat(),
+            'perfil_db': settings.APP_DB_PERFIL,
+            'repeticiones': options['repeticiones'],
+            'endpoints': {},
+        }
+        for nombre, usuario, metodo, url, data in pedidos:
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(usuario.user)
+            resultados['endpoints'][nombre] = self.medir(client, metodo, url, data, options['repeticiones'])
+        resultados['cache_de_modelos'] = cache_de_modelos.metricas.asJson()
+
+        salida = json.dumps(resultados, indent=2)
+        if options['salida']:
+            with open(options['salida'], 'w') as archivo:
+                archivo.write(salida)
+        self.stdout.write(salida)
+
+    @staticmethod
+    def medir(client, metodo, url, data, repeticiones):
+        tiempos = []
+        queries = []
+        for _ in range(repeticiones):
+            try:
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as capturadas:
+                        inicio = time.perf_counter()
+                        response = getattr(client, metodo)(url, data)
+                        tiempos.append(time.perf_counter() - inicio)
+                    queries.append(len(capturadas))
+                    raise Rollback
+            except Rollback:
+                pass
+            if response.status_code != 200:
+                raise CommandError('{0} respondio {1}'.format(url, response.status_code))
+        tiempos.sort()
+        return {
+            'status': response.status_code,
+            'p50_ms': round(tiempos[len(tiempos) // 2] * 1000, 2),
+            'p95_ms': round(tiempos[int(len(tiempos) * 0.95)] * 1000, 2),
+            'queries_p50': sorted(queries)[len(queries) // 2],
+            'queries_max': max(queries),
+        }
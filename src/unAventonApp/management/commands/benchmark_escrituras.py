@@ -0,0 +1,83 @@
+import json
+import multiprocessing
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from unAventonApp.models import MailPendiente
+
+ASUNTO = 'benchmark_escrituras'
+
+
+def escribir(segundos, resultados):
+    """ un thread: transacciones de escritura cortas (insert + update) durante los segundos dados """
+    latencias = []
+    errores = 0
+    fin = time.time() + segundos
+    try:
+        while time.time() < fin:
+            inicio = time.time()
+            try:
+                with transaction.atomic():
+                    mail = MailPendiente.objects.create(remitente='', destinatarios='[]', asunto=ASUNTO,
+                                                        mensaje='', enviado=True, fecha_de_envio=timezone.now())
+                    MailPendiente.objects.filter(pk=mail.pk).update(intentos=1)
+                latencias.append(time.time() - inicio)
+            except Exception:
+                errores += 1
+    finally:
+        connection.close()
+    resultados.put((latencias, errores))
+
+
+def proceso(threads, segundos, resultados):
+    """ un proceso de uwsgi con sus threads """
+    workers = [threading.Thread(target=escribir, args=(segundos, resultados)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+class Command(BaseCommand):
+    help = 'Mide el throughput de escritura con la distribucion de uwsgi (procesos x threads, ' \
+           'ver uwsgi.ini) contra el perfil de base configurado (UNAVENTON_DB). Imprime un json.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=2)
+        parser.add_argument('--segundos', type=float, default=10)
+
+    def handle(self, *args, **options):
+        procesos, threads, segundos = options['procesos'], options['threads'], options['segundos']
+        # los procesos hijos no pueden compartir la conexion del padre
+        connections.close_all()
+        resultados = multiprocessing.Queue()
+        hijos = [multiprocessing.Process(target=proceso, args=(threads, segundos, resultados))
+                 for _ in range(procesos)]
+        for hijo in hijos:
+            hijo.start()
+
+        latencias = []
+        errores = 0
+        for _ in range(procesos * threads):
+            parciales, errores_parciales = resultados.get()
+            latencias.extend(parciales)
+            errores += errores_parciales
+        for hijo in hijos:
+            hijo.join()
+        MailPendiente.objects.filter(asunto=ASUNTO).delete()
+
+        latencias.sort()
+        self.stdout.write(json.dumps({
+            'perfil': settings.APP_DB_PERFIL,
+            'procesos': procesos,
+            'threads': threads,
+            'escrituras': len(latencias),
+            'errores': errores,
+            'escrituras_por_segundo': round(len(latencias) / segundos, 1),
+            'latencia_p50_ms': round(latencias[len(latencias) // 2] * 1000, 2) if latencias else None,
+            'latencia_p95_ms': round(latencias[int(len(latencias) * 0.95)] * 1000, 2) if latencias else None,
+        }, indent=2))
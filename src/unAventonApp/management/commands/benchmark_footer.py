@@ -0,0 +1,47 @@
+import timeit
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from unAventonApp.modules.Git import Git
+from unAventonApp.templatetags import unAventonApp_extras
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de render de una pagina (index.html) con el footer consultando git ' \
+           'en cada render y con los datos del deploy en memoria.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=50)
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        def render():
+            render_to_string('unAventonApp/index.html', {'footer': {}}, request=request)
+
+        # como estaba antes: dos procesos git por cada render
+        def currentbranch_git(value):
+            return Git(settings.BASE_DIR).getActuallBranch()
+
+        def lastupdate_git(value):
+            return Git(settings.BASE_DIR).git('log', '-1', '--pretty=format:Last commit %ar')
+
+        filtros = unAventonApp_extras.register.filters
+        originales = filtros['currentbranch'], filtros['lastupdate']
+        resultados = {}
+        try:
+            filtros['currentbranch'], filtros['lastupdate'] = currentbranch_git, lastupdate_git
+            render()
+            resultados['git en cada render'] = timeit.timeit(render, number=repeticiones)
+        finally:
+            filtros['currentbranch'], filtros['lastupdate'] = originales
+
+        render()
+        resultados['datos en memoria'] = timeit.timeit(render, number=repeticiones)
+
+        for nombre, total in resultados.items():
+            self.stdout.write('{0:<20} {1:8.3f} ms por render'.format(nombre, total * 1000 / repeticiones))
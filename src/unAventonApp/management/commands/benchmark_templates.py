@@ -0,0 +1,75 @@
+import copy
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from unAventonApp.models import Usuario, Viaje
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de respuesta (p50, casi todo render) de index.html, mis_viajes.html y ' \
+           'ver_datos_del_viaje.html para el piloto con mas viajes (ver generar_datos_sinteticos), ' \
+           'antes: templates sin cachear y navbar sin fragmento; despues: loader cacheado y navbar cacheada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=50)
+
+    def handle(self, *args, **options):
+        piloto = Usuario.objects.annotate(viajes=Count('auto__viaje')).order_by('-viajes').first()
+        viaje = Viaje.objects.activos().filter(auto__usuario=piloto).first()
+        if not (piloto and viaje):
+            raise CommandError('No hay datos, correr antes generar_datos_sinteticos')
+        paginas = [
+            ('index.html', '/'),
+            ('mis_viajes.html', '/misViajes'),
+            ('ver_datos_del_viaje.html', '/viaje/{0}/{1}/'.format(
+                viaje.pk, int(viaje.proxima_fecha_de_salida().timestamp()))),
+        ]
+
+        configuraciones = [
+            ('antes', self.get_templates(cacheados=False), 0),
+            ('despues', self.get_templates(cacheados=True), settings.APP_CACHE_NAVBAR_SEGUNDOS),
+        ]
+        resultados = {}
+        for nombre, templates, segundos_navbar in configuraciones:
+            with override_settings(TEMPLATES=templates, APP_CACHE_NAVBAR_SEGUNDOS=segundos_navbar):
+                cache.clear()
+                client = Client(HTTP_HOST='localhost')
+                client.force_login(piloto.user)
+                for template, url in paginas:
+                    resultados[(nombre, template)] = self.medir(client, url, options['repeticiones'])
+
+        self.stdout.write('{0:<26} {1:>12} {2:>12} {3:>9}'.format('template', 'antes ms', 'despues ms', 'queries'))
+        for template, _ in paginas:
+            antes, despues = resultados[('antes', template)], resultados[('despues', template)]
+            self.stdout.write('{0:<26} {1:12.2f} {2:12.2f} {3:>4} ->{4:>3}'.format(
+                template, antes['p50_ms'], despues['p50_ms'], antes['queries'], despues['queries']))
+
+    @staticmethod
+    def get_templates(cacheados):
+        templates = copy.deepcopy(settings.TEMPLATES)
+        for motor in templates:
+            loaders = motor['OPTIONS']['loaders']
+            if loaders and isinstance(loaders[0], tuple):
+                loaders = loaders[0][1]  # ya esta el cacheado, se saca
+            motor['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', loaders)] if cacheados \
+                else loaders
+        return templates
+
+    @staticmethod
+    def medir(client, url, repeticiones):
+        client.get(url)  # la primera compila los templates y llena los fragmentos
+        tiempos = []
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                response = client.get(url)
+                tiempos.append(time.perf_counter() - inicio)
+            if response.status_code != 200:
+                raise CommandError('{0} respondio {1}'.format(url, response.status_code))
+        tiempos.sort()
+        return {'p50_ms': tiempos[len(tiempos) // 2] * 1000, 'queries': len(capturadas)}
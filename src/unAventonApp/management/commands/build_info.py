@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from unAventonApp.templatetags.unAventonApp_extras import buildInfo
+
+
+class Command(BaseCommand):
+    help = 'Guarda el branch y el ultimo commit en build_info.json, lo corre el updater en cada deploy ' \
+           'para que el footer no tenga que consultar git.'
+
+    def handle(self, *args, **options):
+        buildInfo.escribir()
+        buildInfo.recargar()
+        self.stdout.write('{0}: branch {1}, ultimo commit {2}'.format(
+            buildInfo.archivo, buildInfo.branch(), buildInfo.fecha_ultimo_commit()))
@@ -0,0 +1,17 @@
+import json
+from django.core.management.base import BaseCommand
+from unAventonApp import mailer
+
+
+class Command(BaseCommand):
+    help = 'Envia los mails pendientes de la cola (por ejemplo desde cron, si se reinicio el servidor ' \
+           'con mails sin enviar) y muestra las metricas de la cola.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--solo-metricas', action='store_true', help='no envia, solo muestra la cola')
+
+    def handle(self, *args, **options):
+        if not options['solo_metricas']:
+            enviados = mailer.procesar_cola()
+            self.stdout.write('Se enviaron {0} mails'.format(enviados))
+        self.stdout.write(json.dumps(mailer.metricas.asJson(), indent=2))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from unAventonApp.models import Viaje
+
+
+class Command(BaseCommand):
+    help = 'Desactiva en un solo UPDATE los viajes cuya ultima salida ya paso. ' \
+           'Pensado para correr periodicamente (cron), las lecturas ya no desactivan viajes.'
+
+    def handle(self, *args, **options):
+        cantidad = Viaje.objects.expirar_vencidos()
+        self.stdout.write('Se desactivaron {0} viajes vencidos'.format(cantidad))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from unAventonApp import liquidaciones
+
+
+class Command(BaseCommand):
+    help = 'Exporta por salida los copilotos confirmados, lo cobrado, la comision y el reintegro a cada piloto ' \
+           'entre dos fechas (inclusive), en csv o json. Escribe a medida que lee, en memoria constante.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', required=True, help='AAAA-MM-DD')
+        parser.add_argument('--hasta', help='AAAA-MM-DD, por defecto hoy')
+        parser.add_argument('--formato', choices=sorted(liquidaciones.FORMATOS), default='csv')
+        parser.add_argument('--salida', help='archivo donde guardar, por defecto la salida estandar')
+
+    def handle(self, *args, **options):
+        try:
+            desde, hasta = liquidaciones.get_rango(options['desde'], options['hasta'])
+        except ValueError as e:
+            raise CommandError(e)
+        generar, _ = liquidaciones.FORMATOS[options['formato']]
+        if options['salida']:
+            with open(options['salida'], 'w', newline='') as archivo:
+                archivo.writelines(generar(desde, hasta))
+        else:
+            for parte in generar(desde, hasta):
+                self.stdout.write(parte, ending='')
@@ -0,0 +1,151 @@
+import datetime
+import random
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from unAventonApp.models import Usuario, Auto, CuentaBancaria, Tarjeta, Viaje, ViajeOcurrencia, ViajeCopiloto, \
+    ConversacionPublica, Reputacion
+
+DOMINIO = 'sintetico.unaventon'  # los usuarios generados tienen mails @sintetico.unaventon
+CIUDADES = ['La Plata', 'Buenos Aires', 'Rosario', 'Cordoba', 'Mar del Plata', 'Mendoza', 'Tandil', 'Bahia Blanca']
+CALIFICACIONES = [-1, 0, 1, 1, 1]
+
+
+class Command(BaseCommand):
+    help = 'Genera datos sinteticos (usuarios, autos, viajes unicos y repetidos, solicitudes en todos los ' \
+           'estados, calificaciones y preguntas) para medir con benchmark_endpoints. ' \
+           'Con la misma semilla y escala genera los mismos datos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=200)
+        parser.add_argument('--viajes-por-piloto', type=int, default=4)
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--borrar', action='store_true', help='borra los datos sinteticos generados antes')
+
+    def handle(self, *args, **options):
+        if options['borrar']:
+            self.borrar()
+            return
+        self.random = random.Random(options['semilla'])
+        # las fechas se generan relativas al dia de hoy
+        self.ahora = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        with transaction.atomic():
+            usuarios = self.crear_usuarios(options['usuarios'])
+            pilotos = usuarios[:max(1, len(usuarios) * 3 // 10)]
+            viajes = self.crear_viajes(pilotos, options['viajes_por_piloto'])
+            ocurrencias = self.crear_ocurrencias(viajes)
+            solicitudes = self.crear_solicitudes(viajes, ocurrencias, usuarios)
+            preguntas = self.crear_preguntas(viajes, usuarios)
+            Reputacion.objects.reconstruir()
+        self.stdout.write('Se generaron {0} usuarios, {1} viajes, {2} ocurrencias, {3} solicitudes y {4} preguntas'.format(
+            len(usuarios), len(viajes), ocurrencias['cantidad'], solicitudes, preguntas))
+        # completa los demas viajes activos y guarda el horizonte, asi las busquedas usan las ocurrencias
+        call_command('generar_ocurrencias', stdout=self.stdout)
+
+    def borrar(self):
+        with transaction.atomic():
+            usuarios = Usuario.objects.filter(user__email__endswith='@' + DOMINIO)
+            # Viaje.auto no borra en cascada
+            Viaje.objects.filter(auto__usuario__in=usuarios).delete()
+            cantidad, _ = User.objects.filter(email__endswith='@' + DOMINIO).delete()
+            Reputacion.objects.reconstruir()
+        self.stdout.write('Se borraron {0} registros sinteticos'.format(cantidad))
+
+    def crear_usuarios(self, cantidad):
+        # el hash de la clave es lento a proposito, se calcula una sola vez
+        clave = make_password('sintetico')
+        inicio = User.objects.filter(email__endswith='@' + DOMINIO).count()
+        usuarios = []
+        for i in range(inicio, inicio + cantidad):
+            mail = 'usuario{0}@{1}'.format(i, DOMINIO)
+            user = User.objects.create(username=mail, email=mail, password=clave)
+            usuario = Usuario.objects.create(user=user, nombre='Nombre{0}'.format(i), apellido='Apellido',
+                                             dni=str(30000000 + i))
+            usuario.tarjeta = Tarjeta.objects.create(usuario=usuario, numero=str(4500000000000000 + i))
+            usuarios.append(usuario)
+        return usuarios
+
+    def crear_viajes(self, pilotos, viajes_por_piloto):
+        viajes = []
+        for piloto in pilotos:
+            auto = Auto.objects.create(usuario=piloto, dominio='AA{0:03d}BB'.format(piloto.pk % 1000),
+                                       marca='Marca', modelo='Modelo', capacidad=self.random.choice([3, 4, 4, 5]))
+            cuenta = CuentaBancaria.objects.create(usuario=piloto, cbu=str(2850000000000000000000 + piloto.pk))
+            for _ in range(viajes_por_piloto):
+                salida = self.ahora + datetime.timedelta(days=self.random.randint(-60, 30),
+                                                         hours=self.random.randint(6, 22),
+                                                         minutes=self.random.choice([0, 15, 30, 45]))
+                frecuencia = self.random.choice([Viaje.NUNCA, Viaje.NUNCA, Viaje.DIARIO, Viaje.SEMANAL])
+                origen, destino = self.random.sample(CIUDADES, 2)
+                viajes.append(Viaje.objects.create(
+                    auto=auto, cuenta_bancaria=cuenta, origen=origen, destino=destino,
+                    fecha_hora_salida=salida, duracion=self.random.randint(1, 8),
+                    gasto_total=self.random.randint(5, 60) * 100, comentario='Viaje sintetico',
+                    se_repite=(frecuencia, salida.weekday()),
+                    # los viajes unicos que ya salieron los habria desactivado expirar_viajes
+                    activo=frecuencia != Viaje.NUNCA or salida > timezone.now()
+                ))
+        return viajes
+
+    def crear_ocurrencias(self, viajes):
+        """ como Viaje.generar_ocurrencias pero con un solo bulk_create para todos los viajes """
+        horizonte = ViajeOcurrencia.get_horizonte()
+        ocurrencias = []
+        salidas = {}
+        for viaje in viajes:
+            duracion = datetime.timedelta(hours=viaje.duracion)
+            salidas[viaje.pk] = list(viaje.get_fechas_de_salida_hasta(horizonte))
+            ocurrencias.extend(ViajeOcurrencia(viaje=viaje, fecha_hora_salida=salida,
+                                               fecha_hora_llegada=salida + duracion)
+                               for salida in salidas[viaje.pk])
+        ViajeOcurrencia.objects.bulk_create(ocurrencias, batch_size=500)
+        salidas['cantidad'] = len(ocurrencias)
+        return salidas
+
+    def crear_solicitudes(self, viajes, ocurrencias, usuarios):
+        """ solicitudes de copilotos en todos los estados, las pasadas confirmadas y casi todas calificadas """
+        limite = self.ahora + datetime.timedelta(days=30)
+        solicitudes = []
+        for viaje in viajes:
+            salidas = [salida for salida in ocurrencias[viaje.pk] if salida <= limite]
+            candidatos = [usuario for usuario in usuarios if usuario.pk != viaje.auto.usuario_id]
+            for salida in self.random.sample(salidas, min(6, len(salidas))):
+                paso = salida < timezone.now()
+                confirmados = 0
+                for copiloto in self.random.sample(candidatos, self.random.randint(1, 4)):
+                    solicitud = ViajeCopiloto(usuario=copiloto, viaje=viaje, fecha_del_viaje=salida,
+                                              tarjeta=copiloto.tarjeta,
+                                              fecha_hora_de_solicitud=salida - datetime.timedelta(days=2))
+                    estado = self.random.choice(['confirmado', 'confirmado', 'espera', 'rechazado'])
+                    if estado == 'confirmado' and confirmados < viaje.auto.capacidad - 1:
+                        confirmados += 1
+                        solicitud.estaConfirmado = True
+                        if paso and self.random.random() < 0.8:
+                            solicitud.calificacion_a_piloto = self.random.choice(CALIFICACIONES)
+                        if paso and self.random.random() < 0.8:
+                            solicitud.calificacion_a_copiloto = self.random.choice(CALIFICACIONES)
+                    elif estado == 'rechazado' or paso:
+                        solicitud.estaConfirmado = False
+                        solicitud.rechazoElPiloto = True
+                    solicitudes.append(solicitud)
+        ViajeCopiloto.objects.bulk_create(solicitudes, batch_size=500)
+        return len(solicitudes)
+
+    def crear_preguntas(self, viajes, usuarios):
+        preguntas = []
+        for viaje in viajes:
+            for usuario in self.random.sample(usuarios, self.random.randint(0, 3)):
+                if usuario.pk == viaje.auto.usuario_id:
+                    continue
+                respondida = self.random.random() < 0.5
+                preguntas.append(ConversacionPublica(
+                    viaje=viaje, usuario=usuario, pregunta='Se puede llevar equipaje?',
+                    fechaHoraPregunta=timezone.now() - datetime.timedelta(days=1),
+                    respuesta='Si' if respondida else None,
+                    fechaHoraRespuesta=timezone.now() if respondida else None
+                ))
+        ConversacionPublica.objects.bulk_create(preguntas, batch_size=500)
+        return len(preguntas)
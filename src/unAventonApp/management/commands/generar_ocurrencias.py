@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from unAventonApp.models import Viaje, ViajeOcurrencia
+
+
+class Command(BaseCommand):
+    help = 'Materializa las salidas de los viajes activos hasta el horizonte configurado. ' \
+           'Pensado para correr una vez por dia (cron), asi el horizonte avanza.'
+
+    def handle(self, *args, **options):
+        hasta = ViajeOcurrencia.get_horizonte()
+        creadas = 0
+        for viaje in Viaje.objects.filter(activo=True).iterator():
+            creadas += viaje.generar_ocurrencias(hasta)
+        # recien ahora estan todas, las busquedas pueden usar la tabla hasta aca
+        ViajeOcurrencia.set_horizonte_materializado(hasta)
+        self.stdout.write('Se crearon {0} ocurrencias, horizonte {1}'.format(creadas, hasta))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from unAventonApp.models import Reputacion
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las reputaciones de todos los usuarios desde las calificaciones de ViajeCopiloto. ' \
+           'Las calificaciones mantienen las reputaciones al dia, esto es para cargarlas o corregirlas.'
+
+    def handle(self, *args, **options):
+        cantidad = Reputacion.objects.reconstruir()
+        self.stdout.write('Se reconstruyeron {0} reputaciones'.format(cantidad))
@@ -0,0 +1,76 @@
+""" Instrumentacion opcional por request (APP_INSTRUMENTACION en settings).
+Mide tiempo total, cantidad y tiempo de queries, queries repetidas (firmas N+1) y tamaño
+de la respuesta. Los requests que pasan los umbrales se escriben como json en el log
+'unAventonApp.instrumentacion'. Desactivada, Django la saca de la cadena (MiddlewareNotUsed). """
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+import json
+import logging
+import re
+import time
+
+logger = logging.getLogger('unAventonApp.instrumentacion')
+
+
+def get_firma(sql):
+    """ la query sin los valores, las listas IN de distinto largo cuentan como la misma """
+    return re.sub(r'IN \((?:%s, )*%s\)', 'IN (...)', sql)
+
+
+class RegistroSQL:
+    """ execute_wrapper que cuenta las queries de un request """
+
+    def __init__(self):
+        self.cantidad = 0
+        self.tiempo = 0.0
+        self.firmas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo += time.perf_counter() - inicio
+            self.cantidad += 1
+            self.firmas[get_firma(sql)] += 1
+
+    def get_repetidas(self, cantidad=5):
+        return [{'sql': sql, 'veces': veces} for sql, veces in self.firmas.most_common(cantidad) if veces > 1]
+
+
+class InstrumentacionMiddleware:
+    def __init__(self, get_response):
+        if not settings.APP_INSTRUMENTACION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        registro = RegistroSQL()
+        inicio = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(registro))
+            response = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        response['Server-Timing'] = 'total;dur={0:.1f}, sql;dur={1:.1f}'.format(duracion * 1000,
+                                                                               registro.tiempo * 1000)
+        lento = duracion * 1000 >= settings.APP_INSTRUMENTACION_UMBRAL_MS or \
+            registro.cantidad >= settings.APP_INSTRUMENTACION_UMBRAL_QUERIES
+        if lento or logger.isEnabledFor(logging.DEBUG):
+            data = {
+                'metodo': request.method,
+                'path': request.path,
+                'vista': request.resolver_match.view_name if request.resolver_match else None,
+                'status': response.status_code,
+                'tiempo_ms': round(duracion * 1000, 1),
+                'queries': registro.cantidad,
+                'tiempo_sql_ms': round(registro.tiempo * 1000, 1),
+                'bytes': None if response.streaming else len(response.content),
+                'repetidas': registro.get_repetidas(),
+            }
+            logger.log(logging.WARNING if lento else logging.DEBUG, json.dumps(data))
+        return response
@@ -0,0 +1,54 @@
+# Generated by Django 2.0.8 on 2026-10-18 08:50
+
+import ast
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def generar_ocurrencias_existentes(apps, schema_editor):
+    # los modelos historicos no tienen los metodos de Viaje, se replica get_fechas_de_salida_hasta
+    Viaje = apps.get_model('unAventonApp', 'Viaje')
+    ViajeOcurrencia = apps.get_model('unAventonApp', 'ViajeOcurrencia')
+    horizonte = timezone.now() + datetime.timedelta(days=settings.APP_HORIZONTE_OCURRENCIAS_DIAS)
+    for viaje in Viaje.objects.all().iterator():
+        frecuencia = ast.literal_eval(viaje.se_repite)[0] if viaje.se_repite else 'nunca'
+        hasta = horizonte if viaje.activo else min(horizonte, timezone.now())
+        duracion = datetime.timedelta(hours=viaje.duracion)
+        fechas = []
+        fecha = viaje.fecha_hora_salida
+        if frecuencia == 'nunca':
+            fechas = [fecha] if fecha <= hasta else []
+        else:
+            paso = datetime.timedelta(days=1) if frecuencia == 'diario' else datetime.timedelta(weeks=1)
+            while fecha <= hasta:
+                fechas.append(fecha)
+                fecha += paso
+        ViajeOcurrencia.objects.bulk_create(
+            ViajeOcurrencia(viaje=viaje, fecha_hora_salida=f, fecha_hora_llegada=f + duracion) for f in fechas
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unAventonApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViajeOcurrencia',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_hora_salida', models.DateTimeField(db_index=True)),
+                ('fecha_hora_llegada', models.DateTimeField()),
+                ('viaje', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocurrencias', to='unAventonApp.Viaje')),
+            ],
+            options={
+                'unique_together': {('viaje', 'fecha_hora_salida')},
+            },
+        ),
+        migrations.RunPython(generar_ocurrencias_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.0.8 on 2026-10-18 08:52
+
+import ast
+from django.db import migrations, models
+
+
+def separar_se_repite(apps, schema_editor):
+    # se_repite guardaba el string de una tupla, ej: "('semanal', 3)"
+    Viaje = apps.get_model('unAventonApp', 'Viaje')
+    for viaje in Viaje.objects.all().iterator():
+        frecuencia = ast.literal_eval(viaje.se_repite)[0] if viaje.se_repite else 'nunca'
+        viaje.frecuencia = frecuencia
+        viaje.dia_semana = None if frecuencia == 'diario' else viaje.fecha_hora_salida.weekday()
+        viaje.save(update_fields=['frecuencia', 'dia_semana'])
+
+
+def unir_se_repite(apps, schema_editor):
+    Viaje = apps.get_model('unAventonApp', 'Viaje')
+    for viaje in Viaje.objects.all().iterator():
+        viaje.se_repite = str((viaje.frecuencia, -1 if viaje.dia_semana is None else viaje.dia_semana))
+        viaje.save(update_fields=['se_repite'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unAventonApp', '0002_viajeocurrencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='viaje',
+            name='dia_semana',
+            field=models.SmallIntegerField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='viaje',
+            name='frecuencia',
+            field=models.CharField(choices=[('nunca', 'Viaje unico'), ('diario', 'Diario'), ('semanal', 'Semanal')], default='nunca', max_length=7),
+        ),
+        migrations.RunPython(separar_se_repite, unir_se_repite),
+        migrations.RemoveField(
+            model_name='viaje',
+            name='se_repite',
+        ),
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['frecuencia', 'dia_semana'], name='viaje_frecuencia_idx'),
+        ),
+    ]
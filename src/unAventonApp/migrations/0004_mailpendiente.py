@@ -0,0 +1,35 @@
+# Generated by Django 2.0.8 on 2026-10-18 08:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unAventonApp', '0003_frecuencia_dia_semana'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailPendiente',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remitente', models.CharField(default=None, max_length=254, null=True)),
+                ('destinatarios', models.TextField()),
+                ('asunto', models.CharField(max_length=250)),
+                ('mensaje', models.TextField()),
+                ('fecha_de_creacion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('intentos', models.IntegerField(default=0)),
+                ('lote', models.CharField(db_index=True, default=None, max_length=32, null=True)),
+                ('enviado', models.BooleanField(default=False)),
+                ('fecha_de_envio', models.DateTimeField(default=None, null=True)),
+                ('ultimo_error', models.CharField(default=None, max_length=250, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='mailpendiente',
+            index=models.Index(fields=['enviado', 'proximo_intento'], name='mail_pendiente_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.0.8 on 2026-10-18 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unAventonApp', '0004_mailpendiente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reputacion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rol', models.CharField(choices=[('piloto', 'Piloto'), ('copiloto', 'Copiloto')], max_length=8)),
+                ('suma', models.IntegerField(default=0)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('negativas', models.IntegerField(default=0)),
+                ('neutrales', models.IntegerField(default=0)),
+                ('positivas', models.IntegerField(default=0)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reputaciones', to='unAventonApp.Usuario')),
+            ],
+            options={
+                'unique_together': {('usuario', 'rol')},
+            },
+        ),
+    ]
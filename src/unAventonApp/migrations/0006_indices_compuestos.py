@@ -0,0 +1,29 @@
+# Generated by Django 2.0.8 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unAventonApp', '0005_reputacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversacionpublica',
+            index=models.Index(fields=['viaje', 'respuesta'], name='conversacion_viaje_resp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viaje',
+            index=models.Index(fields=['activo', 'origen', 'destino'], name='viaje_activo_origen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viajecopiloto',
+            index=models.Index(fields=['viaje', 'fecha_del_viaje', 'estaConfirmado'], name='copiloto_viaje_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viajecopiloto',
+            index=models.Index(fields=['usuario', 'estaConfirmado', 'fecha_del_viaje'], name='copiloto_usuario_estado_idx'),
+        ),
+    ]
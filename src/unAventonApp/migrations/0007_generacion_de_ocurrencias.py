@@ -0,0 +1,22 @@
+# Generated by Django 2.0.8 on 2026-10-18 09:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unAventonApp', '0006_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneracionDeOcurrencias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('hasta', models.DateTimeField()),
+            ],
+        ),
+    ]
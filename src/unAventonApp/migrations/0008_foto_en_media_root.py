@@ -0,0 +1,19 @@
+# Generated by Django 2.0.8 on 2026-10-18 09:47
+
+import django.core.files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unAventonApp', '0007_generacion_de_ocurrencias'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usuario',
+            name='foto_de_perfil',
+            field=models.ImageField(default='assets/default-user.png', storage=django.core.files.storage.FileSystemStorage(), upload_to=''),
+        ),
+    ]
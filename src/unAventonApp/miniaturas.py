@@ -0,0 +1,87 @@
+""" Miniaturas cuadradas de las fotos de perfil, en JPEG y sin EXIF.
+Se generan al subir la foto (Usuario.cambiar_foto_de_perfil) o la primera vez que se piden,
+y quedan en disco junto a la original: media/miniaturas/<nombre de la foto>_<lado>.jpg """
+from PIL import Image, ImageOps
+import os
+import tempfile
+
+NAVBAR = 38
+CONVERSACION = 50
+# cada lado tambien en 2x para pantallas de alta densidad (srcset)
+LADOS = [lado * escala for lado in (NAVBAR, CONVERSACION) for escala in (1, 2)]
+CALIDAD = 85
+
+# transformaciones para el tag EXIF Orientation (274), Pillow 5 no tiene ImageOps.exif_transpose
+ORIENTACIONES = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+
+def get_nombre(nombre, lado):
+    base, _ = os.path.splitext(nombre)
+    return 'miniaturas/{0}_{1}.jpg'.format(base, lado)
+
+
+def orientar(imagen):
+    """ aplica la rotacion que indica el EXIF, al guardar la miniatura el EXIF se pierde """
+    exif = imagen._getexif() if hasattr(imagen, '_getexif') else None
+    orientacion = (exif or {}).get(274)
+    if orientacion in ORIENTACIONES:
+        return imagen.transpose(ORIENTACIONES[orientacion])
+    return imagen
+
+
+def a_rgb(imagen):
+    """ JPEG no tiene transparencia, los png y gif se apoyan sobre fondo blanco """
+    if imagen.mode == 'RGB':
+        return imagen
+    imagen = imagen.convert('RGBA')
+    fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+    fondo.paste(imagen, mask=imagen.split()[3])
+    return fondo
+
+
+def generar(storage, nombre, lado):
+    with storage.open(nombre) as archivo:
+        imagen = Image.open(archivo)
+        # los gif animados usan el primer cuadro
+        miniatura = ImageOps.fit(a_rgb(orientar(imagen)), (lado, lado), Image.LANCZOS)
+    destino = storage.path(get_nombre(nombre, lado))
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    # se escribe aparte y se renombra, otro request nunca ve una miniatura a medio escribir
+    descriptor, temporal = tempfile.mkstemp(suffix='.jpg', dir=os.path.dirname(destino))
+    try:
+        with os.fdopen(descriptor, 'wb') as salida:
+            miniatura.save(salida, 'JPEG', quality=CALIDAD, optimize=True, progressive=True)
+        os.replace(temporal, destino)
+    except BaseException:
+        os.remove(temporal)
+        raise
+
+
+def get_url(foto, lado):
+    """ url de la miniatura de un ImageField, si no existe la genera.
+    Si la original no se puede leer como imagen, retorna la url de la original """
+    nombre = get_nombre(foto.name, lado)
+    if not foto.storage.exists(nombre):
+        try:
+            generar(foto.storage, foto.name, lado)
+        except (OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+            return foto.url
+    return foto.storage.url(nombre)
+
+
+def generar_todas(foto):
+    for lado in LADOS:
+        get_url(foto, lado)
+
+
+def borrar(foto):
+    for lado in LADOS:
+        foto.storage.delete(get_nombre(foto.name, lado))
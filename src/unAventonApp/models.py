@@ -1,6 +1,6 @@
-from django.db import models, IntegrityError
+from django.db import models, IntegrityError, transaction
 from django.contrib.auth.models import User
-from django.db.models import Count, Min, Sum, Avg
+from django.db.models import Count, Min, Sum, Avg, Q, F
 import json
 from django.utils import timezone
 from django.conf import settings
@@ -10,9 +10,16 @@ from django.core.files.storage import FileSystemStorage
 from . import utils
 import datetime
 from . import mailer
+from . import agenda
+from . import elegibilidad
+from . import miniaturas
+from . import versiones
 from django.urls import reverse
+from django.core.mail import EmailMessage
+from django.core.cache import cache
 
-fotoStorage = FileSystemStorage(location='media/')
+# sin location sigue a MEDIA_ROOT (los tests lo cambian por un directorio temporal), antes dependia del cwd
+fotoStorage = FileSystemStorage()
 
 
 class Usuario(models.Model):
@@ -26,13 +33,65 @@ class Usuario(models.Model):
     def get_url_calificion_detalle(self):
         return reverse('ver_calificaciones_de_usuario', kwargs={'id': self.pk})
 
+    @staticmethod
+    def get_clave_preguntas_sin_responder(usuario_id):
+        return 'usuario:{0}:preguntas_sin_responder'.format(usuario_id)
+
+    @staticmethod
+    def invalidar_preguntas_sin_responder(*usuarios_ids):
+        """ se llama cuando se agrega o responde una pregunta, o cambia el estado de un viaje """
+        cache.delete_many([Usuario.get_clave_preguntas_sin_responder(pk) for pk in usuarios_ids])
+
     def count_preguntas_sin_responder(self):
-        conversacion = ConversacionPublica.objects.filter(viaje__auto__usuario=self, respuesta__isnull=True)
-        return len(list(filter(lambda x: x.viaje.esta_activo(), conversacion)))
+        # la navbar lo usa varias veces por pagina, se memoriza en la instancia y en el cache
+        if getattr(self, '_preguntas_sin_responder', None) is None:
+            clave = Usuario.get_clave_preguntas_sin_responder(self.pk)
+            cantidad = cache.get(clave)
+            if cantidad is None:
+                cantidad = ConversacionPublica.objects.filter(viaje__auto__usuario=self, viaje__activo=True,
+                                                              respuesta__isnull=True).count()
+                cache.set(clave, cantidad, settings.APP_CACHE_PREGUNTAS_SEGUNDOS)
+            self._preguntas_sin_responder = cantidad
+        return self._preguntas_sin_responder
 
     def tiene_preguntas_para_responder(self):
         return self.count_preguntas_sin_responder() > 0
 
+    def get_version(self):
+        """ sello de version del usuario (versiones.py), para las claves de los fragmentos cacheados """
+        if getattr(self, '_version', None) is None:
+            clave = versiones.get_clave_usuario(self.pk)
+            self._version = versiones.get_versiones(clave)[clave]
+        return self._version
+
+    def get_url_miniatura(self, lado):
+        return miniaturas.get_url(self.foto_de_perfil, lado)
+
+    def get_foto_navbar(self):
+        return self.get_url_miniatura(miniaturas.NAVBAR)
+
+    def get_foto_navbar_2x(self):
+        return self.get_url_miniatura(2 * miniaturas.NAVBAR)
+
+    def get_foto_conversacion(self):
+        return self.get_url_miniatura(miniaturas.CONVERSACION)
+
+    def get_foto_conversacion_2x(self):
+        return self.get_url_miniatura(2 * miniaturas.CONVERSACION)
+
+    def cambiar_foto_de_perfil(self, archivo):
+        """ reemplaza la foto, genera sus miniaturas y borra la anterior con las suyas """
+        if not str(self.foto_de_perfil.name).count('default-user.png'):
+            miniaturas.borrar(self.foto_de_perfil)
+            self.foto_de_perfil.delete(save=False)
+        self.foto_de_perfil = archivo
+        self.save()
+        miniaturas.generar_todas(self.foto_de_perfil)
+        # la conversacion publica de los viajes se cachea con las urls de las fotos (ver_datos_del_viaje.html)
+        viajes = ConversacionPublica.objects.filter(Q(usuario=self) | Q(viaje__auto__usuario=self)) \
+            .values_list('viaje_id', flat=True).distinct()
+        versiones.tocar(*[versiones.get_clave_viaje(viaje_id) for viaje_id in viajes])
+
     def asJsonMinified(self):
         return {
             'id': self.pk,
@@ -54,106 +113,34 @@ class Usuario(models.Model):
     def __str__(self):
         return "{0} {1}".format(self.nombre, self.apellido)
 
-    def puede_crear_viaje(self, fecha_hora_salida, duracion):
+    def puede_crear_viaje(self, fecha_hora_salida, duracion, frecuencia='nunca'):
         # no tiene calificaciones pendientes
-        # tiene auto
-        # tiene tarjeta de credito
-        # no tiene otro viaje en el mismo horario
-        mensaje = {'error': []}
-        # esta tratando de hacer un viaje de un dia anterior?
-        if fecha_hora_salida < timezone.datetime.now():
-            mensaje['error'].append({110: 'El viaje debe ser posterior a la fecha actual.'})
-
-        pendientes = self.tiene_calificicaciones_pendientes_desde_mas_del_maximo_de_dias_permitidos()
-
-        if pendientes:
-            plural = "es" if pendientes > 1 else ""
-            mensaje['error'].append(
-                {101: 'Tenes {0} calificacion{1} pendiente{2} por hacer'.format(pendientes, plural, plural[1])})
-
-        if (self.se_superpone_algun_viaje_como_piloto(fecha_hora_salida, duracion)):
-            mensaje['error'].append(
-                {102: 'Tenes algun viaje como piloto en el mismo rango horario.'})
-
-        if (self.se_superpone_algun_viaje_como_copiloto(fecha_hora_salida, duracion)):
-            mensaje['error'].append(
-                {103: 'Tenes algun viaje aceptado como copiloto en el mismo rango horario ingresado.'})
-
-        return True if not len(mensaje['error']) else False, mensaje
+        # no tiene otro viaje en el mismo horario (en ninguna de las salidas si se repite)
+        impedimentos = elegibilidad.get_impedimentos_para_crear(self, fecha_hora_salida, duracion, frecuencia)
+        return not impedimentos, {'error': impedimentos}
 
     def se_superpone_algun_viaje_como_copiloto(self, fecha_hora_salida, duracion):
         ##check que no este en uso en otro viaje en el mismo rango horario como copiloto
-        viajes_como_copiloto = self.get_viajes_confirmados_como_copiloto().filter(
-            fecha_del_viaje__year=fecha_hora_salida.year,
-            fecha_del_viaje__month=fecha_hora_salida.month,
-            fecha_del_viaje__day=fecha_hora_salida.day)
-
-        print(viajes_como_copiloto)
-        return self.__se_superpone_rango_horario(fecha_hora_salida, duracion, viajes_como_copiloto)
+        return agenda.se_superpone(self, fecha_hora_salida, duracion, como_piloto=False)
 
     def se_superpone_algun_viaje_como_piloto(self, fecha_hora_salida, duracion):
         ##check que no este en uso en otro viaje en el mismo rango horario como piloto
-        viajes_activos = self.get_viajes_creados_activos().filter(fecha_hora_salida__lte=fecha_hora_salida)
-
-        viajes_diarios = self.get_viajes_diarios_activos().filter(fecha_hora_salida__lte=fecha_hora_salida)
-        week_day = datetime.datetime.fromtimestamp(fecha_hora_salida.timestamp()).weekday()
-        viajes_semanales = self.get_viajes_semanales_activos_para_weekday(week_day).filter(
-            fecha_hora_salida__lte=fecha_hora_salida)
-        viajes_mismo_dia = viajes_activos.filter(
-            fecha_hora_salida__year=fecha_hora_salida.year,
-            fecha_hora_salida__month=fecha_hora_salida.month,
-            fecha_hora_salida__day=fecha_hora_salida.day)
-        sp = self.__se_superpone_rango_horario
-        return sp(fecha_hora_salida, duracion, viajes_mismo_dia) or sp(fecha_hora_salida, duracion,
-                                                                       viajes_diarios) or sp(fecha_hora_salida,
-                                                                                             duracion, viajes_semanales)
+        return agenda.se_superpone(self, fecha_hora_salida, duracion, como_copiloto=False)
 
     def se_superpone_algun_viaje(self, fecha_hora_salida, duracion):
-        return self.se_superpone_algun_viaje_como_copiloto(fecha_hora_salida, duracion) \
-               or \
-               self.se_superpone_algun_viaje_como_piloto(fecha_hora_salida, duracion)
-
-    @staticmethod
-    def __se_superpone_rango_horario(fecha_hora_inicio, duracion, viajesCollection):
-        # FIXME: para viajes semanales, y diarios, si la fecha es anterior a otro viaje creado, no chequea el solapamiento
-        duracion = int(duracion)
-        fecha_hora_salida_start = datetime.datetime(1, 1, 1, fecha_hora_inicio.hour, fecha_hora_inicio.minute)
-        fecha_hora_salida_end = utils.sumar_horas(fecha_hora_inicio.hour, fecha_hora_inicio.minute, duracion, 0)
-        slow_value = datetime.timedelta(0, 0)
-
-        for viaje in viajesCollection:
-            fecha_hora_getter = 'fecha_del_viaje' if type(viaje) == ViajeCopiloto else 'fecha_hora_salida'
-            duracion_viaje = viaje.viaje.duracion if type(viaje) == ViajeCopiloto else viaje.duracion
-
-            viaje_datetime_start = datetime.datetime(1, 1, 1, viaje.__getattribute__(fecha_hora_getter).hour,
-                                                     viaje.__getattribute__(fecha_hora_getter).minute)
-            viaje_datetime_end = utils.sumar_horas(viaje.__getattribute__(fecha_hora_getter).hour,
-                                                   viaje.__getattribute__(fecha_hora_getter).minute,
-                                                   duracion_viaje, 0)
-
-            overlap = utils.get_overlap(slow_value, viaje_datetime_start, viaje_datetime_end, fecha_hora_salida_start,
-                                        fecha_hora_salida_end)
-            if overlap > datetime.timedelta(0, 0):
-                return True
-        return False
+        return agenda.se_superpone(self, fecha_hora_salida, duracion)
 
     def get_viajes_diarios_activos(self):
-        return self.get_viajes_creados_activos().filter(se_repite__contains='diario')
+        return self.get_viajes_creados_activos().filter(frecuencia=Viaje.DIARIO)
 
     def get_viajes_semanales_activos(self):
-        return self.get_viajes_creados_activos().filter(se_repite__contains='semanal')
+        return self.get_viajes_creados_activos().filter(frecuencia=Viaje.SEMANAL)
 
     def get_viajes_semanales_activos_para_weekday(self, weekday):
-        return self.get_viajes_semanales_activos().filter(se_repite__contains=weekday)
+        return self.get_viajes_semanales_activos().filter(dia_semana=int(weekday))
 
     def tiene_calificicaciones_pendientes_desde_mas_del_maximo_de_dias_permitidos(self):
-        maximo_dias = settings.APP_MAX_DIAS_CALIFICACION_PENDIENTES
-        fecha = datetime.datetime.now() - datetime.timedelta(days=maximo_dias)
-        a = len(ViajeCopiloto.objects.filter(usuario=self, estaConfirmado=True, fecha_del_viaje__lte=fecha,
-                                             calificacion_a_piloto=None))
-        b = len(ViajeCopiloto.objects.filter(viaje__auto__usuario=self, estaConfirmado=True, fecha_del_viaje__lte=fecha,
-                                             calificacion_a_copiloto=None))
-        return a > 0 or b > 0
+        return elegibilidad.get_estado(self)['calificaciones_pendientes']
 
     def tiene_calificicaciones_pendientes(self):
         return self.get_calificaciones_pendientes_para_piloto() or self.get_calificaciones_pendientes_para_copilotos()
@@ -169,22 +156,21 @@ class Usuario(models.Model):
                                             calificacion_a_copiloto__isnull=False).extra(
             select={'calificacion': 'calificacion_a_copiloto', 'mensaje': 'calificacion_a_copiloto_mensaje'})
 
+    def get_reputacion(self, rol):
+        """ el registro de reputacion del usuario en ese rol, None si todavia no tiene calificaciones """
+        if not hasattr(self, '_reputaciones'):
+            self._reputaciones = {}
+        if rol not in self._reputaciones:
+            self._reputaciones[rol] = Reputacion.objects.filter(usuario=self, rol=rol).first()
+        return self._reputaciones[rol]
+
     def get_puntaje_como_piloto(self):
-        viajes_realizados = ViajeCopiloto.objects.filter(viaje__auto__usuario=self, calificacion_a_piloto__isnull=False)
-        puntaje = viajes_realizados.aggregate(Sum('calificacion_a_piloto'))['calificacion_a_piloto__sum']
-        if puntaje != None:
-            return puntaje if puntaje > 0 else 0
-        else:
-            return 0
+        reputacion = self.get_reputacion(Reputacion.PILOTO)
+        return reputacion.get_puntaje() if reputacion else 0
 
     def get_puntaje_como_copiloto(self):
-        viajes_realizados = ViajeCopiloto.objects.filter(usuario=self, calificacion_a_copiloto__isnull=False,
-                                                         estaConfirmado__isnull=False)
-        puntaje = viajes_realizados.aggregate(Sum('calificacion_a_copiloto'))['calificacion_a_copiloto__sum']
-        if puntaje != None:
-            return puntaje if puntaje > 0 else 0
-        else:
-            return 0
+        reputacion = self.get_reputacion(Reputacion.COPILOTO)
+        return reputacion.get_puntaje() if reputacion else 0
 
     def get_calificaciones_pendientes_para_piloto(self):
         pass
@@ -206,21 +192,21 @@ class Usuario(models.Model):
         return Viaje.objects.filter(auto__usuario=self)
 
     def get_viajes_creados_activos(self):
-        """ Todos los viajes que creados por el usuario, no finalizados"""
-        viajes_activos = self.get_viajes_creados().filter(activo=True)
-        flag = False
-        for viaje in viajes_activos:
-            if viaje.proxima_fecha_de_salida() < timezone.now():
-                flag = True
-                viaje.desactivar()
-        if flag:
-            viajes_activos = self.get_viajes_creados().filter(activo=True)
-
-        return viajes_activos
+        """ Todos los viajes que creados por el usuario, no finalizados.
+        Solo lectura, el comando expirar_viajes es el que los desactiva en la base """
+        return Viaje.objects.activos().filter(auto__usuario=self)
+
+    def get_salidas_finalizadas(self):
+        """ una fila por salida pasada de los viajes del usuario que tuvo copilotos confirmados,
+        con los montos calculados en SQL (ver ViajeCopilotoManager.liquidaciones) """
+        return ViajeCopiloto.objects.liquidaciones().filter(
+            viaje__auto__usuario=self,
+            fecha_del_viaje__lte=timezone.now()
+        ).order_by('-fecha_del_viaje', '-viaje')
 
     def get_viajes_finalizados(self):
         """ Todos los viajes que creados por el usuario, finalizados"""
-        return self.get_viajes_creados().exclude(self.get_viajes_creados_activos())
+        return self.get_viajes_creados().exclude(pk__in=self.get_viajes_creados_activos().values('pk'))
 
     def get_tarjetas_de_credito(self):
         return Tarjeta.objects.filter(usuario=self, esta_activo=True)
@@ -248,7 +234,7 @@ class Usuario(models.Model):
         return json_info
 
     def get_viajes_unicos_activos(self):
-        return self.get_viajes_creados_activos().filter(se_repite__contains='nunca')
+        return self.get_viajes_creados_activos().filter(frecuencia=Viaje.NUNCA)
 
     def tiene_la_cuenta_bancaria_en_uso(self, unaCuentaBancaria):
         return len(self.get_viajes_creados_activos().filter(cuenta_bancaria=unaCuentaBancaria,
@@ -290,6 +276,10 @@ class Tarjeta(models.Model):
     ccv = models.IntegerField(null=True)
     esta_activo = models.BooleanField(default=True)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        elegibilidad.invalidar(self.usuario_id)
+
     def desactivar(self):
         self.esta_activo = False
         self.save()
@@ -362,6 +352,25 @@ class Auto(models.Model):
 
 
 class ViajeManager(models.Manager):
+    def vencidos(self):
+        """ viajes marcados como activos cuya ultima salida ya paso,
+        los diarios y semanales siempre tienen una proxima salida """
+        return self.filter(activo=True, frecuencia=Viaje.NUNCA, fecha_hora_salida__lt=timezone.now())
+
+    def activos(self):
+        """ viajes activos y no vencidos, aunque el barrido todavia no los haya desactivado """
+        return self.filter(activo=True).exclude(frecuencia=Viaje.NUNCA, fecha_hora_salida__lt=timezone.now())
+
+    def expirar_vencidos(self):
+        """ desactiva todos los viajes vencidos con un solo UPDATE, retorna la cantidad """
+        vencidos = self.vencidos()
+        viajes = list(vencidos.values_list('pk', 'auto__usuario'))
+        cantidad = vencidos.update(activo=False)
+        Usuario.invalidar_preguntas_sin_responder(*{piloto_id for _, piloto_id in viajes})
+        # update() no dispara los signals
+        versiones.tocar(*[versiones.get_clave_viaje(viaje_id) for viaje_id, _ in viajes])
+        return cantidad
+
     def create_viaje(self, usuario=..., **kwargs):
         __json = {
             'creado': False,
@@ -372,13 +381,16 @@ class ViajeManager(models.Manager):
         if not cuenta_bancaria:
             __json['error'].append({0: 'La cuenta bancaria no corresponde al usuario conductor'})
 
-        puede_crear, mensaje = usuario.puede_crear_viaje(kwargs['fecha_hora_salida'], kwargs['duracion'])
+        puede_crear, mensaje = usuario.puede_crear_viaje(kwargs['fecha_hora_salida'], kwargs['duracion'],
+                                                          kwargs.get('frecuencia', Viaje.NUNCA))
         if not puede_crear:
             __json['error'].extend(mensaje['error'])
 
         if not len(__json['error']):
-            # no hay errores, entonces se guarda
-            viaje = self.create(**kwargs)
+            # no hay errores, entonces se guarda. Sin ocurrencias el viaje no apareceria en las busquedas
+            with transaction.atomic():
+                viaje = self.create(**kwargs)
+                viaje.generar_ocurrencias()
             __json['id'] = viaje.pk
             __json['creado'] = True
             # viaje.delete()
@@ -388,9 +400,25 @@ class ViajeManager(models.Manager):
 
 
 class Viaje(models.Model):
+    NUNCA = 'nunca'
+    DIARIO = 'diario'
+    SEMANAL = 'semanal'
+    FRECUENCIAS = (
+        (NUNCA, 'Viaje unico'),
+        (DIARIO, 'Diario'),
+        (SEMANAL, 'Semanal'),
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['frecuencia', 'dia_semana'], name='viaje_frecuencia_idx'),
+            models.Index(fields=['activo', 'origen', 'destino'], name='viaje_activo_origen_idx'),
+        ]
+
     auto = models.ForeignKey(Auto, on_delete=models.DO_NOTHING)
     auto_lugares_ocupados_de_antemano = models.IntegerField(default=0)  # estos no se cobran
-    se_repite = models.CharField(default=None, null=True, max_length=50)
+    frecuencia = models.CharField(max_length=7, choices=FRECUENCIAS, default=NUNCA)
+    dia_semana = models.SmallIntegerField(default=None, null=True)  # 0=lunes, None para los diarios
     cuenta_bancaria = models.ForeignKey(CuentaBancaria, on_delete=models.DO_NOTHING)
     gasto_total = models.FloatField(default=0.0)
     comentario = models.CharField(max_length=150)
@@ -403,6 +431,33 @@ class Viaje(models.Model):
 
     objects = ViajeManager()
 
+    def invalidar_cache(self):
+        """ descarta los valores memorizados en la instancia (proxima salida y ocupacion por fecha).
+        Las instancias viven lo que dura un request, asi que el cache tambien. Es por instancia:
+        ViajeCopiloto.save solo invalida el viaje que tiene cargado en su relacion, otra instancia
+        del mismo viaje leida antes en el request conserva la ocupacion vieja (releerla con refresh_from_db) """
+        self.__dict__.pop('_proxima_fecha_de_salida', None)
+        self.__dict__.pop('_ocupacion_en_fecha', None)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.invalidar_cache()
+        # las preguntas de viajes inactivos no se cuentan en la navbar del piloto
+        Usuario.invalidar_preguntas_sin_responder(self.auto.usuario_id)
+
+    @property
+    def se_repite(self):
+        """ compatibilidad con el formato viejo, el string de la tupla ej: ('semanal', 3) """
+        return str((self.frecuencia, -1 if self.dia_semana is None else self.dia_semana))
+
+    @se_repite.setter
+    def se_repite(self, valor):
+        # acepta la tupla (frecuencia, weekday) o su string
+        import ast
+        frecuencia, dia = ast.literal_eval(valor) if isinstance(valor, str) else valor
+        self.frecuencia = frecuencia
+        self.dia_semana = None if int(dia) < 0 else int(dia)
+
     def __str__(self):
         return "id={0} {1} , de {2} a {3}, fecha {4}".format(self.pk, self.auto.usuario, self.origen, self.destino,
                                                              self.fecha_hora_salida)
@@ -417,19 +472,17 @@ class Viaje(models.Model):
         # retorna un booleano, si el viaje cae en la fecha unaFecha, no chequea por hora
         fecha = datetime.datetime.strptime(unaFecha, '%Y-%m-%d')
         # viaje semanal
-        if self.se_repite.count('sem'):
+        if self.frecuencia == Viaje.SEMANAL:
             return (self.fecha_hora_salida.weekday() == fecha.weekday()) and (
                     self.fecha_hora_salida.date() <= fecha.date())
         # viaje unico
-        elif self.se_repite.count('nun'):
+        elif self.frecuencia == Viaje.NUNCA:
             return self.fecha_hora_salida.date() == fecha.date()
 
         # viaje diario
-        elif self.se_repite.count('dia'):
+        elif self.frecuencia == Viaje.DIARIO:
             return self.fecha_hora_salida.date() <= fecha.date()
 
-        # TODO: @seba checkear
-
     def caeEnLaHora(self, unaHora):
         # retorna un booleano, si el viaje cae en la hora unaHora, no chequea por fecha
         def crear_hora(hora, minuto):
@@ -467,46 +520,70 @@ class Viaje(models.Model):
         return self.datos_del_viaje_en_fecha(self.proxima_fecha_de_salida())
 
     def eliminar(self):
-        self.activo = False
-        conjunto = set()
-        mails = set()
-
-        viajeCopilotos = ViajeCopiloto.objects.filter(viaje=self, estaConfirmado=True)
-        for viajCop in viajeCopilotos:
-            mails.add(viajCop.usuario.user.email)
-            if viajCop.fecha_del_viaje not in conjunto:
-                viajCop.cancelarCopiloto()
-            else:
-                viajCop.rechazarCopiloto()
-            conjunto.add(viajCop.fecha_del_viaje)
-
-        # ahora vamos a rechazar a todos los copilotos a futuro para este viaje
-
-        viajeCopilotos_sin_confirmar = ViajeCopiloto.objects.filter(viaje=self, estaConfirmado=None,
-                                                                    fecha_del_viaje__gte=datetime.datetime.now())
-        for viaje_copiloto in viajeCopilotos_sin_confirmar:
-            mails.add(viaje_copiloto.usuario.user.email)
-            viaje_copiloto.rechazarCopiloto()
-        self.save()
-
-        mailer.send_email(None, subject="Viaje eliminado",
-                          message="El piloto ha decidido eliminar el viaje origen {0}, destino {1}, por lo tanto su solicitud fue cancelada.\nY se reintegrara el total cobrado por cada viaje. (El costo por cada viaje fue de={2}) ".format(
-                              self.origen, self.destino, self.get_costo_por_pasajero()
-                          ),
-                          list_of_mails=list(mails))
+        """ desactiva el viaje y cancela todas sus solicitudes futuras en una transaccion, con una cantidad
+        fija de queries. Por cada salida la primera solicitud confirmada lleva la penalidad al piloto,
+        el resto de las confirmadas y las pendientes se rechazan. Las salidas pasadas quedan como historial.
+        Retorna la cantidad de solicitudes afectadas y de mails enviados """
+        ahora = timezone.now()
+        confirmadas = Q(estaConfirmado=True)
+        pendientes = Q(estaConfirmado=None)
+        with transaction.atomic():
+            solicitudes = ViajeCopiloto.objects.filter(viaje=self, fecha_del_viaje__gte=ahora)
+            # se bloquean las filas, nadie confirma ni se baja mientras tanto
+            afectadas = list(solicitudes.filter(confirmadas | pendientes).select_for_update(of=('self',)).values_list(
+                'usuario__user__email', 'fecha_del_viaje'))
+            penalizadas = list(solicitudes.filter(pk__in=solicitudes.filter(confirmadas).values(
+                'fecha_del_viaje').annotate(primera=Min('pk')).values('primera')).values_list(
+                'pk', 'calificacion_a_piloto'))
+            ids_penalizadas = [pk for pk, _ in penalizadas]
+
+            cantidad_confirmadas = solicitudes.filter(confirmadas).update(
+                estaConfirmado=False,
+                rechazoElPiloto=True,
+                calificacion_a_piloto=models.Case(
+                    models.When(pk__in=ids_penalizadas, then=models.Value(-1)),
+                    default=F('calificacion_a_piloto')),
+                calificacion_a_piloto_mensaje=models.Case(
+                    models.When(pk__in=ids_penalizadas, then=models.Value(ViajeCopiloto.MENSAJE_PENALIDAD)),
+                    default=F('calificacion_a_piloto_mensaje')),
+            )
+            cantidad_pendientes = solicitudes.filter(pendientes).update(estaConfirmado=False, rechazoElPiloto=True)
+            # update() no pasa por ViajeCopiloto.save, la reputacion y los sellos se actualizan aca
+            Reputacion.objects.actualizar_varias(self.auto.usuario_id, Reputacion.PILOTO,
+                                                 [(anterior, -1) for _, anterior in penalizadas])
+            versiones.tocar(*{versiones.get_clave_salida(self.pk, fecha) for _, fecha in afectadas})
+
+            self.activo = False
+            self.save()
+            self.borrar_ocurrencias_futuras()
+
+            mails = sorted({mail for mail, _ in afectadas})
+            if mails:
+                mailer.send_email(None, subject="Viaje eliminado",
+                                  message="El piloto ha decidido eliminar el viaje origen {0}, destino {1}, por lo tanto su solicitud fue cancelada.\nY se reintegrara el total cobrado por cada viaje. (El costo por cada viaje fue de={2}) ".format(
+                                      self.origen, self.destino, self.get_costo_por_pasajero()
+                                  ),
+                                  list_of_mails=mails)
+        return {
+            'confirmadas_canceladas': cantidad_confirmadas,
+            'penalidades': len(penalizadas),
+            'pendientes_rechazadas': cantidad_pendientes,
+            'mails': len(mails),
+        }
 
     def proxima_fecha_de_salida(self):
-        import ast
-        se_repite = ast.literal_eval(self.se_repite)
-        # se_repite una variable tipo tupla ej: ('semanal',3)
-        # donde el elemento [1] es el weekday, solo valido para tipo semanal
+        # los memos se crean al usarlos, no en __init__, asi cargar viajes en bloque no cuesta nada extra
+        if getattr(self, '_proxima_fecha_de_salida', None) is None:
+            self._proxima_fecha_de_salida = self.__calcular_proxima_fecha_de_salida()
+        return self._proxima_fecha_de_salida
 
-        if self.se_repite.count('nun'):
+    def __calcular_proxima_fecha_de_salida(self):
+        if self.frecuencia == Viaje.NUNCA:
             return self.fecha_hora_salida
 
         """ Calculo para viajes semanales"""
 
-        if self.se_repite.count('sem'):
+        if self.frecuencia == Viaje.SEMANAL:
             # es mayor a hoy la fecha, asique retorno de una el valor
             if timezone.now() < self.fecha_hora_salida:
                 return self.fecha_hora_salida
@@ -522,7 +599,7 @@ class Viaje(models.Model):
 
         """ Calculo para viajes diarios"""
 
-        if self.se_repite.count('dia'):
+        if self.frecuencia == Viaje.DIARIO:
             # es mayor a hoy la fecha, asique retorno de una el valor
             if timezone.now() < self.fecha_hora_salida:
                 return self.fecha_hora_salida
@@ -540,10 +617,60 @@ class Viaje(models.Model):
     def activar(self):
         self.activo = True
         self.save()
+        self.generar_ocurrencias()
 
     def desactivar(self):
         self.activo = False
         self.save()
+        self.borrar_ocurrencias_futuras()
+
+    def get_fechas_de_salida_hasta(self, hasta):
+        """ genera cada salida concreta del viaje, desde la primera hasta la fecha hasta """
+        if self.frecuencia == Viaje.NUNCA:
+            if self.fecha_hora_salida <= hasta:
+                yield self.fecha_hora_salida
+            return
+        paso = datetime.timedelta(days=1) if self.frecuencia == Viaje.DIARIO else datetime.timedelta(weeks=1)
+        fecha = self.fecha_hora_salida
+        while fecha <= hasta:
+            yield fecha
+            fecha += paso
+
+    def get_fechas_de_salida_entre(self, desde, hasta):
+        """ como get_fechas_de_salida_hasta, pero salta directo a la primera salida desde desde """
+        if self.frecuencia == Viaje.NUNCA:
+            if desde <= self.fecha_hora_salida <= hasta:
+                yield self.fecha_hora_salida
+            return
+        paso = datetime.timedelta(days=1) if self.frecuencia == Viaje.DIARIO else datetime.timedelta(weeks=1)
+        fecha = self.fecha_hora_salida
+        if fecha < desde:
+            pasos, resto = divmod(desde - fecha, paso)
+            fecha += paso * (pasos + (1 if resto else 0))
+        while fecha <= hasta:
+            yield fecha
+            fecha += paso
+
+    def generar_ocurrencias(self, hasta=None):
+        """ materializa las salidas del viaje hasta el horizonte configurado,
+        solo crea las que todavia no existen. Retorna la cantidad creada """
+        if hasta is None:
+            hasta = ViajeOcurrencia.get_horizonte()
+        existentes = set(self.ocurrencias.values_list('fecha_hora_salida', flat=True))
+        duracion = datetime.timedelta(hours=float(self.duracion))
+        nuevas = [
+            ViajeOcurrencia(viaje=self, fecha_hora_salida=fecha, fecha_hora_llegada=fecha + duracion)
+            for fecha in self.get_fechas_de_salida_hasta(hasta) if fecha not in existentes
+        ]
+        ViajeOcurrencia.objects.bulk_create(nuevas)
+        return len(nuevas)
+
+    def borrar_ocurrencias_futuras(self):
+        # las pasadas quedan como historial para los reportes de viajes finalizados
+        self.ocurrencias.filter(fecha_hora_salida__gt=timezone.now()).delete()
+
+    def get_ocurrencias_en_rango(self, desde, hasta):
+        return self.ocurrencias.filter(fecha_hora_salida__gte=desde, fecha_hora_salida__lt=hasta)
 
     def esta_activo(self):
         return self.activo
@@ -561,15 +688,35 @@ class Viaje(models.Model):
     def get_comision_a_cobrar(self):
         return self.comision * self.gasto_total
 
+    def get_ocupacion_en_fecha(self, fecha):
+        """ una sola query con los contadores de copilotos del viaje en la fecha,
+        la comparten los asientos disponibles, los confirmados, el total cobrado, etc """
+        if not hasattr(self, '_ocupacion_en_fecha'):
+            self._ocupacion_en_fecha = {}
+        if fecha not in self._ocupacion_en_fecha:
+            self._ocupacion_en_fecha[fecha] = ViajeCopiloto.objects.filter(
+                viaje=self,
+                fecha_del_viaje=fecha
+            ).aggregate(
+                confirmados=Count('pk', filter=Q(estaConfirmado=True)),
+                en_espera=Count('pk', filter=Q(estaConfirmado__isnull=True)),
+                calificaciones_pendientes=Count('pk', filter=Q(estaConfirmado=True,
+                                                               calificacion_a_copiloto__isnull=True)),
+            )
+        return self._ocupacion_en_fecha[fecha]
+
     # ready
     def get_total_cobrado_fecha(self, fecha):
-        return len(self.get_copilotos_confirmados_en_fecha(fecha)) * self.get_costo_por_pasajero()
+        return self.get_ocupacion_en_fecha(fecha)['confirmados'] * self.get_costo_por_pasajero()
 
     # ready
     def get_total_cobrado(self):
         return self.get_total_cobrado_fecha(self.proxima_fecha_de_salida())
 
     def get_costo_por_pasajero(self):
+        # el buscador ya lo trae calculado desde SQL
+        if hasattr(self, 'costo_por_pasajero'):
+            return self.costo_por_pasajero
         return self.gasto_total / self.auto.capacidad
 
     def get_estado_del_viaje(self):
@@ -578,14 +725,12 @@ class Viaje(models.Model):
         return ""
 
     def get_se_repite_asString(self):
-        import ast
-        frecuencia, dia = ast.literal_eval(self.se_repite)
         dias = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
-        if frecuencia == 'diario':
+        if self.frecuencia == Viaje.DIARIO:
             return "Este viaje se repite todas los dias"
-        elif frecuencia == 'semanal':
-            return "Se repite todos los " + dias[dia].capitalize() + ", todas las semanas."
-        elif frecuencia == 'nunca':
+        elif self.frecuencia == Viaje.SEMANAL:
+            return "Se repite todos los " + dias[self.dia_semana].capitalize() + ", todas las semanas."
+        elif self.frecuencia == Viaje.NUNCA:
             return "Viaje unico"
         return "Sin datos"
 
@@ -606,13 +751,15 @@ class Viaje(models.Model):
             'activo': self.esta_activo(),
             'se_repite': self.get_se_repite_asString(),
         }
-        usuarios_confirmados = self.get_copilotos_confirmados()
+        usuarios_confirmados = self.get_copilotos_confirmados().select_related('usuario')
         if usuarios_confirmados:
-            data['usuarios_confirmados'] = [obj.asJsonMinified() for obj in usuarios_confirmados]
+            data['usuarios_confirmados'] = [obj.usuario.asJsonMinified() for obj in usuarios_confirmados]
 
         return data
 
-    def asJsonPublicacion(self, usuario=None):
+    def asJsonPublicacion(self, usuario=None, inscripciones=None):
+        """ inscripciones es un set opcional de (viaje_id, fecha_del_viaje) del usuario,
+        si no se pasa se consulta para este viaje """
         data = {
             'id': self.pk,
             'origen': self.origen,
@@ -626,10 +773,14 @@ class Viaje(models.Model):
             'auto': self.auto.asJson(),
         }
         if usuario:
+            if inscripciones is not None:
+                esta_inscripto = (self.pk, self.fecha_hora_salida) in inscripciones
+            else:
+                esta_inscripto = ViajeCopiloto.objects.filter(usuario=usuario, viaje=self,
+                                                              fecha_del_viaje=self.fecha_hora_salida).exists()
             data.update({
-                'esta_incripto': True if len(ViajeCopiloto.objects.filter(usuario=usuario, viaje=self,
-                                                                          fecha_del_viaje=self.fecha_hora_salida)) > 0 else False,
-                'es_piloto': usuario.pk == self.auto.usuario.pk
+                'esta_incripto': esta_inscripto,
+                'es_piloto': usuario.pk == self.auto.usuario_id
             })
         return data
 
@@ -647,13 +798,8 @@ class Viaje(models.Model):
 
     # ready
     def get_count_copilots_confirmados_en_fecha(self, fecha):
-        return len(Usuario.objects.filter(
-            pk__in=ViajeCopiloto.objects.filter(
-                viaje=self,
-                estaConfirmado=True,
-                fecha_del_viaje=fecha
-            ).values('usuario__pk')
-        ))
+        # unique_together (usuario, viaje, fecha_del_viaje), cada confirmado es un usuario distinto
+        return self.get_ocupacion_en_fecha(fecha)['confirmados']
 
     # ready
     def get_count_copilotos_confirmados(self):
@@ -661,13 +807,7 @@ class Viaje(models.Model):
 
     # ready
     def get_asientos_disponibles_en_fecha(self, fecha):
-        asientos_ocupados = ViajeCopiloto.objects.filter(
-            viaje=self,
-            fecha_del_viaje=fecha,
-            estaConfirmado=True
-        ).aggregate(
-            Count('usuario')
-        )['usuario__count']
+        asientos_ocupados = self.get_ocupacion_en_fecha(fecha)['confirmados']
         return self.auto.capacidad - asientos_ocupados - self.auto_lugares_ocupados_de_antemano
 
     # ready
@@ -692,7 +832,7 @@ class Viaje(models.Model):
 
     # ready
     def get_count_copilotos_en_lista_de_espera_en_fecha(self, fecha):
-        return len(ViajeCopiloto.objects.filter(viaje=self, estaConfirmado=None, fecha_del_viaje=fecha))
+        return self.get_ocupacion_en_fecha(fecha)['en_espera']
 
     # ready
     def get_count_copilotos_en_lista_de_espera(self):
@@ -713,15 +853,7 @@ class Viaje(models.Model):
         return ConversacionPrivada.objects.filter(viaje=self).order_by('-fechaHora')
 
     def tiene_calificacion_pendientes_a_copilotos_en_fecha(self, fecha):
-        vc = ViajeCopiloto.objects.filter(
-            viaje=self,
-            fecha_del_viaje=fecha,
-            estaConfirmado=True,
-            calificacion_a_copiloto=None
-        )
-        for v in vc:
-            print(v.pk)
-        return True if vc else False
+        return self.get_ocupacion_en_fecha(fecha)['calificaciones_pendientes'] > 0
 
     def tiene_calificacion_pendientes_a_copilotos(self):
         self.tiene_calificacion_pendientes_a_copilotos_en_fecha(self.proxima_fecha_de_salida())
@@ -734,9 +866,92 @@ class Viaje(models.Model):
         return self.get_comision_cobrada_en_fecha(self.proxima_fecha_de_salida())
 
 
+class ViajeOcurrencia(models.Model):
+    """ Cada salida concreta de un viaje (unico, diario o semanal).
+    Se materializan hasta settings.APP_HORIZONTE_OCURRENCIAS_DIAS dias a futuro,
+    el comando generar_ocurrencias corre el horizonte hacia adelante. """
+    CLAVE_HORIZONTE = 'ocurrencias:horizonte'
+
+    class Meta:
+        unique_together = (('viaje', 'fecha_hora_salida'),)
+
+    viaje = models.ForeignKey(Viaje, on_delete=models.CASCADE, related_name='ocurrencias')
+    fecha_hora_salida = models.DateTimeField(db_index=True)
+    fecha_hora_llegada = models.DateTimeField()
+
+    @staticmethod
+    def get_horizonte():
+        """ hasta donde se materializa al generar ahora """
+        return timezone.now() + datetime.timedelta(days=settings.APP_HORIZONTE_OCURRENCIAS_DIAS)
+
+    @staticmethod
+    def get_horizonte_materializado():
+        """ hasta donde la tabla tiene las salidas de todos los viajes activos, lo registra generar_ocurrencias
+        (GeneracionDeOcurrencias, el cache solo evita la query). Los viajes que se crean o activan despues
+        generan hasta mas lejos. Mas alla de esta fecha se usa la regla de repeticion """
+        horizonte = cache.get(ViajeOcurrencia.CLAVE_HORIZONTE)
+        if horizonte is None:
+            horizonte = GeneracionDeOcurrencias.objects.order_by('-pk').values_list('hasta', flat=True).first()
+            if horizonte is None:
+                # nunca corrio, se usa la regla desde ahora
+                return timezone.now()
+            cache.set(ViajeOcurrencia.CLAVE_HORIZONTE, horizonte, None)
+        return horizonte
+
+    @staticmethod
+    def set_horizonte_materializado(hasta):
+        GeneracionDeOcurrencias.objects.create(hasta=hasta)
+        cache.set(ViajeOcurrencia.CLAVE_HORIZONTE, hasta, None)
+
+    def __str__(self):
+        return "Viaje id={0}, salida {1}".format(self.viaje_id, self.fecha_hora_salida)
+
+
+class GeneracionDeOcurrencias(models.Model):
+    """ cada corrida completa de generar_ocurrencias, la ultima dice hasta donde estan materializadas """
+    fecha = models.DateTimeField(default=timezone.now)
+    hasta = models.DateTimeField()
+
+    def __str__(self):
+        return "Ocurrencias hasta {0} ({1})".format(self.hasta, self.fecha)
+
+
+class ViajeCopilotoManager(models.Manager):
+    def liquidaciones(self, **campos):
+        """ una fila por salida (viaje, fecha_del_viaje) con copilotos confirmados, con los montos de
+        datos_del_viaje_en_fecha calculados en SQL: {'viaje', 'fecha_del_viaje', 'confirmados',
+        'calificaciones_pendientes', 'total_cobrado', 'comision_cobrada', 'total_a_reintegrar'}
+        mas los campos pedidos (nombre=F(...)), que tienen que depender del viaje para no cambiar la agrupacion """
+        total_cobrado = models.ExpressionWrapper(
+            Count('pk') * F('viaje__gasto_total') / F('viaje__auto__capacidad'), output_field=models.FloatField())
+        comision = models.ExpressionWrapper(F('viaje__comision') * F('viaje__gasto_total'),
+                                            output_field=models.FloatField())
+        # como get_total_a_reintegrar_al_conductor_en_fecha y get_comision_cobrada_en_fecha
+        hay_reintegro = models.Q(total_cobrado__gt=F('comision_a_cobrar'))
+        return self.filter(estaConfirmado=True).values('viaje', 'fecha_del_viaje', **campos).annotate(
+            confirmados=Count('pk'),
+            calificaciones_pendientes=Count('pk', filter=Q(calificacion_a_copiloto__isnull=True)),
+            total_cobrado=total_cobrado,
+            comision_a_cobrar=comision,
+        ).annotate(
+            comision_cobrada=models.Case(models.When(hay_reintegro, then=F('comision_a_cobrar')),
+                                         default=models.Value(0.0), output_field=models.FloatField()),
+            total_a_reintegrar=models.Case(models.When(hay_reintegro, then=F('total_cobrado') - F('comision_a_cobrar')),
+                                           default=models.Value(0.0), output_field=models.FloatField()),
+        )
+
+
 class ViajeCopiloto(models.Model):
     class Meta:
         unique_together = (('usuario', 'viaje', 'fecha_del_viaje'),)
+        indexes = [
+            # ocupacion y listas de copilotos de un viaje en una fecha
+            models.Index(fields=['viaje', 'fecha_del_viaje', 'estaConfirmado'], name='copiloto_viaje_fecha_idx'),
+            # viajes confirmados / en espera de un copiloto
+            models.Index(fields=['usuario', 'estaConfirmado', 'fecha_del_viaje'], name='copiloto_usuario_estado_idx'),
+        ]
+
+    MENSAJE_PENALIDAD = "Penalidad por cancelacion a un copiloto confirmado."
 
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)  # el copiloto
     viaje = models.ForeignKey(Viaje, on_delete=models.CASCADE)
@@ -750,9 +965,44 @@ class ViajeCopiloto(models.Model):
     calificacion_a_copiloto_mensaje = models.CharField(max_length=150, default=None, null=True, blank=True)
     rechazoElPiloto = models.NullBooleanField(default=None, null=True)
 
+    objects = ViajeCopilotoManager()
+
     def get_absolute_url(self):
         return self.viaje.get_absolute_url_en_fecha(self.fecha_del_viaje)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._calificaciones_guardadas = instance.get_calificaciones()
+        return instance
+
+    def get_calificaciones(self):
+        """ lo que esta fila suma a la reputacion del piloto y del copiloto, None si no suma nada """
+        piloto = None if self.calificacion_a_piloto is None else int(self.calificacion_a_piloto)
+        copiloto = None
+        if self.calificacion_a_copiloto is not None and self.estaConfirmado is not None:
+            copiloto = int(self.calificacion_a_copiloto)
+        return piloto, copiloto
+
+    def save(self, *args, **kwargs):
+        anteriores = getattr(self, '_calificaciones_guardadas', (None, None))
+        actuales = self.get_calificaciones()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # las reputaciones se actualizan en la misma transaccion que la calificacion
+            if anteriores[0] != actuales[0]:
+                piloto_id = Viaje.objects.filter(pk=self.viaje_id).values_list('auto__usuario', flat=True).get()
+                Reputacion.objects.actualizar(piloto_id, Reputacion.PILOTO, anteriores[0], actuales[0])
+                elegibilidad.invalidar(self.usuario_id)
+            if anteriores[1] != actuales[1]:
+                Reputacion.objects.actualizar(self.usuario_id, Reputacion.COPILOTO, anteriores[1], actuales[1])
+                elegibilidad.invalidar(Viaje.objects.filter(pk=self.viaje_id).values_list(
+                    'auto__usuario', flat=True).get())
+        self._calificaciones_guardadas = actuales
+        # la ocupacion memorizada en el viaje cambio
+        if ViajeCopiloto.viaje.is_cached(self):
+            self.viaje.invalidar_cache()
+
     def calificar_a_copiloto(self, calificacion, comentario):
         self.calificacion_a_copiloto = calificacion
         self.calificacion_a_copiloto_mensaje = comentario
@@ -799,7 +1049,7 @@ class ViajeCopiloto(models.Model):
         self.estaConfirmado = False
         self.rechazoElPiloto = True
         self.calificacion_a_piloto = -1
-        self.calificacion_a_piloto_mensaje = "Penalidad por cancelacion a un copiloto confirmado."
+        self.calificacion_a_piloto_mensaje = ViajeCopiloto.MENSAJE_PENALIDAD
         self.save()
 
     def __str__(self):
@@ -815,6 +1065,109 @@ class ViajeCopiloto(models.Model):
         }
 
 
+class ReputacionManager(models.Manager):
+    def actualizar(self, usuario_id, rol, anterior, actual, crear=True):
+        """ aplica con F() la diferencia entre la calificacion anterior y la actual
+        (None es que no estaba o ya no esta calificado) """
+        self.actualizar_varias(usuario_id, rol, [(anterior, actual)], crear)
+
+    def actualizar_varias(self, usuario_id, rol, calificaciones, crear=True):
+        """ como actualizar, con una lista de (anterior, actual) en un solo update.
+        Sin crear solo descuenta de un registro que ya existe (al borrar calificaciones puede
+        estar borrandose el usuario, y su registro con el) """
+        cambios = {}
+        for anterior, actual in calificaciones:
+            for calificacion, signo in ((anterior, -1), (actual, 1)):
+                if calificacion is None:
+                    continue
+                for campo, valor in (('suma', calificacion), ('cantidad', 1),
+                                     (Reputacion.get_columna(calificacion), 1)):
+                    cambios[campo] = cambios.get(campo, 0) + signo * valor
+        if not any(cambios.values()):
+            return
+        if crear:
+            self.get_or_create(usuario_id=usuario_id, rol=rol)
+        self.filter(usuario_id=usuario_id, rol=rol).update(
+            **{campo: F(campo) + valor for campo, valor in cambios.items() if valor})
+        versiones.tocar(versiones.get_clave_usuario(usuario_id))
+
+    def reconstruir(self):
+        """ recalcula todas las reputaciones desde las calificaciones, retorna la cantidad de registros """
+        def columnas(campo):
+            return dict(
+                suma=Sum(campo),
+                cantidad=Count('pk'),
+                negativas=Count('pk', filter=Q(**{campo + '__lt': 0})),
+                neutrales=Count('pk', filter=Q(**{campo: 0})),
+                positivas=Count('pk', filter=Q(**{campo + '__gt': 0})),
+            )
+
+        como_piloto = ViajeCopiloto.objects.filter(calificacion_a_piloto__isnull=False).values(
+            id_usuario=F('viaje__auto__usuario')).annotate(**columnas('calificacion_a_piloto'))
+        como_copiloto = ViajeCopiloto.objects.filter(calificacion_a_copiloto__isnull=False,
+                                                     estaConfirmado__isnull=False).values(
+            id_usuario=F('usuario')).annotate(**columnas('calificacion_a_copiloto'))
+
+        reputaciones = []
+        for rol, filas in ((Reputacion.PILOTO, como_piloto), (Reputacion.COPILOTO, como_copiloto)):
+            for fila in filas:
+                reputaciones.append(Reputacion(usuario_id=fila.pop('id_usuario'), rol=rol, **fila))
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(reputaciones)
+        return len(reputaciones)
+
+
+class Reputacion(models.Model):
+    """ suma e histograma de las calificaciones de un usuario en un rol, se mantiene
+    al calificar asi leer la reputacion no necesita agregar todos los ViajeCopiloto """
+    PILOTO = 'piloto'
+    COPILOTO = 'copiloto'
+    ROLES = (
+        (PILOTO, 'Piloto'),
+        (COPILOTO, 'Copiloto'),
+    )
+
+    class Meta:
+        unique_together = (('usuario', 'rol'),)
+
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='reputaciones')
+    rol = models.CharField(max_length=8, choices=ROLES)
+    suma = models.IntegerField(default=0)
+    cantidad = models.IntegerField(default=0)
+    negativas = models.IntegerField(default=0)  # incluye las penalidades por cancelar (-1)
+    neutrales = models.IntegerField(default=0)
+    positivas = models.IntegerField(default=0)
+
+    objects = ReputacionManager()
+
+    @staticmethod
+    def get_columna(calificacion):
+        if calificacion < 0:
+            return 'negativas'
+        return 'neutrales' if calificacion == 0 else 'positivas'
+
+    def get_puntaje(self):
+        return self.suma if self.suma > 0 else 0
+
+    def get_promedio(self):
+        return self.suma / self.cantidad if self.cantidad else 0
+
+    def asJson(self):
+        return {
+            'rol': self.rol,
+            'puntaje': self.get_puntaje(),
+            'cantidad': self.cantidad,
+            'promedio': self.get_promedio(),
+            'negativas': self.negativas,
+            'neutrales': self.neutrales,
+            'positivas': self.positivas,
+        }
+
+    def __str__(self):
+        return "Reputacion de {0} como {1}: {2}".format(self.usuario_id, self.rol, self.suma)
+
+
 class ConversacionPrivada(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     viaje = models.ForeignKey(Viaje, on_delete=models.CASCADE)
@@ -823,9 +1176,62 @@ class ConversacionPrivada(models.Model):
 
 
 class ConversacionPublica(models.Model):
+    class Meta:
+        indexes = [
+            # preguntas sin responder de un viaje (navbar y detalle del viaje)
+            models.Index(fields=['viaje', 'respuesta'], name='conversacion_viaje_resp_idx'),
+        ]
+
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     viaje = models.ForeignKey(Viaje, on_delete=models.CASCADE)
     pregunta = models.CharField(max_length=150)
     respuesta = models.CharField(max_length=150, default=None, null=True)
     fechaHoraPregunta = models.DateTimeField(auto_created=True)
     fechaHoraRespuesta = models.DateTimeField(default=None, null=True)
+
+
+class MailPendienteManager(models.Manager):
+    def pendientes(self, ahora=None):
+        return self.filter(enviado=False, intentos__lt=settings.APP_MAIL_MAX_INTENTOS,
+                           proximo_intento__lte=ahora or timezone.now())
+
+    def fallidos(self):
+        return self.filter(enviado=False, intentos__gte=settings.APP_MAIL_MAX_INTENTOS)
+
+
+class MailPendiente(models.Model):
+    """ cola de salida de mails, ver mailer.py """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['enviado', 'proximo_intento'], name='mail_pendiente_idx'),
+        ]
+
+    remitente = models.CharField(max_length=254, default=None, null=True)
+    destinatarios = models.TextField()  # lista en json
+    asunto = models.CharField(max_length=250)
+    mensaje = models.TextField()
+    fecha_de_creacion = models.DateTimeField(default=timezone.now)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    intentos = models.IntegerField(default=0)
+    lote = models.CharField(max_length=32, default=None, null=True, db_index=True)
+    enviado = models.BooleanField(default=False)
+    fecha_de_envio = models.DateTimeField(default=None, null=True)
+    ultimo_error = models.CharField(max_length=250, default=None, null=True)
+
+    objects = MailPendienteManager()
+
+    def asEmailMessage(self, connection=None):
+        return EmailMessage(self.asunto, self.mensaje, self.remitente, json.loads(self.destinatarios),
+                            connection=connection)
+
+    def registrar_error(self, error):
+        """ se reintenta mas tarde, cada vez esperando el doble """
+        self.intentos += 1
+        self.proximo_intento = timezone.now() + mailer.get_backoff(self.intentos)
+        self.ultimo_error = str(error)[:250]
+        self.lote = None
+        self.save(update_fields=['intentos', 'proximo_intento', 'ultimo_error', 'lote'])
+
+    def __str__(self):
+        return "{0} -> {1} ({2})".format(self.asunto, self.destinatarios, "enviado" if self.enviado else "pendiente")
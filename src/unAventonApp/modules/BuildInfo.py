@@ -0,0 +1,72 @@
+import datetime
+import json
+import os
+import threading
+from .Git import Git
+
+
+class BuildInfo:
+    """ Branch y fecha del ultimo commit del deploy.
+    Se leen una sola vez por proceso: del archivo que escribe el updater en cada deploy
+    (build_info.json) o, si no existe, preguntandole a git. Se vuelven a leer solo si
+    el archivo cambia, asi el footer no forkea git en cada pagina. """
+
+    NOMBRE_ARCHIVO = 'build_info.json'
+
+    def __init__(self, path):
+        self.path = path
+        self.archivo = os.path.join(path, self.NOMBRE_ARCHIVO)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._datos = None
+
+    @staticmethod
+    def leer_de_git(path):
+        git = Git(path)
+        timestamp = git.git('log', '-1', '--pretty=format:%ct').strip()
+        return {
+            'branch': git.getActuallBranch().strip(),
+            'commit_timestamp': int(timestamp) if timestamp else None,
+        }
+
+    def escribir(self):
+        """ lo usa el updater despues de actualizar el codigo """
+        with open(self.archivo, 'w') as archivo:
+            json.dump(self.leer_de_git(self.path), archivo)
+
+    def __mtime_del_archivo(self):
+        try:
+            return os.stat(self.archivo).st_mtime
+        except OSError:
+            return None
+
+    def get_datos(self):
+        mtime = self.__mtime_del_archivo()
+        if self._datos is None or mtime != self._mtime:
+            with self._lock:
+                if self._datos is None or mtime != self._mtime:
+                    self.recargar(mtime)
+        return self._datos
+
+    def recargar(self, mtime=None):
+        datos = None
+        if mtime is not None:
+            try:
+                with open(self.archivo) as archivo:
+                    datos = json.load(archivo)
+            except (OSError, ValueError):
+                datos = None
+        if datos is None:
+            try:
+                datos = self.leer_de_git(self.path)
+            except (OSError, IndexError):
+                datos = {'branch': '', 'commit_timestamp': None}
+        self._datos = datos
+        self._mtime = mtime
+
+    def branch(self):
+        return self.get_datos()['branch']
+
+    def fecha_ultimo_commit(self):
+        timestamp = self.get_datos()['commit_timestamp']
+        return datetime.datetime.fromtimestamp(timestamp) if timestamp else None
@@ -1,18 +1,19 @@
 import subprocess
-import os
 import re
 
 
 class runCommand:
+    cwd = None
 
     def execute(self, *command):
         command = list(command)
-        return subprocess.run(command, stdout=subprocess.PIPE)
+        return subprocess.run(command, stdout=subprocess.PIPE, cwd=self.cwd)
 
 
 class Git(runCommand):
     def __init__(self, path):
-        os.chdir(path)
+        # no se hace chdir, es global al proceso y no es seguro con threads
+        self.cwd = path
 
     def git(self, *args):
         return self.execute('git', *args).stdout.decode()
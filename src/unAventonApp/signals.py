@@ -0,0 +1,45 @@
+""" Receivers de los modelos, se conectan al importar este modulo en UnaventonappConfig.ready """
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from . import versiones
+from .models import Usuario, Auto, Viaje, ViajeCopiloto, ConversacionPublica, Tarjeta, Reputacion
+
+
+@receiver([post_save, post_delete], sender=Viaje)
+def viaje_modificado(sender, instance, **kwargs):
+    versiones.tocar(versiones.get_clave_viaje(instance.pk))
+
+
+@receiver(post_delete, sender=ViajeCopiloto)
+def solicitud_borrada(sender, instance, **kwargs):
+    # ViajeCopiloto.save mantiene las reputaciones, aca se descuenta lo que sumaba la fila borrada
+    # (tambien en cascada, ej al editar un viaje se borra el anterior con sus solicitudes)
+    piloto, copiloto = getattr(instance, '_calificaciones_guardadas', (None, None))
+    if piloto is not None:
+        piloto_id = Viaje.objects.filter(pk=instance.viaje_id).values_list('auto__usuario', flat=True).first()
+        if piloto_id is not None:
+            Reputacion.objects.actualizar(piloto_id, Reputacion.PILOTO, piloto, None, crear=False)
+    if copiloto is not None:
+        Reputacion.objects.actualizar(instance.usuario_id, Reputacion.COPILOTO, copiloto, None, crear=False)
+
+
+@receiver([post_save, post_delete], sender=ConversacionPublica)
+def conversacion_modificada(sender, instance, **kwargs):
+    versiones.tocar(versiones.get_clave_viaje(instance.viaje_id))
+
+
+@receiver([post_save, post_delete], sender=ViajeCopiloto)
+def solicitud_modificada(sender, instance, **kwargs):
+    versiones.tocar(versiones.get_clave_salida(instance.viaje_id, instance.fecha_del_viaje))
+
+
+@receiver([post_save, post_delete], sender=Tarjeta)
+def tarjeta_modificada(sender, instance, **kwargs):
+    versiones.tocar(versiones.get_clave_usuario(instance.usuario_id))
+
+
+@receiver([post_save, post_delete], sender=Usuario)
+@receiver([post_save, post_delete], sender=Auto)
+def instancia_modificada(sender, instance, **kwargs):
+    # invalida lo cacheado con cache_de_modelos.py, desactivar() tambien pasa por aca
+    versiones.tocar(versiones.get_clave_instancia(sender, instance.pk))
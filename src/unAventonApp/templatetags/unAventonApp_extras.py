@@ -1,10 +1,13 @@
-from unAventonApp.modules.Git import Git
+from unAventonApp.modules.BuildInfo import BuildInfo
 from django.conf import settings
 from django import template
 from unAventonApp.models import Usuario, ViajeCopiloto
-from django.utils import timezone
+from django.utils import timezone, translation
+from django.utils.timesince import timesince
 register = template.Library()
 
+buildInfo = BuildInfo(settings.BASE_DIR)
+
 
 @register.filter(is_safe=True)
 def analyticGoogle(value):
@@ -12,18 +15,22 @@ def analyticGoogle(value):
 
 @register.filter(is_safe=True)
 def currentbranch(value):
-    return (Git(settings.BASE_DIR).getActuallBranch())
+    return buildInfo.branch()
 
 
 @register.filter(is_safe=True)
 def currentuser(value):
-    usuario = Usuario.objects.get(user=value)
+    usuario = value.usuario
     return "{0} {1}".format(usuario.nombre, usuario.apellido)
 
 
 @register.filter(is_safe=True)
 def lastupdate(value):
-    return Git(settings.BASE_DIR).git('log', '-1', '--pretty=format:Last commit %ar')
+    fecha = buildInfo.fecha_ultimo_commit()
+    if fecha is None:
+        return ''
+    with translation.override('en'):
+        return 'Last commit {0} ago'.format(timesince(fecha).split(',')[0])
 
 
 @register.filter(is_safe=True)
@@ -44,9 +51,16 @@ def getEstado(viajeCopiloto):
         return estados[1]
 
 
+def get_viaje_copiloto(viajeCopiloto):
+    # los filtros reciben el ViajeCopiloto ya cargado, o su id
+    if isinstance(viajeCopiloto, ViajeCopiloto):
+        return viajeCopiloto
+    return ViajeCopiloto.objects.get(pk=viajeCopiloto)
+
+
 @register.filter(is_safe=True)
-def estadoCopilotoViaje(viajeCopilotoId):
-    viajeCopiloto = ViajeCopiloto.objects.get(pk=viajeCopilotoId)
+def estadoCopilotoViaje(viajeCopiloto):
+    viajeCopiloto = get_viaje_copiloto(viajeCopiloto)
     estado = viajeCopiloto.get_estado()
 
     if estado == "rechazado":
@@ -59,8 +73,8 @@ def estadoCopilotoViaje(viajeCopilotoId):
 
 
 @register.filter(is_safe=True)
-def estadoCopilotoViajeClass(viajeCopilotoId):
-    viajeCopiloto = ViajeCopiloto.objects.get(pk=viajeCopilotoId)
+def estadoCopilotoViajeClass(viajeCopiloto):
+    viajeCopiloto = get_viaje_copiloto(viajeCopiloto)
     estado = viajeCopiloto.get_estado()
     clase = "table"
     if estado == "esperando":
@@ -78,9 +92,10 @@ def estadoCopilotoViajeClass(viajeCopilotoId):
 
 
 @register.filter(is_safe=True)
-def copilotoViajeCalificarPiloto(viajeCopilotoId):
+def copilotoViajeCalificarPiloto(viajeCopiloto):
     # el estado del viaje tiene que estar finalizado para poder calificar al piloto
-    viajeCopiloto = ViajeCopiloto.objects.get(pk=viajeCopilotoId)
+    viajeCopiloto = get_viaje_copiloto(viajeCopiloto)
+    viajeCopilotoId = viajeCopiloto.pk
     estado = viajeCopiloto.get_estado()
     if estado == "finalizado" and viajeCopiloto.estaConfirmado and viajeCopiloto.calificacion_a_piloto is None:
         return "<button class='btn btn-default' onclick=calificarPiloto({0})>Calificar</button>".format(viajeCopilotoId)
@@ -91,9 +106,10 @@ def copilotoViajeCalificarPiloto(viajeCopilotoId):
 
 
 @register.filter(is_safe=True)
-def copilotoCancelarInscripcion(viajeCopilotoId):
+def copilotoCancelarInscripcion(viajeCopiloto):
     # el estado del viaje tiene que estar finalizado para poder calificar al piloto
-    viajeCopiloto = ViajeCopiloto.objects.get(pk=viajeCopilotoId)
+    viajeCopiloto = get_viaje_copiloto(viajeCopiloto)
+    viajeCopilotoId = viajeCopiloto.pk
     estado = viajeCopiloto.get_estado()
     if estado != "finalizado" and viajeCopiloto.estaConfirmado is not False:
         return "<button class='btn btn-danger' onclick=cancelarInscripcion({0})>Cancelar inscripcion</button>".format(
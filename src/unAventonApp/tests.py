@@ -0,0 +1,959 @@
+import atexit
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.mail.backends import locmem
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from .models import Usuario, Auto, CuentaBancaria, Tarjeta, Viaje, ViajeCopiloto, ConversacionPublica, Reputacion, \
+    ViajeOcurrencia, MailPendiente
+from . import agenda
+from . import buscador
+from . import cache_de_modelos
+from . import elegibilidad
+from . import liquidaciones
+from . import mailer
+from . import miniaturas
+from PIL import Image
+
+# tablas que crecen con el uso, no se pueden recorrer enteras en las vistas principales
+TABLAS_GRANDES = ('unAventonApp_viaje', 'unAventonApp_viajecopiloto', 'unAventonApp_viajeocurrencia',
+                  'unAventonApp_conversacionpublica')
+CACHES_LOCALES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                  'sesiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sesiones'}}
+# las paginas generan las miniaturas de las fotos, en un media temporal con una copia de la foto por defecto
+MEDIA_DE_PRUEBA = tempfile.mkdtemp(prefix='unaventon-media-')
+shutil.copytree(os.path.join(settings.MEDIA_ROOT, 'assets'), os.path.join(MEDIA_DE_PRUEBA, 'assets'))
+atexit.register(shutil.rmtree, MEDIA_DE_PRUEBA, True)
+
+
+def crear_usuario(numero, **kwargs):
+    mail = 'usuario{0}@mail.com'.format(numero)
+    user = User.objects.create_user(mail, mail, 'clave1234')
+    return Usuario.objects.create(user=user, nombre='nombre', apellido='apellido', **kwargs)
+
+
+def get_reputaciones():
+    """ las reputaciones con alguna calificacion, reconstruir() no crea las que quedan en cero """
+    return set(Reputacion.objects.filter(cantidad__gt=0).values_list(
+        'usuario', 'rol', 'suma', 'cantidad', 'negativas', 'neutrales', 'positivas'))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es de sqlite')
+@override_settings(CACHES=CACHES_LOCALES, MEDIA_ROOT=MEDIA_DE_PRUEBA)
+class PlanDeConsultasTest(TestCase):
+    """ corre las vistas principales sobre un set de datos sembrado y falla si alguna
+    consulta recorre entera (SCAN sin indice) alguna de las tablas grandes """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = [crear_usuario(i) for i in range(6)]
+        cls.piloto = cls.usuarios[0]
+        auto = Auto.objects.create(usuario=cls.piloto, dominio='AAA111', marca='marca', modelo='modelo', capacidad=4)
+        cuenta = CuentaBancaria.objects.create(usuario=cls.piloto, cbu='123')
+        salida = datetime.datetime.now().replace(second=0, microsecond=0) + datetime.timedelta(days=1)
+
+        cls.viajes = []
+        for i in range(30):
+            frecuencia = (Viaje.NUNCA, Viaje.DIARIO, Viaje.SEMANAL)[i % 3]
+            viaje = Viaje.objects.create(auto=auto, cuenta_bancaria=cuenta, gasto_total=400, comentario='',
+                                         origen='La Plata', destino='Buenos Aires', duracion=2,
+                                         fecha_hora_salida=salida + datetime.timedelta(days=i, hours=i % 5),
+                                         se_repite=(frecuencia, -1))
+            viaje.generar_ocurrencias()
+            cls.viajes.append(viaje)
+        # como si hubiera corrido generar_ocurrencias, las busquedas usan la tabla de ocurrencias
+        ViajeOcurrencia.set_horizonte_materializado(ViajeOcurrencia.get_horizonte())
+
+        for copiloto in cls.usuarios[1:]:
+            Tarjeta.objects.create(usuario=copiloto, numero='4500')
+            for viaje in cls.viajes[:10]:
+                ViajeCopiloto.objects.create(usuario=copiloto, viaje=viaje, fecha_del_viaje=viaje.fecha_hora_salida,
+                                             estaConfirmado=copiloto.pk % 2 == 0 or None)
+                ConversacionPublica.objects.create(usuario=copiloto, viaje=viaje, pregunta='?',
+                                                   fechaHoraPregunta=datetime.datetime.now())
+
+    def get_consultas(self, usuario, pedidos):
+        client = Client()
+        client.force_login(usuario.user)
+        with CaptureQueriesContext(connection) as consultas:
+            for url, data in pedidos:
+                response = client.post(url, data) if data is not None else client.get(url)
+                self.assertEqual(response.status_code, 200, url)
+        return [consulta['sql'] for consulta in consultas.captured_queries]
+
+    def get_recorridos_completos(self, consultas):
+        """ los SCAN sin indice sobre las tablas grandes, segun EXPLAIN QUERY PLAN """
+        recorridos = []
+        with connection.cursor() as cursor:
+            for sql in consultas:
+                if not sql.startswith('SELECT'):
+                    continue
+                # las subconsultas usan alias (U0, T5), sqlite nuevo muestra el alias y no la tabla
+                alias = {nombre: tabla for tabla, nombre in re.findall(r'"(\w+)" ([UT]\d+)\b', sql)}
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                for fila in cursor.fetchall():
+                    detalle = fila[-1]
+                    recorrido = re.match(r'SCAN (?:TABLE )?(\w+)', detalle)
+                    tabla = recorrido and alias.get(recorrido.group(1), recorrido.group(1))
+                    if tabla in TABLAS_GRANDES and 'INDEX' not in detalle:
+                        recorridos.append((detalle, sql))
+        return recorridos
+
+    def test_vistas_del_piloto(self):
+        viaje = self.viajes[0]
+        consultas = self.get_consultas(self.piloto, [
+            ('/', None),
+            ('/misViajes', None),
+            ('/misViajesFinalizados', None),
+            ('/viaje/{0}/{1}/'.format(viaje.pk, int(viaje.fecha_hora_salida.timestamp())), None),
+            ('/ajax/getListaCopilotosConfirmados', {'viaje_id': viaje.pk}),
+            ('/ajax/getListaCopilotosEnEspera', {'viaje_id': viaje.pk}),
+        ])
+        self.assertEqual(self.get_recorridos_completos(consultas), [])
+
+    def test_vistas_del_copiloto(self):
+        fecha = self.viajes[0].fecha_hora_salida
+        consultas = self.get_consultas(self.usuarios[2], [
+            ('/', None),
+            ('/viajesInscriptos', None),
+            ('/ajax/buscarViaje', {'origen': 'plata', 'destino': 'aires', 'fecha': fecha.strftime('%Y-%m-%d'),
+                                   'hora': '', 'precio_min': '', 'precio_max': ''}),
+        ])
+        self.assertEqual(self.get_recorridos_completos(consultas), [])
+
+
+@override_settings(CACHES=CACHES_LOCALES, MEDIA_ROOT=MEDIA_DE_PRUEBA)
+class ConsultasPorListadoTest(TestCase):
+    """ los listados que no dependen de la cantidad de filas hacen las mismas queries con 2 que con 6,
+    una consulta por fila (N+1) hace fallar el assertNumQueries """
+
+    def setUp(self):
+        self.piloto = crear_usuario(0)
+        self.copiloto = crear_usuario(1)
+        Tarjeta.objects.create(usuario=self.copiloto, numero='4500')
+        self.auto = Auto.objects.create(usuario=self.piloto, dominio='AAA111', marca='marca', modelo='modelo',
+                                        capacidad=4)
+        self.cuenta = CuentaBancaria.objects.create(usuario=self.piloto, cbu='123')
+        self.cantidad = 0
+
+    def crear_viaje(self, auto, salida, frecuencia):
+        cuenta = self.cuenta if auto == self.auto else CuentaBancaria.objects.create(usuario=auto.usuario, cbu='1')
+        viaje = Viaje.objects.create(auto=auto, cuenta_bancaria=cuenta, gasto_total=400, comentario='',
+                                     origen='La Plata', destino='Buenos Aires', duracion=2, fecha_hora_salida=salida,
+                                     frecuencia=frecuencia,
+                                     dia_semana=None if frecuencia == Viaje.DIARIO else salida.weekday())
+        viaje.generar_ocurrencias()
+        return viaje
+
+    def sembrar(self, hasta):
+        """ agrega filas hasta tener hasta de cada tipo, cada una con otro copiloto y otro piloto """
+        ahora = datetime.datetime.now().replace(second=0, microsecond=0)
+        for i in range(self.cantidad, hasta):
+            otro = crear_usuario(10 + i)
+            frecuencia = (Viaje.NUNCA, Viaje.DIARIO, Viaje.SEMANAL)[i % 3]
+            # un viaje activo del piloto con un copiloto distinto y una pregunta, aparece en la busqueda
+            viaje = self.crear_viaje(self.auto, ahora + datetime.timedelta(days=1 + i), frecuencia)
+            ViajeCopiloto.objects.create(usuario=otro, viaje=viaje, fecha_del_viaje=viaje.fecha_hora_salida,
+                                         estaConfirmado=i % 2 == 0 or None)
+            ConversacionPublica.objects.create(usuario=otro, viaje=viaje, pregunta='?',
+                                               fechaHoraPregunta=datetime.datetime.now())
+            # una salida finalizada del piloto
+            pasado = self.crear_viaje(self.auto, ahora - datetime.timedelta(days=1 + i), Viaje.NUNCA)
+            ViajeCopiloto.objects.create(usuario=otro, viaje=pasado, fecha_del_viaje=pasado.fecha_hora_salida,
+                                         estaConfirmado=True)
+            # una inscripcion del copiloto en el viaje de otro piloto
+            auto = Auto.objects.create(usuario=otro, dominio='BBB{0:03}'.format(i), marca='marca', modelo='modelo',
+                                       capacidad=4)
+            ajeno = self.crear_viaje(auto, ahora + datetime.timedelta(days=1 + i, hours=5), frecuencia)
+            ViajeCopiloto.objects.create(usuario=self.copiloto, viaje=ajeno, fecha_del_viaje=ajeno.fecha_hora_salida,
+                                         estaConfirmado=i % 2 == 0 or None)
+        self.cantidad = hasta
+
+    def get_cantidades_de_queries(self, pedidos):
+        """ {url: queries} de cada pedido, con el cache vacio para que todas partan del mismo estado """
+        cantidades = {}
+        for usuario, url, data in pedidos:
+            cache.clear()
+            self.client.force_login(usuario.user)
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.post(url, data) if data is not None else self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            cantidades[url] = len(consultas)
+        return cantidades
+
+    def test_listados(self):
+        pedidos = [
+            (self.piloto, '/misViajesFinalizados', None),
+            (self.copiloto, '/viajesInscriptos', None),
+            (self.copiloto, '/ajax/buscarViaje', {'origen': 'plata', 'destino': 'aires', 'fecha': '', 'hora': '',
+                                                  'precio_min': '', 'precio_max': ''}),
+        ]
+        self.sembrar(2)
+        pocas = self.get_cantidades_de_queries(pedidos)
+        self.sembrar(6)
+        for usuario, url, data in pedidos:
+            with self.subTest(url=url):
+                # las mismas condiciones que get_cantidades_de_queries
+                cache.clear()
+                self.client.force_login(usuario.user)
+                with self.assertNumQueries(pocas[url]):
+                    response = self.client.post(url, data) if data is not None else self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(response.content.count(b'Buenos Aires'), 0)
+
+
+@override_settings(CACHES=CACHES_LOCALES, MEDIA_ROOT=MEDIA_DE_PRUEBA)
+class CrearViajeTest(TestCase):
+    """ alta y edicion por /ajax/crearViaje, con los datos del formulario como strings """
+
+    def setUp(self):
+        self.piloto = crear_usuario(0)
+        self.auto = Auto.objects.create(usuario=self.piloto, dominio='AAA111', marca='marca', modelo='modelo',
+                                        capacidad=4)
+        self.cuenta = CuentaBancaria.objects.create(usuario=self.piloto, cbu='123')
+        self.client.force_login(self.piloto.user)
+        self.salida = datetime.datetime.now().replace(second=0, microsecond=0) + datetime.timedelta(days=2)
+
+    def crear(self, **kwargs):
+        datos = {'fecha': self.salida.strftime('%Y-%m-%d'), 'hora': self.salida.strftime('%H:%M'),
+                 'comentario': '', 'duracion': '2.5', 'origen': 'La Plata', 'destino': 'Buenos Aires',
+                 'costo': '400.50', 'auto_id': str(self.auto.pk), 'capacidad_restante': '3',
+                 'cuenta_bancaria': str(self.cuenta.pk), 'repeticion': Viaje.DIARIO}
+        datos.update(kwargs)
+        response = self.client.post('/ajax/crearViaje', datos)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_alta(self):
+        respuesta = self.crear()
+        self.assertTrue(respuesta['creado'], respuesta)
+        viaje = Viaje.objects.get(pk=respuesta['id'])
+        self.assertEqual((viaje.duracion, viaje.gasto_total), (2.5, 400.5))
+        ocurrencia = viaje.ocurrencias.order_by('fecha_hora_salida').first()
+        self.assertEqual(ocurrencia.fecha_hora_salida, self.salida)
+        self.assertEqual(ocurrencia.fecha_hora_llegada, self.salida + datetime.timedelta(hours=2.5))
+
+    def test_edicion(self):
+        anterior = self.crear()['id']
+        respuesta = self.crear(viaje_id=str(anterior), duracion='3', repeticion=Viaje.NUNCA)
+        self.assertTrue(respuesta['creado'], respuesta)
+        self.assertFalse(Viaje.objects.filter(pk=anterior).exists())
+        viaje = Viaje.objects.get(pk=respuesta['id'])
+        self.assertTrue(viaje.activo)
+        self.assertEqual(viaje.ocurrencias.count(), 1)
+
+    def test_edicion_fallida_restaura_el_anterior(self):
+        anterior = self.crear()['id']
+        respuesta = self.crear(viaje_id=str(anterior), cuenta_bancaria='0')
+        self.assertFalse(respuesta['creado'])
+        viaje = Viaje.objects.get(pk=anterior)
+        self.assertTrue(viaje.activo)
+        self.assertTrue(viaje.ocurrencias.exists())
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class ReputacionTest(TestCase):
+    """ las reputaciones que se mantienen al guardar y borrar calificaciones
+    tienen que dar lo mismo que recalcularlas con reconstruir() """
+
+    def setUp(self):
+        self.piloto = crear_usuario(0)
+        self.copilotos = [crear_usuario(i) for i in range(1, 4)]
+        auto = Auto.objects.create(usuario=self.piloto, dominio='AAA111', marca='marca', modelo='modelo', capacidad=4)
+        cuenta = CuentaBancaria.objects.create(usuario=self.piloto, cbu='123')
+        salida = datetime.datetime.now().replace(second=0, microsecond=0) - datetime.timedelta(days=1)
+        self.viaje = Viaje.objects.create(auto=auto, cuenta_bancaria=cuenta, gasto_total=400, comentario='',
+                                          origen='La Plata', destino='Buenos Aires', duracion=2,
+                                          fecha_hora_salida=salida)
+        self.solicitudes = [ViajeCopiloto.objects.create(usuario=copiloto, viaje=self.viaje, fecha_del_viaje=salida,
+                                                         estaConfirmado=True) for copiloto in self.copilotos]
+
+    def assertIgualAReconstruir(self):
+        incrementales = get_reputaciones()
+        Reputacion.objects.reconstruir()
+        self.assertEqual(incrementales, get_reputaciones())
+
+    def test_calificar_y_recalificar(self):
+        for i, solicitud in enumerate(self.solicitudes):
+            solicitud.calificar_a_piloto(i - 1, '')
+            solicitud.calificar_a_copiloto(1, '')
+        self.assertIgualAReconstruir()
+        solicitud = ViajeCopiloto.objects.get(pk=self.solicitudes[0].pk)
+        solicitud.calificar_a_piloto(1, '')
+        solicitud.calificar_a_copiloto(-1, '')
+        self.assertIgualAReconstruir()
+
+    def test_cancelar(self):
+        self.solicitudes[0].calificar_a_piloto(1, '')
+        self.solicitudes[0].cancelarCopiloto()
+        # el copiloto se baja estando confirmado
+        self.solicitudes[1].calificacion_a_copiloto = -1
+        self.solicitudes[1].estaConfirmado = False
+        self.solicitudes[1].save()
+        self.assertIgualAReconstruir()
+
+    def test_borrar(self):
+        for solicitud in self.solicitudes:
+            solicitud.calificar_a_piloto(1, '')
+            solicitud.calificar_a_copiloto(1, '')
+        ViajeCopiloto.objects.get(pk=self.solicitudes[0].pk).delete()
+        self.assertIgualAReconstruir()
+        # en cascada, como al borrar el usuario o el viaje anterior al editarlo
+        self.copilotos[1].delete()
+        self.assertIgualAReconstruir()
+        self.viaje.delete()
+        self.assertIgualAReconstruir()
+        self.assertEqual(get_reputaciones(), set())
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class HorizonteTest(TestCase):
+    """ si generar_ocurrencias no corrio hace dias, mas alla de lo materializado se usa la regla de repeticion """
+
+    def setUp(self):
+        self.piloto = crear_usuario(0)
+        auto = Auto.objects.create(usuario=self.piloto, dominio='AAA111', marca='marca', modelo='modelo', capacidad=4)
+        cuenta = CuentaBancaria.objects.create(usuario=self.piloto, cbu='123')
+        self.salida = datetime.datetime.now().replace(second=0, microsecond=0) + datetime.timedelta(days=1)
+        self.viaje = Viaje.objects.create(auto=auto, cuenta_bancaria=cuenta, gasto_total=400, comentario='',
+                                          origen='La Plata', destino='Buenos Aires', duracion=2,
+                                          fecha_hora_salida=self.salida, se_repite=(Viaje.DIARIO, -1))
+        # la ultima corrida fue hace 80 dias
+        materializado = datetime.datetime.now() + datetime.timedelta(days=10)
+        self.viaje.generar_ocurrencias(materializado)
+        ViajeOcurrencia.set_horizonte_materializado(materializado)
+        self.fecha = self.salida + datetime.timedelta(days=30)
+
+    def test_busqueda(self):
+        viajes = buscador.buscar_viajes('plata', 'aires', fecha=self.fecha.date())
+        self.assertEqual([viaje.pk for viaje in viajes], [self.viaje.pk])
+        viajes = buscador.buscar_viajes('plata', 'aires', fecha=(self.salida + datetime.timedelta(days=2)).date())
+        self.assertEqual([viaje.pk for viaje in viajes], [self.viaje.pk])
+
+    def test_viaje_unico_vencido(self):
+        # el barrido de expirar_viajes todavia no lo desactivo
+        vencido = Viaje.objects.create(auto=self.viaje.auto, cuenta_bancaria=self.viaje.cuenta_bancaria,
+                                       gasto_total=400, comentario='', origen='La Plata', destino='Buenos Aires',
+                                       duracion=2, fecha_hora_salida=self.salida - datetime.timedelta(days=2))
+        self.assertTrue(vencido.activo)
+        viajes = buscador.buscar_viajes('plata', 'aires')
+        self.assertEqual([viaje.pk for viaje in viajes], [self.viaje.pk])
+
+    def test_horizonte_sin_cache(self):
+        # el cache solo evita la query, el horizonte queda en la base
+        horizonte = ViajeOcurrencia.get_horizonte_materializado()
+        cache.clear()
+        self.assertEqual(ViajeOcurrencia.get_horizonte_materializado(), horizonte)
+        with self.assertNumQueries(0):
+            ViajeOcurrencia.get_horizonte_materializado()
+
+    def test_superposicion(self):
+        self.assertTrue(self.piloto.se_superpone_algun_viaje_como_piloto(self.fecha + datetime.timedelta(hours=1), 2))
+        self.assertFalse(self.piloto.se_superpone_algun_viaje_como_piloto(self.fecha + datetime.timedelta(hours=3), 2))
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class BuscadorTest(TestCase):
+    """ buscar_viajes resuelve en SQL lo mismo que la regla de repeticion (caeEnLaFecha, caeEnLaHora y
+    las salidas de get_fechas_de_salida_entre), antes y despues del horizonte materializado """
+
+    @classmethod
+    def setUpTestData(cls):
+        piloto = crear_usuario(0)
+        auto = Auto.objects.create(usuario=piloto, dominio='AAA111', marca='marca', modelo='modelo', capacidad=4)
+        cuenta = CuentaBancaria.objects.create(usuario=piloto, cbu='123')
+        cls.hoy = datetime.date.today()
+        cls.materializado = datetime.datetime.combine(cls.hoy, datetime.time.min) + datetime.timedelta(days=10)
+        minutos = (8 * 60, 8 * 60 + 20, 9 * 60 + 10, 14 * 60)  # ninguna ventana de busqueda cruza la medianoche
+        for frecuencia in (Viaje.NUNCA, Viaje.DIARIO, Viaje.SEMANAL):
+            for dia in (-5, 1, 3, 12):  # el ultimo empieza despues del horizonte
+                for minuto in minutos:
+                    salida = datetime.datetime.combine(cls.hoy + datetime.timedelta(days=dia), datetime.time.min) + \
+                        datetime.timedelta(minutes=minuto)
+                    viaje = Viaje.objects.create(
+                        auto=auto, cuenta_bancaria=cuenta, gasto_total=400, comentario='', origen='La Plata',
+                        destino='Buenos Aires', duracion=2, fecha_hora_salida=salida, frecuencia=frecuencia,
+                        dia_semana=None if frecuencia == Viaje.DIARIO else salida.weekday())
+                    viaje.generar_ocurrencias(cls.materializado)
+        ViajeOcurrencia.set_horizonte_materializado(cls.materializado)
+        cls.viajes = list(Viaje.objects.activos())
+        # dentro del horizonte, en el borde y mas alla
+        cls.fechas = [cls.hoy + datetime.timedelta(days=dia) for dia in (1, 2, 3, 5, 8, 9, 10, 12, 15, 19, 26)]
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def buscar(**filtros):
+        return sorted(buscador.buscar_viajes('plata', 'aires', **filtros).values_list('pk', flat=True))
+
+    def esperados(self, condicion):
+        return sorted(viaje.pk for viaje in self.viajes if condicion(viaje))
+
+    def test_fecha(self):
+        for fecha in self.fechas:
+            with self.subTest(fecha=fecha):
+                self.assertEqual(self.buscar(fecha=fecha),
+                                 self.esperados(lambda viaje: viaje.caeEnLaFecha(fecha.isoformat())))
+
+    def test_dia_de_la_semana(self):
+        desde = datetime.datetime.now()
+        for dia_semana in range(7):
+            with self.subTest(dia_semana=dia_semana):
+                self.assertEqual(self.buscar(dia_semana=dia_semana), self.esperados(lambda viaje: any(
+                    salida.weekday() == dia_semana for salida in viaje.get_fechas_de_salida_entre(
+                        desde, max(desde, viaje.fecha_hora_salida) + datetime.timedelta(days=7)))))
+
+    def test_hora(self):
+        for hora in (datetime.time(8, 0), datetime.time(8, 45), datetime.time(13, 40)):
+            with self.subTest(hora=hora):
+                self.assertEqual(self.buscar(hora=hora), self.esperados(
+                    lambda viaje: viaje.caeEnLaHora(hora.strftime('%H:%M'))))
+
+    def test_fecha_y_hora(self):
+        hora = datetime.time(8, 10)
+        for fecha in self.fechas:
+            with self.subTest(fecha=fecha):
+                self.assertEqual(self.buscar(fecha=fecha, hora=hora), self.esperados(
+                    lambda viaje: viaje.caeEnLaFecha(fecha.isoformat()) and viaje.caeEnLaHora('08:10')))
+
+    def test_horizonte(self):
+        # las fechas de la prueba caen a ambos lados de lo materializado
+        self.assertEqual(ViajeOcurrencia.get_horizonte_materializado(), self.materializado)
+        self.assertTrue(any(fecha < self.materializado.date() for fecha in self.fechas))
+        self.assertTrue(any(fecha > self.materializado.date() for fecha in self.fechas))
+
+
+@override_settings(CACHES=CACHES_LOCALES, MEDIA_ROOT=MEDIA_DE_PRUEBA)
+class VistaDelViajeTest(TransactionTestCase):
+    """ la pagina del viaje responde 304 mientras no cambie nada de lo que muestra.
+    TransactionTestCase para que corran los on_commit que tocan los sellos de version """
+
+    def setUp(self):
+        cache.clear()
+        cache_de_modelos.local.clear()
+        self.piloto = crear_usuario(0)
+        self.copiloto = crear_usuario(1)
+        self.auto = Auto.objects.create(usuario=self.piloto, dominio='AAA111', marca='marca', modelo='modelo',
+                                        capacidad=4)
+        cuenta = CuentaBancaria.objects.create(usuario=self.piloto, cbu='123')
+        self.salida = datetime.datetime.now().replace(second=0, microsecond=0) + datetime.timedelta(days=1)
+        self.viaje = Viaje.objects.create(auto=self.auto, cuenta_bancaria=cuenta, gasto_total=400, comentario='',
+                                          origen='La Plata', destino='Buenos Aires', duracion=2,
+                                          fecha_hora_salida=self.salida)
+        self.viaje.generar_ocurrencias()
+        self.url = '/viaje/{0}/{1}/'.format(self.viaje.pk, int(self.salida.timestamp()))
+        self.client.force_login(self.copiloto.user)
+        self.client.get(self.url)  # la primera respuesta deja la cookie de csrf, que es parte del ETag
+        self.etag = self.client.get(self.url)['ETag']
+
+    def assertSinCambios(self):
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag).status_code, 304)
+
+    def assertCambio(self, texto):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, texto)
+        self.etag = response['ETag']
+        self.assertSinCambios()
+
+    def test_sin_cambios(self):
+        self.assertSinCambios()
+
+    def test_solicitud(self):
+        solicitud = ViajeCopiloto.objects.create(usuario=self.copiloto, viaje=self.viaje,
+                                                 fecha_del_viaje=self.salida)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 200)
+        self.etag = response['ETag']
+        solicitud.confirmarCopiloto()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag).status_code, 200)
+
+    def test_pregunta(self):
+        ConversacionPublica.objects.create(usuario=self.copiloto, viaje=self.viaje, pregunta='lleva mascotas?',
+                                           fechaHoraPregunta=datetime.datetime.now())
+        self.assertCambio('lleva mascotas?')
+
+    def test_auto(self):
+        self.auto.marca = 'otra marca'
+        self.auto.save()
+        self.assertCambio('Marca: otra marca')
+
+    def test_tarjeta(self):
+        # las tarjetas del usuario se listan en la pagina, su sello es parte del ETag
+        self.assertFalse(self.client.get(self.url).has_header('Last-Modified'))
+        Tarjeta.objects.create(usuario=self.copiloto, numero='4111222233334444', ccv=123)
+        self.assertCambio('4111222233334444')
+
+    def test_piloto(self):
+        # el mismo viaje visto por el piloto no puede reusar la respuesta del copiloto
+        self.client.force_login(self.piloto.user)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag).status_code, 200)
+
+
+class BackendDePrueba(locmem.EmailBackend):
+    """ locmem que cuenta las conexiones abiertas y falla al mandar a FALLA """
+    FALLA = 'falla@mail.com'
+    conexiones = 0
+
+    def open(self):
+        BackendDePrueba.conexiones += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any(BackendDePrueba.FALLA in message.to for message in messages):
+            raise ConnectionError('rechazado')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='unAventonApp.tests.BackendDePrueba', APP_MAIL_ASINCRONICO=False,
+                   APP_MAIL_LOTE=2, APP_MAIL_MAX_INTENTOS=2, CACHES=CACHES_LOCALES)
+class MailerTest(TestCase):
+    """ la cola de mails sin los threads del pool, como la drena el comando enviar_mails """
+
+    def setUp(self):
+        BackendDePrueba.conexiones = 0
+        # metricas propias, las del proceso siguen contando aparte
+        parche = mock.patch.object(mailer, 'metricas', mailer.Metricas())
+        self.metricas = parche.start()
+        self.addCleanup(parche.stop)
+
+    def encolar(self, *destinatarios):
+        for destinatario in destinatarios:
+            mailer.send_email(destinatario, subject='asunto', message='mensaje')
+
+    def test_tomar_lote(self):
+        self.encolar('a@mail.com', 'b@mail.com', 'c@mail.com')
+        antes = datetime.datetime.now()
+        primero, segundo = mailer.tomar_lote(), mailer.tomar_lote()
+        self.assertEqual((len(primero), len(segundo)), (2, 1))
+        self.assertEqual(len({mail.lote for mail in primero}), 1)
+        self.assertNotEqual(primero[0].lote, segundo[0].lote)
+        self.assertTrue(all(mail.proximo_intento >= antes + mailer.LEASE for mail in primero + segundo))
+        # tomados, otro worker no los ve hasta que venza el lease
+        self.assertEqual(mailer.tomar_lote(), [])
+
+    def test_una_conexion_por_lote(self):
+        self.encolar('a@mail.com', 'b@mail.com', 'c@mail.com')
+        self.assertEqual(mailer.procesar_cola(), 3)
+        self.assertEqual(BackendDePrueba.conexiones, 2)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['a@mail.com', 'b@mail.com', 'c@mail.com'])
+        self.assertFalse(MailPendiente.objects.filter(enviado=False).exists())
+        self.assertFalse(MailPendiente.objects.exclude(lote=None).exists())
+
+    def test_reintento(self):
+        self.encolar(BackendDePrueba.FALLA, 'a@mail.com')
+        antes = datetime.datetime.now()
+        self.assertEqual(mailer.procesar_cola(), 1)
+        fallido = MailPendiente.objects.get(enviado=False)
+        self.assertEqual((fallido.intentos, fallido.ultimo_error, fallido.lote), (1, 'rechazado', None))
+        espera = datetime.timedelta(seconds=30)
+        self.assertTrue(antes + espera <= fallido.proximo_intento <= datetime.datetime.now() + espera)
+        # el backoff todavia no vencio
+        self.assertEqual(mailer.procesar_cola(), 0)
+        MailPendiente.objects.update(proximo_intento=antes)
+        self.assertEqual(mailer.procesar_cola(), 0)
+        fallido.refresh_from_db()
+        self.assertEqual(fallido.intentos, 2)
+        self.assertEqual(mailer.get_backoff(2), 2 * espera)
+        # llego a APP_MAIL_MAX_INTENTOS, no se reintenta mas
+        MailPendiente.objects.update(proximo_intento=antes)
+        self.assertEqual(mailer.tomar_lote(), [])
+
+    def test_metricas(self):
+        self.encolar(BackendDePrueba.FALLA, 'a@mail.com', 'b@mail.com')
+        mailer.procesar_cola()
+        metricas = self.metricas.asJson()
+        self.assertEqual((metricas['enviados'], metricas['errores'], metricas['en_cola'], metricas['fallidos']),
+                         (2, 1, 0, 0))
+        self.assertIsNotNone(metricas['latencia_p50_segundos'])
+        MailPendiente.objects.filter(enviado=False).update(intentos=2)
+        self.assertEqual(self.metricas.asJson()['fallidos'], 1)
+
+
+@override_settings(CACHES=CACHES_LOCALES, APP_MAIL_ASINCRONICO=False)
+class EliminarViajeTest(TestCase):
+    """ Viaje.eliminar cancela con updates masivos, la primera confirmada de cada salida penaliza al piloto """
+
+    def setUp(self):
+        self.piloto = crear_usuario(0)
+        self.copilotos = [crear_usuario(i) for i in range(1, 5)]
+        auto = Auto.objects.create(usuario=self.piloto, dominio='AAA111', marca='marca', modelo='modelo', capacidad=4)
+        cuenta = CuentaBancaria.objects.create(usuario=self.piloto, cbu='123')
+        inicio = datetime.datetime.now().replace(second=0, microsecond=0) - datetime.timedelta(hours=22)
+        self.viaje = Viaje.objects.create(auto=auto, cuenta_bancaria=cuenta, gasto_total=400, comentario='',
+                                          origen='La Plata', destino='Buenos Aires', duracion=2,
+                                          fecha_hora_salida=inicio, se_repite=(Viaje.DIARIO, -1))
+        self.viaje.generar_ocurrencias()
+        self.pasada, self.primera, self.segunda = [inicio + datetime.timedelta(days=i) for i in range(3)]
+
+    def solicitar(self, copiloto, fecha, confirmado, **kwargs):
+        return ViajeCopiloto.objects.create(usuario=self.copilotos[copiloto], viaje=self.viaje, fecha_del_viaje=fecha,
+                                            estaConfirmado=confirmado, **kwargs)
+
+    def test_eliminar(self):
+        pasada = self.solicitar(0, self.pasada, True, calificacion_a_piloto=1)
+        penalizada = self.solicitar(0, self.primera, True)
+        rechazada = self.solicitar(1, self.primera, True)
+        pendiente = self.solicitar(2, self.primera, None)
+        recalificada = self.solicitar(3, self.segunda, True, calificacion_a_piloto=1)
+        ya_rechazada = self.solicitar(2, self.segunda, False, rechazoElPiloto=True)
+
+        resumen = self.viaje.eliminar()
+
+        self.assertEqual(resumen, {'confirmadas_canceladas': 3, 'penalidades': 2, 'pendientes_rechazadas': 1,
+                                   'mails': 4})
+        estados = {solicitud.pk: (solicitud.estaConfirmado, solicitud.rechazoElPiloto, solicitud.calificacion_a_piloto,
+                                  solicitud.calificacion_a_piloto_mensaje)
+                   for solicitud in ViajeCopiloto.objects.all()}
+        self.assertEqual(estados[pasada.pk], (True, None, 1, None))
+        self.assertEqual(estados[penalizada.pk], (False, True, -1, ViajeCopiloto.MENSAJE_PENALIDAD))
+        self.assertEqual(estados[rechazada.pk], (False, True, None, None))
+        self.assertEqual(estados[pendiente.pk], (False, True, None, None))
+        self.assertEqual(estados[recalificada.pk], (False, True, -1, ViajeCopiloto.MENSAJE_PENALIDAD))
+        self.assertEqual(estados[ya_rechazada.pk], (False, True, None, None))
+
+        incrementales = get_reputaciones()
+        Reputacion.objects.reconstruir()
+        self.assertEqual(incrementales, get_reputaciones())
+        reputacion = Reputacion.objects.get(usuario=self.piloto, rol=Reputacion.PILOTO)
+        self.assertEqual((reputacion.suma, reputacion.cantidad, reputacion.negativas), (-1, 3, 2))
+
+        self.viaje.refresh_from_db()
+        self.assertFalse(self.viaje.activo)
+        self.assertEqual(list(self.viaje.ocurrencias.values_list('fecha_hora_salida', flat=True)), [self.pasada])
+        mail = MailPendiente.objects.get()
+        self.assertEqual(sorted(json.loads(mail.destinatarios)),
+                         sorted(copiloto.user.email for copiloto in self.copilotos))
+
+
+@override_settings(CACHES=CACHES_LOCALES, MEDIA_ROOT=MEDIA_DE_PRUEBA)
+class ViajesFinalizadosTest(TestCase):
+    """ los montos agrupados en SQL (ViajeCopilotoManager.liquidaciones) contra los metodos de Viaje """
+
+    def setUp(self):
+        self.piloto = crear_usuario(0)
+        self.copilotos = [crear_usuario(i) for i in range(1, 5)]
+        cuenta = CuentaBancaria.objects.create(usuario=self.piloto, cbu='123')
+        inicio = datetime.datetime.now().replace(second=0, microsecond=0) - datetime.timedelta(days=10)
+        # gasto, capacidad, comision y confirmados por salida
+        casos = [
+            (400, 4, 0.1, [3, 1, 2]),  # con reintegro
+            (400, 4, 0.25, [1, 2]),  # lo cobrado igual a la comision: sin reintegro
+            (900, 3, 0.5, [1]),  # lo cobrado menor a la comision: sin reintegro
+        ]
+        for i, (gasto, capacidad, comision, confirmados) in enumerate(casos):
+            auto = Auto.objects.create(usuario=self.piloto, dominio='AAA11{0}'.format(i), marca='marca',
+                                       modelo='modelo', capacidad=capacidad)
+            viaje = Viaje.objects.create(auto=auto, cuenta_bancaria=cuenta, gasto_total=gasto, comision=comision,
+                                         comentario='', origen='La Plata', destino='Buenos Aires', duracion=2,
+                                         fecha_hora_salida=inicio + datetime.timedelta(hours=i),
+                                         se_repite=(Viaje.DIARIO, -1))
+            for dia, cantidad in enumerate(confirmados):
+                fecha = viaje.fecha_hora_salida + datetime.timedelta(days=dia)
+                for copiloto in self.copilotos[:cantidad]:
+                    ViajeCopiloto.objects.create(usuario=copiloto, viaje=viaje, fecha_del_viaje=fecha,
+                                                 estaConfirmado=True)
+                # las que no estan confirmadas no suman
+                ViajeCopiloto.objects.create(usuario=self.copilotos[3], viaje=viaje, fecha_del_viaje=fecha,
+                                             estaConfirmado=None if dia else False)
+
+    def test_montos(self):
+        salidas = list(self.piloto.get_salidas_finalizadas())
+        self.assertEqual(len(salidas), 6)
+        sin_reintegro = 0
+        for salida in salidas:
+            viaje, fecha = Viaje.objects.get(pk=salida['viaje']), salida['fecha_del_viaje']
+            self.assertEqual(salida['confirmados'], viaje.get_ocupacion_en_fecha(fecha)['confirmados'])
+            self.assertAlmostEqual(salida['total_cobrado'], viaje.get_total_cobrado_fecha(fecha))
+            self.assertAlmostEqual(salida['comision_cobrada'], viaje.get_comision_cobrada_en_fecha(fecha))
+            self.assertAlmostEqual(salida['total_a_reintegrar'],
+                                   viaje.get_total_a_reintegrar_al_conductor_en_fecha(fecha))
+            sin_reintegro += salida['total_a_reintegrar'] == 0
+        self.assertEqual(sin_reintegro, 2)
+        self.assertEqual([salida['fecha_del_viaje'] for salida in salidas],
+                         sorted((salida['fecha_del_viaje'] for salida in salidas), reverse=True))
+
+    @override_settings(APP_PAGINA_VIAJES_FINALIZADOS=4)
+    def test_paginacion(self):
+        self.client.force_login(self.piloto.user)
+        fechas = [salida['fecha_del_viaje'] for salida in self.piloto.get_salidas_finalizadas()]
+        paginas = [self.client.get('/misViajesFinalizados', {'pagina': numero}).context for numero in (1, 2, 99)]
+        self.assertEqual([viaje['fecha_hora_salida'] for viaje in paginas[0]['viajes']], fechas[:4])
+        self.assertEqual([viaje['fecha_hora_salida'] for viaje in paginas[1]['viajes']], fechas[4:])
+        self.assertEqual(paginas[1]['pagina'].paginator.num_pages, 2)
+        # fuera de rango es la ultima
+        self.assertEqual(paginas[2]['pagina'].number, 2)
+
+
+@override_settings(CACHES=CACHES_LOCALES, APP_PAGINA_PASAJEROS=3)
+class PaginaDePasajerosTest(TestCase):
+    """ el cursor de get_pagina_de_pasajeros recorre todas las solicitudes sin saltear ni repetir,
+    aunque varias tengan la misma fecha_del_viaje y el corte de pagina caiga entre ellas """
+
+    def setUp(self):
+        self.piloto = crear_usuario(0)
+        copilotos = [crear_usuario(i) for i in range(1, 5)]
+        auto = Auto.objects.create(usuario=self.piloto, dominio='AAA111', marca='marca', modelo='modelo', capacidad=4)
+        cuenta = CuentaBancaria.objects.create(usuario=self.piloto, cbu='123')
+        salida = datetime.datetime.now().replace(second=0, microsecond=0) + datetime.timedelta(days=1)
+        self.viaje = Viaje.objects.create(auto=auto, cuenta_bancaria=cuenta, gasto_total=400, comentario='',
+                                          origen='La Plata', destino='Buenos Aires', duracion=2,
+                                          fecha_hora_salida=salida, se_repite=(Viaje.DIARIO, -1))
+        # la segunda salida se crea antes, asi el orden de los id no coincide con el de las fechas
+        for dia, cantidad in ((1, 3), (0, 4)):
+            for copiloto in copilotos[:cantidad]:
+                ViajeCopiloto.objects.create(usuario=copiloto, viaje=self.viaje,
+                                             fecha_del_viaje=salida + datetime.timedelta(days=dia))
+        self.esperadas = list(ViajeCopiloto.objects.order_by('fecha_del_viaje', 'pk').values_list('pk', flat=True))
+        self.client.force_login(self.piloto.user)
+
+    def get_pagina(self, cursor=None):
+        datos = {'viaje_id': self.viaje.pk}
+        if cursor:
+            datos['cursor'] = cursor
+        return self.client.post('/ajax/getListaCopilotosEnEspera', datos).json()
+
+    def test_recorrido(self):
+        paginas = [self.get_pagina()]
+        while paginas[-1]['siguiente']:
+            paginas.append(self.get_pagina(paginas[-1]['siguiente']))
+        self.assertEqual([len(pagina['data']) for pagina in paginas], [3, 3, 1])
+        # el primer corte queda entre solicitudes de la misma fecha
+        self.assertEqual(paginas[0]['data'][-1]['fecha_del_viaje'], paginas[1]['data'][0]['fecha_del_viaje'])
+        self.assertEqual([fila['id'] for pagina in paginas for fila in pagina['data']], self.esperadas)
+
+    def test_ultima_pagina_completa(self):
+        # con exactamente una pagina de filas restantes no hay siguiente
+        ViajeCopiloto.objects.filter(pk=self.esperadas[-1]).delete()
+        segunda = self.get_pagina(self.get_pagina()['siguiente'])
+        self.assertEqual([fila['id'] for fila in segunda['data']], self.esperadas[3:6])
+        self.assertIsNone(segunda['siguiente'])
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class ExportarLiquidacionesTest(TestCase):
+    """ /liquidaciones, solo para staff. hasta es inclusive """
+
+    def setUp(self):
+        self.piloto = crear_usuario(0)
+        copiloto = crear_usuario(1)
+        self.staff = crear_usuario(2)
+        User.objects.filter(pk=self.staff.user_id).update(is_staff=True)
+        auto = Auto.objects.create(usuario=self.piloto, dominio='AAA111', marca='marca', modelo='modelo', capacidad=4)
+        cuenta = CuentaBancaria.objects.create(usuario=self.piloto, cbu='123')
+        self.viaje = Viaje.objects.create(auto=auto, cuenta_bancaria=cuenta, gasto_total=400, comision=0.05,
+                                          comentario='', origen='La Plata', destino='Buenos Aires', duracion=2,
+                                          fecha_hora_salida=datetime.datetime(2018, 3, 1, 23, 30),
+                                          se_repite=(Viaje.DIARIO, -1))
+        for dia in range(3):
+            ViajeCopiloto.objects.create(usuario=copiloto, viaje=self.viaje, estaConfirmado=True,
+                                         fecha_del_viaje=self.viaje.fecha_hora_salida + datetime.timedelta(days=dia))
+        self.client.force_login(self.staff.user)
+
+    def exportar(self, **parametros):
+        parametros.setdefault('desde', '2018-03-01')
+        parametros.setdefault('hasta', '2018-03-02')
+        return self.client.get('/liquidaciones', parametros)
+
+    def test_csv(self):
+        response = self.exportar()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('liquidaciones_2018-03-01_2018-03-02.csv', response['Content-Disposition'])
+        filas = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(filas[0], liquidaciones.COLUMNAS)
+        # la salida del 2 a las 23:30 entra, la del 3 no
+        self.assertEqual([fila[1] for fila in filas[1:]], ['2018-03-01 23:30:00', '2018-03-02 23:30:00'])
+        fila = dict(zip(liquidaciones.COLUMNAS, filas[1]))
+        self.assertEqual((fila['viaje'], fila['piloto'], fila['mail_piloto'], fila['cbu'], fila['confirmados']),
+                         (str(self.viaje.pk), str(self.piloto.pk), self.piloto.user.email, '123', '1'))
+        self.assertEqual((fila['total_cobrado'], fila['comision_cobrada'], fila['total_a_reintegrar']),
+                         ('100.0', '20.0', '80.0'))
+
+    def test_json(self):
+        response = self.exportar(formato='json', hasta='2018-03-03')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        filas = json.loads(b''.join(response.streaming_content).decode())
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(set(filas[0]), set(liquidaciones.COLUMNAS))
+        self.assertEqual(filas[2]['fecha_del_viaje'], '2018-03-03T23:30:00')
+        response = self.exportar(formato='json', desde='2019-01-01', hasta='2019-01-31')
+        self.assertEqual(json.loads(b''.join(response.streaming_content).decode()), [])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.exportar(formato='xls').status_code, 400)
+        self.assertEqual(self.exportar(desde='').status_code, 400)
+        self.assertEqual(self.exportar(hasta='2018-02-30').status_code, 400)
+
+    def test_solo_staff(self):
+        self.client.force_login(self.piloto.user)
+        self.assertEqual(self.exportar().status_code, 302)
+        self.client.logout()
+        self.assertEqual(self.exportar().status_code, 302)
+
+
+class MigracionOcurrenciasTest(TransactionTestCase):
+    """ 0002 y 0003 sobre viajes cargados antes de que existieran las ocurrencias, incluso sin se_repite """
+    anterior = [('unAventonApp', '0001_initial')]
+    siguiente = [('unAventonApp', '0003_frecuencia_dia_semana')]
+
+    def migrar(self, destino):
+        executor = MigrationExecutor(connection)
+        executor.migrate(destino)
+        return executor.loader.project_state(destino).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_viajes_existentes(self):
+        apps = self.migrar(self.anterior)
+        user = apps.get_model('auth', 'User').objects.create(username='piloto@mail.com')
+        usuario = apps.get_model('unAventonApp', 'Usuario').objects.create(user=user, nombre='n', apellido='a')
+        auto = apps.get_model('unAventonApp', 'Auto').objects.create(usuario=usuario, dominio='AAA111', marca='m',
+                                                                     modelo='m', capacidad=4)
+        cuenta = apps.get_model('unAventonApp', 'CuentaBancaria').objects.create(usuario=usuario, cbu='123')
+        salida = datetime.datetime.now().replace(second=0, microsecond=0) + datetime.timedelta(days=1)
+        Viaje = apps.get_model('unAventonApp', 'Viaje')
+        ids = {}
+        for se_repite in (None, "('nunca', -1)", "('diario', -1)", "('semanal', {0})".format(salida.weekday())):
+            ids[se_repite] = Viaje.objects.create(auto=auto, cuenta_bancaria=cuenta, comentario='', origen='o',
+                                                  destino='d', duracion=1, fecha_hora_salida=salida,
+                                                  se_repite=se_repite).pk
+
+        apps = self.migrar(self.siguiente)
+        Viaje = apps.get_model('unAventonApp', 'Viaje')
+        ocurrencias = apps.get_model('unAventonApp', 'ViajeOcurrencia').objects
+        dias = settings.APP_HORIZONTE_OCURRENCIAS_DIAS
+        esperadas = {None: 1, "('nunca', -1)": 1, "('diario', -1)": dias, "('semanal', {0})".format(salida.weekday()):
+                     len(range(0, dias, 7))}
+        for se_repite, cantidad in esperadas.items():
+            self.assertEqual(ocurrencias.filter(viaje_id=ids[se_repite]).count(), cantidad, se_repite)
+        self.assertEqual(Viaje.objects.get(pk=ids[None]).frecuencia, 'nunca')
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class MiniaturasTest(TestCase):
+    """ las miniaturas de la foto de perfil: cuadradas, en JPEG y generadas una sola vez """
+
+    def setUp(self):
+        media = tempfile.mkdtemp(prefix='unaventon-media-')
+        self.addCleanup(shutil.rmtree, media, True)
+        parche = override_settings(MEDIA_ROOT=media)
+        parche.enable()
+        self.addCleanup(parche.disable)
+        self.usuario = crear_usuario(0)
+        # apaisada y con transparencia, se recorta al centro y se apoya sobre blanco
+        contenido = io.BytesIO()
+        Image.new('RGBA', (300, 200), (255, 0, 0, 128)).save(contenido, 'PNG')
+        self.usuario.cambiar_foto_de_perfil(ContentFile(contenido.getvalue(), name='foto.png'))
+        self.foto = self.usuario.foto_de_perfil
+
+    def test_formato_y_tamanio(self):
+        for lado in miniaturas.LADOS:
+            with self.subTest(lado=lado):
+                nombre = miniaturas.get_nombre(self.foto.name, lado)
+                self.assertTrue(self.usuario.get_url_miniatura(lado).endswith(nombre))
+                with Image.open(self.foto.storage.path(nombre)) as miniatura:
+                    self.assertEqual(miniatura.format, 'JPEG')
+                    self.assertEqual(miniatura.size, (lado, lado))
+
+    def test_reusa_la_existente(self):
+        # cambiar_foto_de_perfil ya las genero todas
+        ruta = self.foto.storage.path(miniaturas.get_nombre(self.foto.name, miniaturas.NAVBAR))
+        modificada = os.path.getmtime(ruta)
+        with mock.patch.object(miniaturas, 'generar') as generar:
+            url = self.usuario.get_foto_navbar()
+        generar.assert_not_called()
+        self.assertTrue(url.endswith(miniaturas.get_nombre(self.foto.name, miniaturas.NAVBAR)))
+        self.assertEqual(os.path.getmtime(ruta), modificada)
+
+    def test_genera_la_faltante(self):
+        self.foto.storage.delete(miniaturas.get_nombre(self.foto.name, miniaturas.CONVERSACION))
+        with mock.patch.object(miniaturas, 'generar', wraps=miniaturas.generar) as generar:
+            self.usuario.get_foto_conversacion()
+        generar.assert_called_once_with(self.foto.storage, self.foto.name, miniaturas.CONVERSACION)
+        self.assertTrue(self.foto.storage.exists(miniaturas.get_nombre(self.foto.name, miniaturas.CONVERSACION)))
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class AgendaTest(TestCase):
+    """ superposiciones de la agenda mas alla de lo materializado y sin ocurrencias """
+
+    def setUp(self):
+        self.piloto = crear_usuario(0)
+        self.auto = Auto.objects.create(usuario=self.piloto, dominio='AAA111', marca='marca', modelo='modelo',
+                                        capacidad=4)
+        self.cuenta = CuentaBancaria.objects.create(usuario=self.piloto, cbu='123')
+        self.ahora = datetime.datetime.now().replace(second=0, microsecond=0)
+        ViajeOcurrencia.set_horizonte_materializado(self.ahora + datetime.timedelta(days=10))
+
+    def crear_viaje(self, salida, frecuencia=Viaje.DIARIO, duracion=2):
+        return Viaje.objects.create(auto=self.auto, cuenta_bancaria=self.cuenta, gasto_total=400, comentario='',
+                                    origen='La Plata', destino='Buenos Aires', duracion=duracion,
+                                    fecha_hora_salida=salida, se_repite=(frecuencia, -1))
+
+    def test_fechas_de_salida_entre(self):
+        inicio = self.ahora - datetime.timedelta(days=400, hours=3)
+        for frecuencia in (Viaje.NUNCA, Viaje.DIARIO, Viaje.SEMANAL):
+            viaje = Viaje(fecha_hora_salida=inicio, frecuencia=frecuencia)
+            for desde in (inicio - datetime.timedelta(days=1), inicio, inicio + datetime.timedelta(days=14),
+                          inicio + datetime.timedelta(days=20, minutes=1)):
+                hasta = desde + datetime.timedelta(days=30)
+                esperadas = [fecha for fecha in viaje.get_fechas_de_salida_hasta(hasta) if fecha >= desde]
+                self.assertEqual(list(viaje.get_fechas_de_salida_entre(desde, hasta)), esperadas)
+
+    def test_viaje_viejo_mas_alla_del_horizonte(self):
+        # salio hace dos anios, la expansion arranca en la ventana y no en la primera salida
+        viaje = self.crear_viaje(self.ahora - datetime.timedelta(days=730), duracion=3)
+        viaje.generar_ocurrencias(self.ahora + datetime.timedelta(days=10))
+        fecha = self.ahora + datetime.timedelta(days=30)
+        with mock.patch.object(Viaje, 'get_fechas_de_salida_hasta', side_effect=AssertionError):
+            # sale todos los dias a la misma hora y dura 3 horas
+            self.assertTrue(agenda.se_superpone(self.piloto, fecha + datetime.timedelta(hours=2), 2))
+            self.assertTrue(agenda.se_superpone(self.piloto, fecha - datetime.timedelta(hours=1), 2))
+            self.assertFalse(agenda.se_superpone(self.piloto, fecha + datetime.timedelta(hours=3), 2))
+
+    def test_copiloto_sin_ocurrencia(self):
+        copiloto = crear_usuario(1)
+        viaje = self.crear_viaje(self.ahora + datetime.timedelta(days=1))
+        viaje.generar_ocurrencias()
+        fecha = viaje.fecha_hora_salida + datetime.timedelta(days=2)
+        ViajeCopiloto.objects.create(usuario=copiloto, viaje=viaje, fecha_del_viaje=fecha, estaConfirmado=True)
+        # la ocurrencia ya no esta (o nunca se materializo), la solicitud confirmada sigue ocupando al copiloto
+        viaje.ocurrencias.filter(fecha_hora_salida=fecha).delete()
+        self.assertTrue(agenda.se_superpone(copiloto, fecha + datetime.timedelta(hours=1), 2))
+        self.assertTrue(agenda.se_superpone(copiloto, fecha - datetime.timedelta(hours=1), 2))
+        self.assertFalse(agenda.se_superpone(copiloto, fecha + datetime.timedelta(hours=2), 2))
+        self.assertFalse(agenda.se_superpone(copiloto, fecha, 2, como_copiloto=False))
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class ElegibilidadTest(TransactionTestCase):
+    """ el estado cacheado se invalida recien despues del commit """
+
+    def test_invalidar_despues_del_commit(self):
+        cache.clear()
+        usuario = crear_usuario(0)
+        self.assertFalse(elegibilidad.get_estado(usuario)['tiene_tarjeta'])
+        with transaction.atomic():
+            Tarjeta.objects.create(usuario=usuario, numero='4500')
+            # otro request lee antes del commit y vuelve a cachear
+            elegibilidad.get_estado(usuario)
+        self.assertIsNone(cache.get(elegibilidad.get_clave(usuario.pk)))
+        self.assertTrue(elegibilidad.get_estado(usuario)['tiene_tarjeta'])
@@ -15,7 +15,8 @@ from .views import (
     mis_viajes_finalizados,
     agregar_pregunta_conversacion_publica,
     ver_calificaciones,
-    ver_calificaciones_de_usuario
+    ver_calificaciones_de_usuario,
+    exportar_liquidaciones
 )
 
 from .ajax import *
@@ -39,6 +40,7 @@ urlpatterns = [
     path('crearViaje', crear_viaje, name='crear_viaje'),
     path('uploadFoto', upload_foto, name='upload_foto'),
     path('agregarPregPublica', agregar_pregunta_conversacion_publica, name='agregar_pregunta_conversacion_publica'),
+    path('liquidaciones', exportar_liquidaciones, name='exportar_liquidaciones'),
 
     path('ajax/copilotosEnEspera', lista_de_espera_de_copilotos_para_un_viaje,
          name='lista_espera'),
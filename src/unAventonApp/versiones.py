@@ -0,0 +1,46 @@
+""" Sellos de version en el cache compartido, para saber si algo cambio sin ir a la base.
+Un sello es el time.time() del ultimo cambio:
+  viaje:<id>                el viaje o su conversacion publica
+  viaje:<id>:<timestamp>    las solicitudes de copilotos de esa salida
+  usuario:<id>              el usuario, su reputacion o sus tarjetas
+  <modelo>:<id>             cualquier otra instancia cacheada con cache_de_modelos.py (ej auto:<id>)
+Los sellos se tocan despues del commit (signals.py), asi nadie puede guardar en el cache
+una pagina vieja con un sello nuevo. Si el cache pierde un sello se crea de nuevo con la hora
+actual, lo que invalida todo lo que dependia de el. """
+from django.core.cache import cache
+from django.db import transaction
+import time
+
+
+def get_clave_viaje(viaje_id):
+    return 'version:viaje:{0}'.format(viaje_id)
+
+
+def get_clave_salida(viaje_id, fecha):
+    return 'version:viaje:{0}:{1}'.format(viaje_id, int(fecha.timestamp()))
+
+
+def get_clave_usuario(usuario_id):
+    return 'version:usuario:{0}'.format(usuario_id)
+
+
+def get_clave_instancia(modelo, pk):
+    """ para Viaje y Usuario es la misma clave que get_clave_viaje y get_clave_usuario """
+    return 'version:{0}:{1}'.format(modelo._meta.model_name, pk)
+
+
+def tocar(*claves):
+    """ marca las claves como cambiadas cuando se confirme la transaccion actual """
+    transaction.on_commit(lambda: cache.set_many({clave: time.time() for clave in claves}, None))
+
+
+def get_versiones(*claves):
+    """ {clave: sello} con una sola lectura del cache """
+    versiones = cache.get_many(claves)
+    faltantes = [clave for clave in claves if clave not in versiones]
+    if faltantes:
+        ahora = time.time()
+        for clave in faltantes:
+            cache.add(clave, ahora, None)
+        versiones.update(cache.get_many(faltantes))
+    return versiones
@@ -1,12 +1,23 @@
 from django.shortcuts import render, HttpResponseRedirect, Http404, redirect
 from django.contrib.auth import logout as __logout, login as __login, authenticate
 from django.contrib.auth.models import User
-from .models import Usuario, ViajeCopiloto, Viaje, ConversacionPublica
+from .models import Usuario, ViajeCopiloto, Viaje, ConversacionPublica, Auto
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.views.decorators.http import condition
+from django.utils.functional import SimpleLazyObject
+from django.core.paginator import Paginator
+from django.conf import settings
+import hashlib
 from django.db import IntegrityError
 from django.utils import timezone
 import datetime
 from . import mailer
+from . import versiones
+from . import cache_de_modelos
+from . import liquidaciones
+from .templatetags.unAventonApp_extras import buildInfo
 
 
 def baseContext():
@@ -61,23 +72,62 @@ def signInRegister(request):
 
     return HttpResponseRedirect('signin')
 
+def get_versiones_del_viaje(request, id, timestamp):
+    """ los sellos de todo lo que muestra la pagina del viaje, se leen del cache sin ir a la base
+    (salvo la primera vez, para saber quien es el piloto) """
+    if not hasattr(request, '_versiones_del_viaje'):
+        auto_y_piloto = cache_de_modelos.get('auto_y_piloto', [(Viaje, id)], lambda: Viaje.objects.filter(
+            pk=id).values_list('auto', 'auto__usuario').first())
+        if auto_y_piloto is None:
+            raise Http404
+        auto_id, piloto_id = auto_y_piloto
+        claves = {
+            'viaje': versiones.get_clave_viaje(id),
+            'salida': versiones.get_clave_salida(id, datetime.datetime.fromtimestamp(int(timestamp))),
+            'auto': versiones.get_clave_instancia(Auto, auto_id),
+            'piloto': versiones.get_clave_usuario(piloto_id),
+            'usuario': versiones.get_clave_usuario(request.user.usuario.pk),
+        }
+        sellos = versiones.get_versiones(*claves.values())
+        request._versiones_del_viaje = {nombre: sellos[clave] for nombre, clave in claves.items()}
+        request._versiones_del_viaje['piloto_id'] = piloto_id
+    return request._versiones_del_viaje
+
+
+def get_etag_del_viaje(request, id, timestamp):
+    # tambien cambia con el usuario, su cookie de csrf (el form la usa), la navbar y el deploy.
+    # No hay Last-Modified: los sellos son segundos y con If-Modified-Since un cambio en el mismo
+    # segundo (ej. una tarjeta nueva) devolveria 304, el ETag cubre todo lo que muestra la pagina
+    datos = sorted(get_versiones_del_viaje(request, id, timestamp).items())
+    datos += [request.user.pk, request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+              request.user.usuario.count_preguntas_sin_responder(), buildInfo.get_datos()]
+    return hashlib.md5(repr(datos).encode()).hexdigest()
+
+
 @login_required
+@condition(etag_func=get_etag_del_viaje)
 def viaje(request, id, timestamp):
     # renderiza la vista para ver los datos del viaje
+    # los fragmentos del resumen y la conversacion se cachean con los sellos de version,
+    # los datos del viaje solo se calculan si hay que renderizarlos de nuevo
     context = {}
-    viaje = Viaje.objects.get(pk=id)
     fecha = datetime.datetime.fromtimestamp(int(timestamp))
-    print(fecha)
-    context['viaje'] = viaje.datos_del_viaje_en_fecha(fecha)
+    context['viaje'] = SimpleLazyObject(
+        lambda: Viaje.objects.select_related('auto__usuario__user').get(pk=id).datos_del_viaje_en_fecha(fecha))
     try:
-        vc = ViajeCopiloto.objects.get(usuario=request.user.usuario, viaje=viaje, fecha_del_viaje=fecha)
+        vc = ViajeCopiloto.objects.get(usuario=request.user.usuario, viaje_id=id, fecha_del_viaje=fecha)
         context['copiloto_confirmado'] = vc.estaConfirmado
-    except:
+    except ViajeCopiloto.DoesNotExist:
         context['copiloto_confirmado'] = -1  # todavia no mando solicitud
 
+    versiones_del_viaje = get_versiones_del_viaje(request, id, timestamp)
+    context['viaje_id'] = id
+    context['versiones'] = versiones_del_viaje
+    context['cache_segundos'] = settings.APP_CACHE_VIAJE_SEGUNDOS
     context['timestamp'] = timestamp
-    context['conversacion_publica'] = viaje.get_conversacion_publica()
-    context['es_piloto'] = viaje.auto.usuario.pk == request.user.usuario.pk
+    context['conversacion_publica'] = ConversacionPublica.objects.filter(viaje_id=id).select_related(
+        'usuario', 'viaje__auto__usuario').order_by('-fechaHoraPregunta')
+    context['es_piloto'] = versiones_del_viaje['piloto_id'] == request.user.usuario.pk
 
     return render(request, 'unAventonApp/ver_datos_del_viaje.html', context)
 
@@ -109,12 +159,14 @@ def agregar_pregunta_conversacion_publica(request):
     timestamp = request.POST['fecha_hora_unix']
     pregunta = request.POST['pregunta'].strip()
     if len(pregunta) > 0:
+        viaje = Viaje.objects.select_related('auto').get(pk=id_viaje)
         ConversacionPublica.objects.create(
-            viaje=Viaje.objects.get(pk=id_viaje),
+            viaje=viaje,
             usuario=request.user.usuario,
             pregunta=request.POST['pregunta'],
             fechaHoraPregunta=datetime.datetime.now()
         )
+        Usuario.invalidar_preguntas_sin_responder(viaje.auto.usuario_id)
     return redirect('viaje', id=id_viaje, timestamp=timestamp)
 
 
@@ -127,7 +179,9 @@ def logout(request):
 @login_required
 def viajes_inscriptos(request):
     context = {
-        'viajes': ViajeCopiloto.objects.filter(usuario=request.user.usuario).order_by('-fecha_del_viaje')
+        # el viaje, el auto y el piloto de cada fila vienen en la misma query
+        'viajes': ViajeCopiloto.objects.filter(usuario=request.user.usuario).select_related(
+            'viaje__auto__usuario').order_by('-fecha_del_viaje')
     }
     return render(request, 'unAventonApp/viajes_inscriptos.html', context)
 
@@ -173,27 +227,22 @@ def mis_viajes_finalizados(request):
         'viajes': []
     }
 
-    # busca los viajes finalizados con copilotos confirmados
-    viajes_copilotos = list(ViajeCopiloto.objects.filter(
-        fecha_del_viaje__lte=timezone.now(),
-        estaConfirmado=True,
-        viaje__auto__usuario=request.user.usuario
-    ))
-
-    # aplico un DISTINCT caserito porque no functiona con sqlite
-    x = set()
-    for vc in viajes_copilotos:
-        v = (vc.fecha_del_viaje, vc.viaje.pk)
-        if v in x:
-            viajes_copilotos.remove(vc)
-        else:
-            x.add(v)
-
-    print(viajes_copilotos)
-    # agrega los datos de cada viaje encontrado
-    for viaje_copiloto in viajes_copilotos:
-        viaje = viaje_copiloto.viaje
-        context['viajes'].append(viaje.datos_del_viaje_en_fecha(viaje_copiloto.fecha_del_viaje))
+    # cada salida pasada de los viajes del usuario que tuvo copilotos confirmados, ya agrupada y con los montos
+    paginador = Paginator(request.user.usuario.get_salidas_finalizadas(), settings.APP_PAGINA_VIAJES_FINALIZADOS)
+    pagina = paginador.get_page(request.GET.get('pagina'))
+    viajes = Viaje.objects.select_related('auto').in_bulk({salida['viaje'] for salida in pagina})
+    for salida in pagina:
+        fecha = salida['fecha_del_viaje']
+        context['viajes'].append({
+            'viaje': viajes[salida['viaje']],
+            'fecha_hora_salida': fecha,
+            'fecha_hora_salida_unix': fecha.timestamp(),
+            'get_comision_cobrada': salida['comision_cobrada'],
+            'get_total_a_reintegrar_al_conductor': salida['total_a_reintegrar'],
+            'get_count_copilotos_confirmados': salida['confirmados'],
+            'tiene_calificacion_pendientes_a_copilotos': salida['calificaciones_pendientes'] > 0,
+        })
+    context['pagina'] = pagina
 
     return render(request, 'unAventonApp/mis_viajes_finalizados.html', context)
 
@@ -206,7 +255,7 @@ def mi_perfil(request):
 @login_required
 def crear_viaje(request):
     context = {}
-    usuario = Usuario.objects.get(user=request.user)
+    usuario = request.user.usuario
     context['get_autos'] = [auto.asJson() for auto in usuario.get_autos()]
     context['get_cuentas_bancarias'] = [cuenta.asJson() for cuenta in usuario.get_cuentas_bancarias()]
     return render(request, 'unAventonApp/crear_viaje.html', context)
@@ -218,10 +267,24 @@ def upload_foto(request):
         usuario = request.user.usuario
         file = request.FILES['files']
         if str(file).lower().endswith(('.jpg', '.png', '.jpeg', '.gif',)) == True:
-            if not str(usuario.foto_de_perfil.name).count('default-user.png'):
-                usuario.foto_de_perfil.delete()
-            usuario.foto_de_perfil = file
-            usuario.save()
+            usuario.cambiar_foto_de_perfil(file)
         return redirect('miPerfil')
     else:
         raise Http404
+
+
+@staff_member_required
+def exportar_liquidaciones(request):
+    """ ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD&formato=csv|json, ver liquidaciones.py """
+    formato = request.GET.get('formato', 'csv')
+    if formato not in liquidaciones.FORMATOS:
+        return HttpResponseBadRequest('formato tiene que ser csv o json')
+    try:
+        desde, hasta = liquidaciones.get_rango(request.GET.get('desde', ''), request.GET.get('hasta'))
+    except ValueError:
+        return HttpResponseBadRequest('desde y hasta tienen que ser fechas AAAA-MM-DD')
+    generar, content_type = liquidaciones.FORMATOS[formato]
+    response = StreamingHttpResponse(generar(desde, hasta), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="liquidaciones_{0}_{1}.{2}"'.format(
+        desde.date(), (hasta - datetime.timedelta(days=1)).date(), formato)
+    return response